@@ -0,0 +1,29 @@
+# gunicorn -c gunicorn.conf.py project.app:server
+import gc
+import os
+
+# Load the data, indexes and warm reports once in the master process;
+# workers are forked from it and share those pages copy-on-write. The
+# frame itself is memory-mapped (load_data(mmap=True)), so its pages stay
+# shared through the page cache even for workers started later.
+preload_app = True
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"
+timeout = 120
+
+# Warm up before forking: background threads do not survive fork()
+os.environ.setdefault("WARMUP", "sync")
+
+
+def pre_fork(server, worker):
+    # Move everything loaded so far out of the collector's reach; otherwise
+    # each worker's first GC pass writes to (and un-shares) every object.
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Threads do not survive fork(): each worker follows incremental
+    # refreshes itself (REFRESH_INTERVAL seconds, 0 = off)
+    from project import app
+
+    app.start_refresh()
@@ -1,31 +1,138 @@
+import os
+
 from dash import Dash
 import dash_bootstrap_components as dbc
 
 
 from project.components.layout import create_layout
 from project import callbacks
-from project.utils.load_data import load_data
+from project.utils.load_data import (
+    load_data,
+    dataset_version,
+    DEFAULT_DATA_PATH,
+    partition_paths,
+    COL_LAT,
+    COL_LON,
+)
+from project.utils.index import FilterIndex
+from project.utils.cache import ReportCache
+from project.utils.cube import CountCube
+from project.utils.spatial import GridIndex
+from project.utils.metrics import register_metrics_endpoint, register_payload_metrics
+from project.utils.warmup import popular_filters, warm_up, start_warm_up
+from project.utils.refresh import start_refresh_watch
 
 
 
-# 1) Load the cleaned integrated dataset
-df = load_data()
+# 1) Load the cleaned integrated dataset, index it for the filters and map
+#    selections, and materialize the count cube the report is sliced from.
+#    The frame is memory-mapped, so every worker (and every job process)
+#    reads the same page-cache copy of it
+# Partitions counted before loading: the refresh watcher resumes after
+# exactly these, however much later a worker starts it (a partition that
+# lands in between is applied again, which replaces the same rows)
+loaded_partitions = len(partition_paths(DEFAULT_DATA_PATH))
+df = load_data(mmap=True)
+index = FilterIndex(df)
+spatial_index = GridIndex(
+    df[COL_LAT].to_numpy(dtype="float32", na_value=float("nan")),
+    df[COL_LON].to_numpy(dtype="float32", na_value=float("nan")),
+)
+cube = CountCube(df, index)
+
+# Finished reports, shared by all workers on this host through a disk tier
+report_cache = ReportCache(
+    disk_dir=os.environ.get(
+        "REPORT_CACHE_DIR", DEFAULT_DATA_PATH.parent / "report_cache"
+    ),
+    namespace=dataset_version(),
+)
+
+# Reports are aggregated in background job processes, so a long selection
+# no longer holds a gunicorn worker and a newer click cancels it;
+# BACKGROUND_REPORTS=0 aggregates inside the request instead
+BACKGROUND_REPORTS = os.environ.get("BACKGROUND_REPORTS", "1") != "0"
+background_manager = None
+if BACKGROUND_REPORTS:
+    try:
+        import diskcache
+        from dash import DiskcacheManager
+    except ImportError:
+        print("Background reports off: the diskcache extra is not installed (pip install dash[diskcache])")
+        BACKGROUND_REPORTS = False
+    else:
+        background_manager = DiskcacheManager(
+            diskcache.Cache(os.environ.get("JOB_CACHE_DIR", DEFAULT_DATA_PATH.parent / "job_cache")),
+            expire=600,
+        )
 
 # 2) Create Dash App
 app = Dash(
     __name__,
-    external_stylesheets=[dbc.themes.BOOTSTRAP]
+    external_stylesheets=[dbc.themes.BOOTSTRAP],
+    background_callback_manager=background_manager,
 )
 
 # Needed for deployment (Render, Heroku, etc.)
 server = app.server
 
+# Brotli/gzip for callback responses and assets (Dash's own compress=True
+# pins gzip); COMPRESS_RESPONSES=0 leaves it to a reverse proxy
+COMPRESS_RESPONSES = os.environ.get("COMPRESS_RESPONSES", "1") != "0"
+if COMPRESS_RESPONSES:
+    try:
+        from flask_compress import Compress
+    except ImportError:
+        print("Response compression off: flask-compress is not installed (pip install dash[compress])")
+    else:
+        server.config.update(COMPRESS_ALGORITHM=["br", "gzip"], COMPRESS_BR_LEVEL=4)
+        Compress(server)
+
+# Per-stage report timings, cache counters and callback response sizes
+# (raw and as sent) for this worker, as JSON
+register_metrics_endpoint(server, sources={"report_cache": report_cache.stats})
+register_payload_metrics(server)
+
 # 3) Set the layout
 app.layout = create_layout(df)
 
 # 4) Register all callbacks
-callbacks.register_callbacks(app, df)
+report = callbacks.register_callbacks(
+    app,
+    df,
+    index=index,
+    cache=report_cache,
+    cube=cube,
+    spatial_index=spatial_index,
+    background=BACKGROUND_REPORTS,
+    # Refreshed data is written back to the shared file and re-mapped
+    shared_path=DEFAULT_DATA_PATH,
+)
+
+# 5) Precompute the unfiltered report and popular filter combinations.
+#    WARMUP=sync (set by gunicorn.conf.py) runs it before workers fork, so
+#    they inherit the warm cache; background keeps `python app.py` startup
+#    fast; off disables it.
+WARMUP = os.environ.get("WARMUP", "background").lower()
+if WARMUP == "sync":
+    warm_up(report, popular_filters(df))
+elif WARMUP == "background":
+    start_warm_up(report, popular_filters(df))
+
+# 6) Follow incremental refreshes (python -m project.pipeline.incremental):
+#    every REFRESH_INTERVAL seconds new partitions are appended to the
+#    loaded data, index and cube. The first worker to apply one rewrites
+#    the shared Arrow file; the others map it. Off by default; gunicorn
+#    workers start their own watcher after fork (see gunicorn.conf.py).
+REFRESH_INTERVAL = float(os.environ.get("REFRESH_INTERVAL", 0))
+
+
+def start_refresh():
+    if REFRESH_INTERVAL > 0:
+        start_refresh_watch(report.extend, interval=REFRESH_INTERVAL, seen=loaded_partitions)
+
 
-# 5) Run the server locally
+# 7) Run the server locally
 if __name__ == "__main__":
+    start_refresh()
     app.run(debug=True)
@@ -0,0 +1,372 @@
+"""
+Benchmarks for the load, filter and report hot paths on synthetic data.
+
+    python -m project.benchmarks.run --rows 100k,1M            # print results
+    python -m project.benchmarks.run --rows 100k,1M --save     # write baseline
+    python -m project.benchmarks.run --rows 100k,1M --compare  # exit 1 on regression
+
+Data comes from synthetic.generate_dataset with a fixed seed and is cached
+per size under --data-dir, so runs on the same machine are comparable.
+Absolute times are only compared when the host matches the baseline's
+recorded environment; the stage ratios in RATIO_CHECKS are compared always.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import re
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from importlib import metadata
+from typing import Optional, List, Dict, Any, Callable, Tuple
+
+import numpy as np
+import pandas as pd
+from dash import Dash
+
+from project import callbacks
+from project.benchmarks.synthetic import write_dataset
+from project.utils.cache import ReportCache
+from project.utils.cube import CountCube
+from project.utils.filters import apply_filters
+from project.utils.index import FilterIndex
+from project.utils.load_data import load_data, peak_rss_mb, COL_LAT, COL_LON
+from project.utils.search import SearchEngine
+from project.utils.spatial import GridIndex
+
+BENCH_DIR = Path(__file__).resolve().parent
+DEFAULT_BASELINE = BENCH_DIR / "baseline.json"
+DEFAULT_DATA_DIR = BENCH_DIR.parent / "data" / "bench"
+DEFAULT_SIZES = "100k,1M"
+REQUIREMENTS = BENCH_DIR.parent.parent / "requirements.txt"
+
+# Stages faster than this are dominated by noise and never flagged
+MIN_COMPARABLE_SECONDS = 0.005
+# Run-to-run noise on a shared host reaches ~30% for the short stages
+DEFAULT_TOLERANCE = 0.5
+
+# (stage, reference stage): how fast a path is relative to another one timed
+# in the same run, e.g. index vs full scan. Host speed cancels out, so these
+# hold on any machine.
+RATIO_CHECKS: List[Tuple[str, str]] = [
+    ("apply_filters", "apply_filters_scan"),
+    ("apply_filters_hive", "apply_filters_scan"),
+    ("load_cache", "load_csv"),
+    ("load_mmap", "load_csv"),
+]
+
+# Meta keys that must match for absolute seconds to be comparable
+HOST_KEYS = ("python", "pandas", "numpy", "pyarrow", "machine", "processor", "cpu_count")
+
+# Representative dashboard requests (dropdowns, search text, map selections)
+FILTER_CASES: List[Dict[str, Any]] = [
+    {"borough": "BROOKLYN"},
+    {"year": 2022},
+    {"borough": "QUEENS", "year": [2021, 2022]},
+    {"injury": "KILLED"},
+    {"vehicle_type": "SEDAN", "factor": "UNSAFE SPEED"},
+    {"person_type": "PEDESTRIAN", "hours": [7, 8, 9]},
+    {"search_text": "truck"},
+    {"borough": "MANHATTAN", "bbox": (40.70, -74.02, 40.75, -73.97)},
+]
+
+SEARCH_QUERIES = [
+    "Brooklyn 2022 pedestrian crashes killed",
+    "queens 2019",
+    "staten island injured cyclist",
+    "taxi manhattan night",
+]
+
+
+def parse_size(text: str) -> int:
+    """'100k' -> 100000, '1M' -> 1000000, '2500' -> 2500."""
+    text = text.strip().lower()
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(float(text[:-1] if scale > 1 else text) * scale)
+
+
+# ===========================
+# Measurement
+# ===========================
+def measure(fn: Callable[[], Any], n_rows: int, calls: int = 1, repeat: int = 3) -> Dict[str, Any]:
+    """
+    Median/best wall time of `fn` over `repeat` runs, plus the peak traced
+    allocation of one extra run (timed runs are not traced, tracing is slow).
+
+    peak_mb covers Python and numpy allocations; Arrow's own memory pool
+    (Feather reads) is not traced, so load_cache reports only its overhead.
+    rows_per_sec is calls/sec for stages that do not scan rows.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    seconds = statistics.median(times)
+    return {
+        "seconds": round(seconds, 6),
+        "best_seconds": round(min(times), 6),
+        "peak_mb": round(peak / 1e6, 2),
+        "rows_per_sec": round(n_rows * calls / seconds) if seconds else None,
+    }
+
+
+def _quiet(fn: Callable[[], Any]) -> Callable[[], Any]:
+    """Drop load_data's progress prints from benchmark output."""
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return fn()
+    return run
+
+
+def bench_size(n_rows: int, data_dir: Path, repeat: int = 3, seed: int = 0) -> Dict[str, Any]:
+    """Time every stage on a synthetic dataset of `n_rows` rows."""
+    path = write_dataset(data_dir / f"synthetic_{n_rows}_{seed}.csv", n_rows, seed)
+    out: Dict[str, Any] = {}
+
+    out["load_csv"] = measure(_quiet(lambda: load_data(path, use_cache=False)), n_rows, repeat=repeat)
+    df = _quiet(lambda: load_data(path))()  # writes the columnar cache
+    out["load_cache"] = measure(_quiet(lambda: load_data(path)), n_rows, repeat=repeat)
+    _quiet(lambda: load_data(path, mmap=True))()  # writes the shared Arrow file
+    out["load_mmap"] = measure(_quiet(lambda: load_data(path, mmap=True)), n_rows, repeat=repeat)
+
+    def build():
+        index = FilterIndex(df)
+        grid = GridIndex(
+            df[COL_LAT].to_numpy(dtype="float32", na_value=np.nan),
+            df[COL_LON].to_numpy(dtype="float32", na_value=np.nan),
+        )
+        return index, grid, CountCube(df, index)
+
+    out["build_indexes"] = measure(build, n_rows, repeat=1)
+    index, grid, cube = build()
+
+    out["apply_filters_scan"] = measure(
+        lambda: [apply_filters(df, **f) for f in FILTER_CASES],
+        n_rows, calls=len(FILTER_CASES), repeat=repeat,
+    )
+    out["apply_filters"] = measure(
+        lambda: [apply_filters(df, index=index, spatial_index=grid, **f) for f in FILTER_CASES],
+        n_rows, calls=len(FILTER_CASES), repeat=repeat,
+    )
+    # Same requests against the year/borough store: only matching partitions are read
+    store = _quiet(lambda: load_data(path, lazy=True))()
+    out["apply_filters_hive"] = measure(
+        lambda: [apply_filters(store, **f) for f in FILTER_CASES],
+        n_rows, calls=len(FILTER_CASES), repeat=repeat,
+    )
+    search = SearchEngine.from_frame(df)
+    out["parse_search_query"] = measure(
+        lambda: [search.parse(q) for q in SEARCH_QUERIES * 250],
+        n_rows=1, calls=len(SEARCH_QUERIES) * 250, repeat=repeat,
+    )
+
+    # The callbacks' report function with a cache that never keeps anything,
+    # so every call runs the full filter -> aggregate -> figures path
+    report = callbacks.register_callbacks(
+        Dash(__name__), df, index=index, cache=ReportCache(max_bytes=0),
+        cube=cube, spatial_index=grid,
+    )
+    report_cases = [f for f in FILTER_CASES if "search_text" not in f]
+    out["generate_report"] = measure(
+        lambda: [report(**f) for f in report_cases],
+        n_rows, calls=len(report_cases), repeat=repeat,
+    )
+    return out
+
+
+# ===========================
+# Environment
+# ===========================
+def pinned_requirements(path: Path = REQUIREMENTS) -> Dict[str, str]:
+    """Exact pins (name==version) from requirements.txt, extras stripped."""
+    pins = {}
+    if path.exists():
+        for line in path.read_text().splitlines():
+            m = re.match(r"\s*([A-Za-z0-9_.-]+)(?:\[[^\]]*\])?\s*==\s*(\S+)", line)
+            if m:
+                pins[m.group(1).lower()] = m.group(2)
+    return pins
+
+
+def environment() -> Dict[str, Any]:
+    """Host and library versions a set of timings was taken on."""
+    def version(name: str) -> Optional[str]:
+        try:
+            return metadata.version(name)
+        except metadata.PackageNotFoundError:
+            return None
+
+    return {
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "pyarrow": version("pyarrow"),
+        "dash": version("dash"),
+        "plotly": version("plotly"),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "requirements": pinned_requirements(),
+    }
+
+
+def off_pin(meta: Dict[str, Any]) -> List[str]:
+    """Libraries in `meta` whose version differs from requirements.txt."""
+    pins = meta.get("requirements", {})
+    return [
+        f"{name} {meta[name]} (pinned {pins[name]})"
+        for name in pins
+        if meta.get(name) and meta[name] != pins[name]
+    ]
+
+
+def host_differences(current: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    """HOST_KEYS that differ between two meta dicts, as readable lines."""
+    return [
+        f"{key}: {current.get(key)} (baseline {baseline.get(key)})"
+        for key in HOST_KEYS
+        if current.get(key) != baseline.get(key)
+    ]
+
+
+def run_benchmarks(
+    sizes: List[int],
+    data_dir: Path = DEFAULT_DATA_DIR,
+    repeat: int = 3,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    results = {}
+    for n_rows in sizes:
+        print(f"Benchmarking {n_rows:,} rows...", flush=True)
+        results[str(n_rows)] = bench_size(n_rows, Path(data_dir), repeat=repeat, seed=seed)
+    return {
+        "meta": {
+            **environment(),
+            "seed": seed,
+            "repeat": repeat,
+            "peak_rss_mb": peak_rss_mb(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+
+# ===========================
+# Baseline comparison
+# ===========================
+def _seconds(result: Dict[str, Any]) -> float:
+    # Best of the timed runs: background load only ever adds time
+    return result.get("best_seconds", result["seconds"])
+
+
+def compare(
+    current: Dict[str, Any],
+    baseline: Dict[str, Any],
+    tolerance: float = DEFAULT_TOLERANCE,
+) -> List[str]:
+    """
+    Regressions against the baseline, as readable lines:
+    - a stage with no baseline entry (re-record the baseline);
+    - a RATIO_CHECKS ratio above baseline * (1 + tolerance);
+    - a stage slower than baseline * (1 + tolerance), only when the host
+      matches the baseline's (see host_differences).
+    """
+    same_host = not host_differences(current.get("meta", {}), baseline.get("meta", {}))
+    regressions = []
+    for size, stages in current["results"].items():
+        base = baseline.get("results", {}).get(size, {})
+        for stage, now in stages.items():
+            before = base.get(stage)
+            if not before:
+                regressions.append(f"{stage} @ {int(size):,} rows: no baseline entry")
+                continue
+            if not same_host or _seconds(before) < MIN_COMPARABLE_SECONDS:
+                continue
+            if _seconds(now) > _seconds(before) * (1 + tolerance):
+                regressions.append(
+                    f"{stage} @ {int(size):,} rows: {_seconds(now):.4f}s "
+                    f"vs baseline {_seconds(before):.4f}s "
+                    f"(+{_seconds(now) / _seconds(before) - 1:.0%})"
+                )
+
+        for stage, reference in RATIO_CHECKS:
+            pair = [stages.get(stage), stages.get(reference), base.get(stage), base.get(reference)]
+            if not all(pair) or min(_seconds(r) for r in pair) < MIN_COMPARABLE_SECONDS:
+                continue
+            now_ratio = _seconds(pair[0]) / _seconds(pair[1])
+            before_ratio = _seconds(pair[2]) / _seconds(pair[3])
+            if now_ratio > before_ratio * (1 + tolerance):
+                regressions.append(
+                    f"{stage}/{reference} @ {int(size):,} rows: {now_ratio:.3f} "
+                    f"vs baseline {before_ratio:.3f} (+{now_ratio / before_ratio - 1:.0%})"
+                )
+    return regressions
+
+
+def print_table(report: Dict[str, Any]) -> None:
+    print(f"{'rows':>12}  {'stage':<20} {'seconds':>10} {'peak MB':>9} {'rows/sec':>14}")
+    for size, stages in report["results"].items():
+        for stage, r in stages.items():
+            rate = f"{r['rows_per_sec']:,}" if r["rows_per_sec"] else "-"
+            print(f"{int(size):>12,}  {stage:<20} {r['seconds']:>10.4f} {r['peak_mb']:>9.1f} {rate:>14}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", default=DEFAULT_SIZES, help="comma-separated sizes, e.g. 100k,1M,10M")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", type=Path, default=DEFAULT_DATA_DIR)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--compare", action="store_true", help="fail if slower than the baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(
+        [parse_size(s) for s in args.rows.split(",")],
+        data_dir=args.data_dir, repeat=args.repeat, seed=args.seed,
+    )
+    print_table(report)
+
+    status = 0
+    if args.compare:
+        baseline = json.loads(args.baseline.read_text())
+        differences = host_differences(report["meta"], baseline.get("meta", {}))
+        if differences:
+            print("Host differs from the baseline's, comparing stage ratios only:")
+            for line in differences:
+                print("  ", line)
+        regressions = compare(report, baseline, args.tolerance)
+        for line in regressions:
+            print("REGRESSION:", line)
+        if regressions:
+            status = 1
+        else:
+            print(f"No stage slower than baseline by more than {args.tolerance:.0%}.")
+
+    if args.save:
+        for line in off_pin(report["meta"]):
+            print("WARNING: recorded off the pinned requirements:", line)
+        args.baseline.write_text(json.dumps(report, indent=2) + "\n")
+        print("Baseline written to", args.baseline)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,226 @@
+from pathlib import Path
+from typing import Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+# ===========================
+# Vocabularies (shaped like the cleaned integrated CSV)
+# ===========================
+BOROUGHS = ["BROOKLYN", "QUEENS", "MANHATTAN", "BRONX", "STATEN ISLAND"]
+BOROUGH_WEIGHTS = [0.31, 0.27, 0.18, 0.18, 0.06]
+
+# Rough lat/lon boxes per borough, so the map and spatial filters see clusters
+BOROUGH_BOXES = {
+    "BROOKLYN": (40.57, -74.04, 40.74, -73.86),
+    "QUEENS": (40.54, -73.96, 40.80, -73.70),
+    "MANHATTAN": (40.70, -74.02, 40.88, -73.91),
+    "BRONX": (40.79, -73.93, 40.92, -73.77),
+    "STATEN ISLAND": (40.50, -74.25, 40.65, -74.05),
+}
+
+PERSON_TYPES = ["Occupant", "Pedestrian", "Bicyclist", "Other Motorized"]
+PERSON_TYPE_WEIGHTS = [0.86, 0.08, 0.05, 0.01]
+
+PERSON_INJURIES = ["Unspecified", "Injured", "Killed"]
+PERSON_INJURY_WEIGHTS = [0.78, 0.217, 0.003]
+
+STREETS = [
+    "BROADWAY", "ATLANTIC AVENUE", "QUEENS BOULEVARD", "NORTHERN BOULEVARD",
+    "FLATBUSH AVENUE", "GRAND CENTRAL PKWY", "BELT PARKWAY", "3 AVENUE",
+    "LINDEN BOULEVARD", "EASTERN PARKWAY", "MAJOR DEEGAN EXPRESSWAY", "FDR DRIVE",
+]
+
+# The real data has a long tail of hundreds of free-text vehicle types and ~60
+# factors; a Zipf-like draw over generated labels reproduces that shape.
+N_VEHICLE_TYPES = 300
+N_FACTORS = 60
+COMMON_VEHICLE_TYPES = [
+    "Sedan", "Station Wagon/Sport Utility Vehicle", "Taxi", "Pick-up Truck",
+    "Box Truck", "Bus", "Bike", "Motorcycle", "E-Bike", "Van",
+]
+COMMON_FACTORS = [
+    "Unspecified", "Driver Inattention/Distraction", "Failure to Yield Right-of-Way",
+    "Following Too Closely", "Backing Unsafely", "Passing or Lane Usage Improper",
+    "Unsafe Speed", "Traffic Control Disregarded", "Alcohol Involvement",
+]
+
+PERSONS_PER_CRASH = 2.2
+MISSING_BOROUGH = 0.30
+MISSING_LOCATION = 0.08
+
+
+def _zipf_labels(common, n_total, prefix):
+    return common + [f"{prefix} {i}" for i in range(n_total - len(common))]
+
+
+def _zipf_choice(rng, n_labels, size):
+    weights = 1.0 / np.arange(1, n_labels + 1) ** 1.3
+    return rng.choice(n_labels, size=size, p=weights / weights.sum())
+
+
+# ===========================
+# Generator
+# ===========================
+def generate_dataset(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Synthetic person-level rows with the integrated CSV's raw headers and
+    realistic cardinalities (crashes with ~2.2 persons, a long tail of
+    vehicle types, missing boroughs and coordinates).
+
+    The same (n_rows, seed) always gives the same frame.
+    """
+    rng = np.random.default_rng(seed)
+
+    # Crash-level attributes, repeated for every person in the crash
+    n_crashes = max(1, int(n_rows / PERSONS_PER_CRASH))
+    crash = np.sort(rng.integers(0, n_crashes, n_rows))
+
+    def per_crash(values):
+        return values[crash]
+
+    start = np.datetime64("2012-07-01")
+    days = (np.datetime64("2025-01-01") - start).astype(int)
+    dates = start + per_crash(rng.integers(0, days, n_crashes)).astype("timedelta64[D]")
+    minutes = per_crash(rng.integers(0, 24 * 60, n_crashes))
+
+    borough_code = per_crash(rng.choice(len(BOROUGHS), n_crashes, p=BOROUGH_WEIGHTS))
+    boxes = np.array([BOROUGH_BOXES[b] for b in BOROUGHS])[borough_code]
+    lat = boxes[:, 0] + per_crash(rng.random(n_crashes)) * (boxes[:, 2] - boxes[:, 0])
+    lon = boxes[:, 1] + per_crash(rng.random(n_crashes)) * (boxes[:, 3] - boxes[:, 1])
+    no_location = per_crash(rng.random(n_crashes) < MISSING_LOCATION)
+    lat[no_location] = np.nan
+    lon[no_location] = np.nan
+
+    borough = np.array(BOROUGHS, dtype=object)[borough_code]
+    borough[per_crash(rng.random(n_crashes) < MISSING_BOROUGH)] = None
+
+    vehicle_types = np.array(_zipf_labels(COMMON_VEHICLE_TYPES, N_VEHICLE_TYPES, "Vehicle"))
+    factors = np.array(_zipf_labels(COMMON_FACTORS, N_FACTORS, "Factor"))
+    ts = pd.DatetimeIndex(dates)
+    hours = pd.Series(minutes // 60)
+
+    return pd.DataFrame({
+        "COLLISION_ID": 3_000_000 + crash,
+        "CRASH DATE": ts.strftime("%Y-%m-%d"),
+        "CRASH TIME": hours.astype(str) + ":" + pd.Series(minutes % 60).astype(str).str.zfill(2),
+        "BOROUGH": borough,
+        "ZIP CODE": np.where(pd.isna(borough), np.nan, per_crash(rng.integers(10001, 11698, n_crashes))),
+        "LATITUDE": lat.round(6),
+        "LONGITUDE": lon.round(6),
+        "ON STREET NAME": np.array(STREETS)[per_crash(rng.integers(0, len(STREETS), n_crashes))],
+        "CONTRIBUTING FACTOR VEHICLE 1": factors[per_crash(_zipf_choice(rng, N_FACTORS, n_crashes))],
+        "VEHICLE TYPE CODE 1": vehicle_types[per_crash(_zipf_choice(rng, N_VEHICLE_TYPES, n_crashes))],
+        "CRASH_YEAR": ts.year,
+        "CRASH_MONTH": ts.month,
+        "CRASH_HOUR": hours,
+        "PERSON_ID": np.arange(n_rows) + 10_000_000,
+        "PERSON_TYPE": rng.choice(PERSON_TYPES, n_rows, p=PERSON_TYPE_WEIGHTS),
+        "PERSON_INJURY": rng.choice(PERSON_INJURIES, n_rows, p=PERSON_INJURY_WEIGHTS),
+        "PERSON_AGE": rng.integers(1, 90, n_rows),
+        "PERSON_SEX": rng.choice(["M", "F", "U"], n_rows, p=[0.6, 0.35, 0.05]),
+    })
+
+
+def generate_raw(n_rows: int, seed: int = 0) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Crashes and persons tables shaped like the two NYC Open Data exports
+    that generate_dataset's rows would be integrated from: MM/DD/YYYY dates,
+    blank labels, ~1% duplicated rows, impossible ages and missing ZIPs, so
+    every cleaning stage of project.pipeline has something to do.
+    """
+    rng = np.random.default_rng(seed + 1)
+    df = generate_dataset(n_rows, seed)
+
+    crashes = df.drop_duplicates("COLLISION_ID").reset_index(drop=True)
+    n = len(crashes)
+    injured = rng.poisson(0.3, n)
+    killed = (rng.random(n) < 0.002).astype(int)
+    second = rng.random(n) < 0.7
+    crashes = pd.DataFrame({
+        "CRASH DATE": pd.to_datetime(crashes["CRASH DATE"]).dt.strftime("%m/%d/%Y"),
+        "CRASH TIME": crashes["CRASH TIME"],
+        "BOROUGH": crashes["BOROUGH"],
+        "ZIP CODE": crashes["ZIP CODE"].where(rng.random(n) > 0.1),
+        "LATITUDE": crashes["LATITUDE"],
+        "LONGITUDE": crashes["LONGITUDE"],
+        "LOCATION": None,
+        "ON STREET NAME": crashes["ON STREET NAME"].where(rng.random(n) > 0.05, "  "),
+        "CROSS STREET NAME": np.array(STREETS)[rng.integers(0, len(STREETS), n)],
+        "OFF STREET NAME": None,
+        "NUMBER OF PERSONS INJURED": injured,
+        "NUMBER OF PERSONS KILLED": killed,
+        "NUMBER OF PEDESTRIANS INJURED": np.minimum(injured, rng.poisson(0.05, n)),
+        "NUMBER OF PEDESTRIANS KILLED": 0,
+        "NUMBER OF CYCLIST INJURED": np.minimum(injured, rng.poisson(0.03, n)),
+        "NUMBER OF CYCLIST KILLED": 0,
+        "NUMBER OF MOTORIST INJURED": injured,
+        "NUMBER OF MOTORIST KILLED": killed,
+        "CONTRIBUTING FACTOR VEHICLE 1": crashes["CONTRIBUTING FACTOR VEHICLE 1"],
+        "CONTRIBUTING FACTOR VEHICLE 2": np.where(second, "Unspecified", None),
+        "CONTRIBUTING FACTOR VEHICLE 3": None,
+        "CONTRIBUTING FACTOR VEHICLE 4": None,
+        "CONTRIBUTING FACTOR VEHICLE 5": None,
+        "COLLISION_ID": crashes["COLLISION_ID"],
+        "VEHICLE TYPE CODE 1": crashes["VEHICLE TYPE CODE 1"],
+        "VEHICLE TYPE CODE 2": np.where(second, "Sedan", None),
+        "VEHICLE TYPE CODE 3": None,
+        "VEHICLE TYPE CODE 4": None,
+        "VEHICLE TYPE CODE 5": None,
+    })
+
+    m = len(df)
+    age = df["PERSON_AGE"].astype(float).where(rng.random(m) > 0.05)
+    bad_age = rng.random(m) < 0.01
+    age[bad_age] = rng.choice([-1, 150, 999], bad_age.sum())
+    persons = pd.DataFrame({
+        "UNIQUE_ID": np.arange(m) + 20_000_000,
+        "COLLISION_ID": df["COLLISION_ID"],
+        "CRASH_DATE": pd.to_datetime(df["CRASH DATE"]).dt.strftime("%m/%d/%Y"),
+        "CRASH_TIME": df["CRASH TIME"],
+        "PERSON_ID": df["PERSON_ID"],
+        "PERSON_TYPE": df["PERSON_TYPE"],
+        "PERSON_INJURY": df["PERSON_INJURY"],
+        "VEHICLE_ID": (rng.integers(1, 9_000_000, m)).astype(float),
+        "PERSON_AGE": age,
+        "EJECTION": rng.choice(["Not Ejected", "Ejected", None], m, p=[0.8, 0.01, 0.19]),
+        "EMOTIONAL_STATUS": rng.choice(["Conscious", "Does Not Apply", None], m, p=[0.6, 0.2, 0.2]),
+        "BODILY_INJURY": rng.choice(["Head", "Back", "Does Not Apply", None], m),
+        "POSITION_IN_VEHICLE": rng.choice(["Driver", "Front passenger", None], m),
+        "SAFETY_EQUIPMENT": rng.choice(["Lap Belt & Harness", "None", None], m),
+        "PED_LOCATION": None,
+        "PED_ACTION": None,
+        "COMPLAINT": rng.choice(["None Visible", "Pain or Nausea", None], m),
+        "PED_ROLE": rng.choice(["Driver", "Passenger", "Pedestrian"], m, p=[0.5, 0.4, 0.1]),
+        "CONTRIBUTING_FACTOR_1": None,
+        "CONTRIBUTING_FACTOR_2": None,
+        "PERSON_SEX": df["PERSON_SEX"].where(rng.random(m) > 0.03),
+    })
+    persons.loc[rng.random(m) < 0.02, "VEHICLE_ID"] = np.nan
+
+    # Exact duplicate rows, as re-published records show up in the exports
+    crashes = pd.concat([crashes, crashes.sample(frac=0.01, random_state=seed)], ignore_index=True)
+    persons = pd.concat([persons, persons.sample(frac=0.01, random_state=seed)], ignore_index=True)
+    return crashes, persons
+
+
+def write_raw(directory: Union[Path, str], n_rows: int, seed: int = 0) -> Tuple[Path, Path]:
+    """Write generate_raw(n_rows, seed) as crashes.csv / persons.csv under `directory`."""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = directory / "crashes.csv", directory / "persons.csv"
+    if not all(p.exists() for p in paths):
+        for frame, path in zip(generate_raw(n_rows, seed), paths):
+            frame.to_csv(path, index=False)
+    return paths
+
+
+def write_dataset(path: Union[Path, str], n_rows: int, seed: int = 0) -> Path:
+    """Write generate_dataset(n_rows, seed) to `path` as CSV, unless it already exists."""
+    path = Path(path)
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        generate_dataset(n_rows, seed).to_csv(tmp, index=False)
+        tmp.replace(path)
+    return path
@@ -1,230 +1,529 @@
-from dash import Input, Output, State
-import plotly.express as px
+import calendar
+import hashlib
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Optional, Dict, Any, Union
+
+import numpy as np
+
+from dash import Input, Output, State, no_update
 import pandas as pd
 
-from project.utils.filters import parse_search_query, apply_filters
+from project.components.figures import (
+    time_series_figure,
+    borough_figure,
+    injury_figure,
+    location_figure,
+    heatmap_figure,
+    pack_figure,
+)
+from project.utils.aggregates import ReportAggregates, aggregate_frame
+from project.utils.cache import ReportCache
+from project.utils.cube import CountCube
+from project.utils.spatial import (
+    GridIndex,
+    pick_density_level,
+    selection_to_shape,
+)
+from project.utils.filters import (
+    apply_filters,
+    filter_key,
+    normalize_filters,
+)
+from project.utils.index import FilterIndex
+from project.utils.metrics import metrics
+from project.utils.options import DEFAULT_TOP_OPTIONS, OptionVocabulary, build_vocabularies
+from project.utils.search import SearchEngine
 from project.utils.load_data import (
-    COL_BOROUGH,
-    COL_YEAR,
-    COL_MONTH,
-    COL_HOUR,
     COL_LAT,
     COL_LON,
     COL_COLLISION_ID,
-    COL_PERSON_INJURY,
-    COL_PERSON_TYPE,
+    combine_partitions,
+    concat_frames,
+    share_frame,
 )
 
 
-def register_callbacks(app, df):
+@dataclass
+class DashboardData:
+    """
+    The rows and everything derived from them. A refresh builds a new one
+    and swaps it in whole, so a request never mixes two versions.
+    """
+
+    df: pd.DataFrame
+    index: FilterIndex
+    spatial_index: Optional[GridIndex]
+    cube: Optional[CountCube]
+    base: ReportAggregates
+    search: SearchEngine
+    version: str = ""
+    # Label dropdown vocabularies with row counts (server-side option search)
+    vocabularies: Dict[str, OptionVocabulary] = field(default_factory=dict)
+    # Rendered unfiltered parts, never evicted
+    pinned: Dict[str, Any] = field(default_factory=dict)
+
+
+def _grid_index(df: pd.DataFrame) -> Optional[GridIndex]:
+    if COL_LAT not in df.columns or COL_LON not in df.columns:
+        return None
+    return GridIndex(
+        df[COL_LAT].to_numpy(dtype="float32", na_value=float("nan")),
+        df[COL_LON].to_numpy(dtype="float32", na_value=float("nan")),
+    )
+
 
-    # Preload possible labels for search parser (optional, not used in this file right now)
-    person_types = (
-        df[COL_PERSON_TYPE].dropna().unique().tolist()
-        if COL_PERSON_TYPE in df.columns
-        else []
+def extend_data(
+    data: DashboardData,
+    rows: pd.DataFrame,
+    replaced: Optional[np.ndarray] = None,
+    version: str = "",
+    shared_path: Optional[Union[Path, str]] = None,
+) -> DashboardData:
+    """
+    `data` with refreshed rows added. New collisions only append, so the
+    index, grid, cube and unfiltered aggregates are extended with `rows`
+    alone; if `rows` replace collisions already loaded (`replaced` ids),
+    positions shift and everything is rebuilt from the combined frame.
+    With `shared_path` (the dataset `data.df` was memory-mapped from), the
+    combined frame is written to its shared Arrow file once and mapped, so
+    workers keep sharing its pages after a refresh.
+    """
+    rows = rows.reset_index(drop=True)
+    rebuild = bool(
+        replaced is not None and len(replaced) and COL_COLLISION_ID in data.df.columns
+        and data.df[COL_COLLISION_ID].isin(replaced).any()
     )
+    combine = combine_partitions if rebuild else concat_frames
+    if shared_path is not None:
+        df = share_frame(lambda: combine([data.df, rows]), shared_path, version=version or None)
+    else:
+        df = combine([data.df, rows])
+    if rebuild:
+        index = FilterIndex(df)
+        spatial_index = _grid_index(df) if data.spatial_index is not None else None
+        cube = CountCube(df, index) if data.cube is not None else None
+        base = aggregate_frame(df)
+    else:
+        index = data.index.extend(rows)
+        spatial_index = data.spatial_index
+        if spatial_index is not None:
+            spatial_index = spatial_index.extend(
+                rows[COL_LAT].to_numpy(dtype="float32", na_value=float("nan")),
+                rows[COL_LON].to_numpy(dtype="float32", na_value=float("nan")),
+            )
+        cube = data.cube.extend(rows, index) if data.cube is not None else None
+        base = replace(data.base).fold(rows)
+    return DashboardData(
+        df, index, spatial_index, cube, base, SearchEngine.from_frame(df), version=version,
+        vocabularies=build_vocabularies(df),
+    )
+
+
+def register_callbacks(
+    app,
+    df,
+    aggregates: Optional[ReportAggregates] = None,
+    index: Optional[FilterIndex] = None,
+    cache: Optional[ReportCache] = None,
+    cube: Optional[CountCube] = None,
+    spatial_index: Optional[GridIndex] = None,
+    background: bool = False,
+    top_options: int = DEFAULT_TOP_OPTIONS,
+    shared_path: Optional[Union[Path, str]] = None,
+):
+    """
+    Register the dashboard callbacks.
+
+    `aggregates` may carry the unfiltered report (e.g. from stream_aggregates);
+    otherwise it is computed from `df` once here. `index` is the FilterIndex
+    built for `df` at load time (built here if not given). `cache` memoizes
+    finished reports by filter combination (an in-memory one by default).
+    With a CountCube, filtered reports are sliced from the cube instead of
+    aggregating filtered rows. `spatial_index` (a GridIndex, built here if
+    not given) answers map box/lasso selections.
 
-    injury_types = (
-        df[COL_PERSON_INJURY].dropna().unique().tolist()
-        if COL_PERSON_INJURY in df.columns
-        else []
+    Generate Report only aggregates the selection (cached server-side by
+    filter key); each KPI/figure part then renders in its own callback.
+    With background=True that aggregation is a Dash background callback
+    (the app needs a background_callback_manager): it runs in a job process
+    with progress messages, and a newer click from the same page cancels
+    the job still running. The result reaches the part callbacks through
+    the cache's disk tier, so `cache` must have one.
+    Label dropdowns with more than `top_options` values (the ones
+    create_layout ships) get their options from the server as the user
+    types. If `df` was memory-mapped (load_data(mmap=True)), `shared_path`
+    is its dataset path, so refreshed data is mapped the same way.
+
+    Returns the memoized report function (generate_report's filter keywords,
+    none for the unfiltered report) so the app can warm it up at boot. Its
+    `extend(rows, replaced, version)` attribute adds refreshed rows (see
+    extend_data) to the data every callback reads.
+    """
+    cache = cache if cache is not None else ReportCache()
+    if background and cache.disk_dir is None:
+        raise ValueError("background reports need a ReportCache with a disk_dir")
+    index = index if index is not None else FilterIndex(df)
+    data = DashboardData(
+        df,
+        index,
+        spatial_index if spatial_index is not None else _grid_index(df),
+        cube,
+        aggregates if aggregates is not None else aggregate_frame(df),
+        # Search vocabulary compiled once from the data's own values
+        SearchEngine.from_frame(df),
+        version=cache.namespace,
+        vocabularies=build_vocabularies(df),
     )
 
+    def selection_aggregates(filters, current=None, progress=None):
+        """
+        Aggregates of one filter selection, computed once and shared by all
+        parts. `progress(message)` is told which stage is running.
+        """
+        current = current or data
+        progress = progress or (lambda message: None)
+        key = filter_key(**filters)
+        if not key:
+            return current.base
+
+        def compute():
+            # The cube has no coordinates or words, so map selections and
+            # free text go through rows
+            by_rows = filters.get("search_text") or any(
+                filters.get(k) is not None for k in ("bbox", "radius", "polygon")
+            )
+            if current.cube is not None and not by_rows:
+                progress("Summing the matching cube cells...")
+                with metrics.stage("cube_query") as st:
+                    agg = current.cube.query(normalize_filters(**filters))
+                    st.rows = agg.total_persons
+            else:
+                progress("Filtering rows...")
+                with metrics.stage("apply_filters") as st:
+                    rows = apply_filters(
+                        df=current.df, index=current.index, spatial_index=current.spatial_index, **filters
+                    )
+                    st.rows = len(rows)
+                progress(f"Aggregating {len(rows):,} rows...")
+                with metrics.stage("aggregate") as st:
+                    agg = aggregate_frame(rows)
+                    st.rows = len(rows)
+            return agg.compact()
+
+        return cache.get_or_compute(("aggregates", current.version, key), compute)
+
+    def render_part(name, agg, current=None):
+        """
+        (input digest, serialized output) of one report part. Parts are
+        cached by the digest of their own inputs, so selections that leave
+        a chart unchanged share it; unfiltered parts are never evicted.
+        """
+        digest = part_digest(name, agg)
+
+        def compute():
+            with metrics.stage(f"figure:{name}"):
+                out = REPORT_PARTS[name](agg)
+            with metrics.stage("serialize"):
+                return serialize_outputs(out if isinstance(out, tuple) else (out,))
+
+        current = current or data
+        if agg is current.base:
+            if name not in current.pinned:
+                current.pinned[name] = compute()
+            return digest, current.pinned[name]
+        return digest, cache.get_or_compute((name, digest), compute)
+
+    def cached_report(**filters):
+        """All nine report outputs for a filter combination (used for warm-up)."""
+        current = data
+        agg = selection_aggregates(filters, current)
+        return tuple(out for name in REPORT_PARTS for out in render_part(name, agg, current)[1])
+
+    def extend(rows, replaced=None, version=""):
+        """Swap in the data with refreshed rows added; cached selections are keyed by version."""
+        nonlocal data
+        data = extend_data(data, rows, replaced, version, shared_path=shared_path)
+        cache.reset(version)
+
+    cached_report.extend = extend
+
+    def resolve_filters(query, values):
+        """
+        Dropdown values, with empty dropdowns filled from the search text.
+        Leftover words found in the word index (e.g. "truck", a street
+        name) become the free-text filter; the rest are ignored.
+        """
+        current = data
+        with metrics.stage("parse_search_query"):
+            parsed = current.search.parse(query)
+        filters = {field: values[field] or parsed[field] for field in FILTER_DROPDOWNS}
+        words = current.index.known_terms(" ".join(parsed["keywords"]))
+        if words:
+            filters["search_text"] = " ".join(words)
+        return filters
+
+    dropdown_states = [State(component, "value") for component in FILTER_DROPDOWNS.values()]
+
     # ----------------------------------------------------------
     # CALLBACK 1 — SEARCH BAR → AUTO-FILL FILTERS
     # ----------------------------------------------------------
     @app.callback(
-        [
-            Output("borough-dropdown", "value"),
-            Output("year-dropdown", "value"),
-            Output("person-type-dropdown", "value"),
-            Output("injury-dropdown", "value"),
-            Output("filter-summary", "children"),
-        ],
+        [Output(component, "value") for component in FILTER_DROPDOWNS.values()]
+        + [Output("filter-summary", "children")],
         Input("generate-button", "n_clicks"),
-        [
-            State("search-input", "value"),
-            State("borough-dropdown", "value"),
-            State("year-dropdown", "value"),
-            State("person-type-dropdown", "value"),
-            State("injury-dropdown", "value"),
-        ],
+        [State("search-input", "value")] + dropdown_states + [State("map-selection", "data")],
     )
-    def update_filters(n_clicks, query, b, y, p, inj):
+    def update_filters(n_clicks, query, *states):
+        values = dict(zip(FILTER_DROPDOWNS, states))
+        area = states[-1]
+
         # Before clicking — leave everything unchanged
         if not n_clicks:
-            return b, y, p, inj, "Adjust filters or type a search."
-
-        parsed = parse_search_query(query) or {}
-
-        # Auto-fill only empty filters
-        b2 = b or parsed.get("borough")
-        y2 = y or parsed.get("year")
-        p2 = p or parsed.get("person_type")
-        inj2 = inj or parsed.get("injury")
-
-        summary_parts = []
-        if b2:
-            summary_parts.append(f"Borough: {b2}")
-        if y2:
-            summary_parts.append(f"Year: {y2}")
-        if p2:
-            summary_parts.append(f"Person: {p2}")
-        if inj2:
-            summary_parts.append(f"Injury: {inj2}")
+            return list(values.values()) + ["Adjust filters or type a search."]
+
+        # Auto-fill only empty filters (dropdowns are multi-select lists)
+        filled = resolve_filters(query, values)
+
+        summary_parts = [
+            f"{FILTER_LABELS[field]}: {_join(_display(field, v) for v in chosen)}"
+            for field, chosen in filled.items()
+            if chosen and field in FILTER_DROPDOWNS
+        ]
+        if filled.get("search_text"):
+            summary_parts.append(f"Text: {filled['search_text']}")
+        if selection_to_shape(area):
+            summary_parts.append("Area: map selection")
 
         summary = " | ".join(summary_parts) if summary_parts else "No filters applied."
 
-        return b2, y2, p2, inj2, summary
+        return [filled[field] for field in FILTER_DROPDOWNS] + [summary]
 
     # ----------------------------------------------------------
-    # CALLBACK 2 — GENERATE REPORT → UPDATE ALL CHARTS
+    # CALLBACK 2 — GENERATE REPORT → SHARED SELECTION
     # ----------------------------------------------------------
-    @app.callback(
-        [
-            Output("summary-total-crashes", "children"),
-            Output("summary-total-persons", "children"),
-            Output("summary-total-injuries", "children"),
-            Output("summary-total-fatalities", "children"),
-            Output("time-series-graph", "figure"),
-            Output("borough-bar-graph", "figure"),
-            Output("injury-pie-graph", "figure"),
-            Output("location-scatter-graph", "figure"),
-            Output("heatmap-graph", "figure"),
-        ],
-        Input("generate-button", "n_clicks"),
-        [
-            State("borough-dropdown", "value"),
-            State("year-dropdown", "value"),
-            State("vehicle-dropdown", "value"),
-            State("factor-dropdown", "value"),
-            State("injury-dropdown", "value"),
-            State("person-type-dropdown", "value"),
-        ],
-    )
-    def generate_report(n_clicks, borough, year, vehicle, factor, injury, person_type):
+    def build_selection(set_progress, n_clicks, query, *states):
 
         # Before clicking: show entire data
         if not n_clicks:
-            data = df.copy()
-        else:
-            data = apply_filters(
-                df=df,
-                borough=borough,
-                year=year,
-                vehicle_type=vehicle,
-                factor=factor,
-                injury=injury,
-                person_type=person_type,
-            )
+            return {"filters": {}}
 
-        # =====================
-        # KPI CARDS
-        # =====================
+        # Same resolution as update_filters, so the search applies on this click
+        filters = resolve_filters(query, dict(zip(FILTER_DROPDOWNS, states)))
+        filters.update(selection_to_shape(states[-1]))
 
-        # 1) Total crashes
-        if COL_COLLISION_ID in data.columns:
-            total_crashes = data[COL_COLLISION_ID].nunique()
-        else:
-            total_crashes = len(data)
-
-        # 2) Total persons
-        total_persons = len(data)
-
-        # 3–4) Injuries & fatalities
-        injuries = 0
-        fatalities = 0
-        if COL_PERSON_INJURY in data.columns:
-            injury_col = data[COL_PERSON_INJURY].astype(str).str.lower()
-            injuries = injury_col.str.contains("injur").sum()
-            fatalities = injury_col.str.contains("fatal|kill").sum()
-
-        # =====================
-        # TIME SERIES GRAPH
-        # =====================
-        if COL_MONTH in data.columns and COL_YEAR in data.columns:
-            group = (
-                data.groupby([COL_YEAR, COL_MONTH])
-                .size()
-                .reset_index(name="count")
-            )
-            group["YM"] = group[COL_YEAR].astype(str) + "-" + group[COL_MONTH].astype(str)
-            fig_time = px.line(group, x="YM", y="count", markers=True)
-        elif COL_YEAR in data.columns:
-            group = data.groupby([COL_YEAR]).size().reset_index(name="count")
-            fig_time = px.line(group, x=COL_YEAR, y="count", markers=True)
-        else:
-            fig_time = px.line(title="Year data missing")
+        # Aggregate once here; the part callbacks below read it from the cache
+        with metrics.request("generate_report", filters=filters) as timing:
+            selection_aggregates(filters, progress=set_progress)
+        if background:
+            # Recorded in the job process, which exits: hand the timings to
+            # the worker with the selection (folded in by the first part)
+            return {"filters": filters, "timing": timing}
+        return {"filters": filters}
 
-        fig_time.update_layout(height=350, margin=dict(l=40, r=20, t=40, b=40))
+    report_inputs = (
+        Output("report-selection", "data"),
+        Input("generate-button", "n_clicks"),
+        [State("search-input", "value")] + dropdown_states + [State("map-selection", "data")],
+    )
+    if background:
+        # A job process per click; Dash kills the page's previous job when
+        # the button fires again before it finished
+        @app.callback(
+            *report_inputs,
+            background=True,
+            progress=Output("report-progress", "children"),
+        )
+        def generate_report(set_progress, n_clicks, query, *states):
+            return build_selection(set_progress, n_clicks, query, *states)
+    else:
+        @app.callback(*report_inputs)
+        def generate_report(n_clicks, query, *states):
+            return build_selection(None, n_clicks, query, *states)
 
-        # =====================
-        # BOROUGH BAR CHART
-        # =====================
-        if COL_BOROUGH in data.columns:
-            boro_data = data[COL_BOROUGH].value_counts().reset_index()
-            boro_data.columns = [COL_BOROUGH, "count"]
-            fig_boro = px.bar(boro_data, x=COL_BOROUGH, y="count")
-        else:
-            fig_boro = px.bar(title="BOROUGH column missing")
+    # ----------------------------------------------------------
+    # CALLBACK 2b — ONE CALLBACK PER REPORT PART
+    # ----------------------------------------------------------
+    # Each part is its own request, so it reaches the browser as soon as it
+    # is ready. Parts whose input digest matches the one last sent are
+    # skipped (no_update), so unchanged charts are neither re-sent nor redrawn.
+    def register_part(name, outputs):
+        @app.callback(
+            [Output(component, prop) for component, prop in outputs]
+            + [Output(f"{name}-digest", "data")],
+            Input("report-selection", "data"),
+            State(f"{name}-digest", "data"),
+        )
+        def update_part(selection, last_digest):
+            if name == timing_part and (selection or {}).get("timing"):
+                metrics.merge(selection["timing"])
+            with metrics.request(f"part:{name}"):
+                current = data
+                agg = selection_aggregates((selection or {}).get("filters") or {}, current)
+                if part_digest(name, agg) == last_digest:
+                    return [no_update] * (len(outputs) + 1)
+                digest, out = render_part(name, agg, current)
+            return list(out) + [digest]
 
-        fig_boro.update_layout(height=350, margin=dict(l=40, r=20, t=40, b=40))
+    # Exactly one part per selection records a background job's timings
+    timing_part = next(iter(PART_OUTPUTS))
+    for name, outputs in PART_OUTPUTS.items():
+        register_part(name, outputs)
 
-        # =====================
-        # INJURY PIE CHART
-        # =====================
-        if COL_PERSON_INJURY in data.columns:
-            inj_data = data[COL_PERSON_INJURY].value_counts().reset_index()
-            inj_data.columns = [COL_PERSON_INJURY, "count"]
-            fig_injury = px.pie(inj_data, names=COL_PERSON_INJURY, values="count")
-        else:
-            fig_injury = px.pie(title="PERSON_INJURY missing")
+    # ----------------------------------------------------------
+    # CALLBACK 3 — MAP BOX/LASSO SELECTION → REPORT AREA
+    # ----------------------------------------------------------
+    @app.callback(
+        Output("map-selection", "data"),
+        Input("location-scatter-graph", "selectedData"),
+    )
+    def store_map_selection(selected):
+        # Kept raw; the next report click turns it into bbox/polygon filters
+        return selected if selection_to_shape(selected) else None
 
-        fig_injury.update_layout(
-            height=350,
-            margin=dict(l=40, r=20, t=40, b=40),
-            legend=dict(orientation="h", yanchor="bottom", y=-0.2, xanchor="center", x=0.5),
+    # ----------------------------------------------------------
+    # CALLBACK 4 — DROPDOWN TYPING → MATCHING OPTIONS (server-side)
+    # ----------------------------------------------------------
+    def register_options(field_name, component):
+        @app.callback(
+            Output(component, "options"),
+            Input(component, "search_value"),
+            Input(component, "value"),
+            prevent_initial_call=True,
         )
+        def update_options(search_value, value):
+            vocab = data.vocabularies.get(field_name)
+            if vocab is None:
+                return no_update
+            labels = vocab.search(search_value) if search_value else vocab.top(top_options)
+            # Selected values (also those auto-filled by the search) stay listed
+            return vocab.options(labels, keep=value or [])
 
-        # =====================
-        # LOCATION MAP
-        # =====================
-        if COL_LAT in data.columns and COL_LON in data.columns:
-            loc = data.dropna(subset=[COL_LAT, COL_LON])
-            if len(loc) > 3000:
-                loc = loc.sample(3000)
-            fig_loc = px.scatter_geo(loc, lat=COL_LAT, lon=COL_LON)
-        else:
-            fig_loc = px.scatter(title="Latitude/Longitude missing")
-
-        fig_loc.update_layout(height=400, margin=dict(l=40, r=20, t=40, b=40))
-
-        # =====================
-        # HEATMAP (HOUR × BOROUGH)
-        # =====================
-        if COL_HOUR in data.columns and COL_BOROUGH in data.columns:
-            hm = data.groupby([COL_BOROUGH, COL_HOUR]).size().reset_index(name="count")
-            fig_heat = px.density_heatmap(
-                hm,
-                x=COL_HOUR,
-                y=COL_BOROUGH,
-                z="count",
-                nbinsx=24,
-            )
+    for field_name, vocab in data.vocabularies.items():
+        if len(vocab) > top_options:
+            register_options(field_name, FILTER_DROPDOWNS[field_name])
+
+    return cached_report
+
+
+# Filter argument -> dropdown id, in apply_filters' argument order
+FILTER_DROPDOWNS = {
+    "borough": "borough-dropdown",
+    "year": "year-dropdown",
+    "vehicle_type": "vehicle-dropdown",
+    "factor": "factor-dropdown",
+    "injury": "injury-dropdown",
+    "person_type": "person-type-dropdown",
+    "months": "month-dropdown",
+    "hours": "hour-dropdown",
+}
+
+FILTER_LABELS = {
+    "borough": "Borough",
+    "year": "Year",
+    "vehicle_type": "Vehicle",
+    "factor": "Factor",
+    "injury": "Injury",
+    "person_type": "Person",
+    "months": "Months",
+    "hours": "Hours",
+}
+
+
+def _display(field: str, value) -> str:
+    if field == "months":
+        return calendar.month_abbr[int(value)]
+    if field == "hours":
+        return f"{int(value):02d}:00"
+    return str(value)
+
+
+def _join(values) -> str:
+    return ", ".join(str(v) for v in values)
+
+
+# ----------------------------------------------------------
+# REPORT PARTS — KPI strings + one figure each (components/figures.py)
+# ----------------------------------------------------------
+def kpi_outputs(agg: ReportAggregates) -> tuple:
+    return (
+        f"{agg.total_crashes:,}",
+        f"{agg.total_persons:,}",
+        f"{agg.injuries:,}",
+        f"{agg.fatalities:,}",
+    )
+
+
+# Part name -> builder, in generate_report's original output order
+REPORT_PARTS = {
+    "kpis": kpi_outputs,
+    "time-series": time_series_figure,
+    "borough-bar": borough_figure,
+    "injury-pie": injury_figure,
+    "location-map": location_figure,
+    "heatmap": heatmap_figure,
+}
+
+# Part name -> the (component, property) outputs it fills
+PART_OUTPUTS = {
+    "kpis": [
+        ("summary-total-crashes", "children"),
+        ("summary-total-persons", "children"),
+        ("summary-total-injuries", "children"),
+        ("summary-total-fatalities", "children"),
+    ],
+    "time-series": [("time-series-graph", "figure")],
+    "borough-bar": [("borough-bar-graph", "figure")],
+    "injury-pie": [("injury-pie-graph", "figure")],
+    "location-map": [("location-scatter-graph", "figure")],
+    "heatmap": [("heatmap-graph", "figure")],
+}
+
+
+def _part_inputs(name: str, agg: ReportAggregates):
+    """The slice of the aggregates a part is drawn from."""
+    if name == "kpis":
+        return (agg.total_crashes, agg.total_persons, agg.injuries, agg.fatalities)
+    if name == "location-map":
+        return pick_density_level(agg.density) if agg.has_locations else None
+    return {
+        "time-series": agg.by_year_month,
+        "borough-bar": agg.by_borough,
+        "injury-pie": agg.by_injury,
+        "heatmap": agg.by_borough_hour,
+    }[name]
+
+
+def part_digest(name: str, agg: ReportAggregates) -> str:
+    """Content hash of a part's inputs: equal digests draw identical outputs."""
+    h = hashlib.sha1(name.encode())
+    parts = _part_inputs(name, agg)
+    for part in parts if isinstance(parts, tuple) else (parts,):
+        if isinstance(part, pd.Series):
+            h.update(repr(part.index.names).encode())
+            h.update(pd.util.hash_pandas_object(part, index=True).to_numpy().tobytes())
         else:
-            fig_heat = px.imshow([[0]], title="Hour or Borough missing")
-
-        fig_heat.update_layout(height=350, margin=dict(l=40, r=20, t=40, b=40))
-
-        return (
-            f"{total_crashes:,}",
-            f"{total_persons:,}",
-            f"{injuries:,}",
-            f"{fatalities:,}",
-            fig_time,
-            fig_boro,
-            fig_injury,
-            fig_loc,
-            fig_heat,
-        )
+            h.update(repr(part).encode())
+    return h.hexdigest()
+
+
+def report_outputs(agg: ReportAggregates) -> tuple:
+    """Build all nine report outputs (KPIs, then figures) from aggregates."""
+    outputs = ()
+    for builder in REPORT_PARTS.values():
+        out = builder(agg)
+        outputs += out if isinstance(out, tuple) else (out,)
+    return outputs
+
+
+def serialize_outputs(outputs: tuple) -> tuple:
+    """
+    Turn figures into plain dicts so reports can be cached and shared, with
+    their numeric arrays packed as typed arrays (see figures.pack_figure).
+    """
+    out = []
+    for value in outputs:
+        if hasattr(value, "to_plotly_json"):
+            value = value.to_plotly_json()
+        out.append(pack_figure(value) if isinstance(value, dict) and "data" in value else value)
+    return tuple(out)
@@ -0,0 +1,239 @@
+import base64
+from typing import List, Dict, Any
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import plotly.io as pio
+
+from project.utils.aggregates import ReportAggregates
+from project.utils.spatial import pick_density_level, cell_centers
+from project.utils.load_data import (
+    COL_BOROUGH,
+    COL_YEAR,
+    COL_HOUR,
+    COL_PERSON_INJURY,
+)
+
+MARGIN = dict(l=40, r=20, t=40, b=40)
+NYC_CENTER = dict(lat=40.7128, lon=-73.95)
+
+
+class FigureTemplate:
+    """
+    A figure validated once by graph_objects, kept as plain dicts.
+
+    render() copies only the trace dicts and drops new arrays into them, so
+    a request pays neither Plotly Express's DataFrame processing nor
+    graph_objects validation. The returned layout is shared: do not mutate.
+    The default template keeps only the trace types the figure draws.
+    """
+
+    def __init__(self, traces: List[Any], **layout):
+        spec = go.Figure(data=traces, layout=layout).to_plotly_json()
+        template = spec["layout"].get("template") or pio.templates[pio.templates.default].to_plotly_json()
+        types = {trace.get("type") for trace in spec["data"]}
+        spec["layout"]["template"] = {
+            **template,
+            "data": {k: v for k, v in template.get("data", {}).items() if k in types},
+        }
+        self.data: List[Dict[str, Any]] = spec["data"]
+        self.layout: Dict[str, Any] = spec["layout"]
+
+    def render(self, *trace_values: Dict[str, Any], **layout) -> Dict[str, Any]:
+        data = [{**trace, **values} for trace, values in zip(self.data, trace_values)]
+        data += self.data[len(trace_values):]
+        return {"data": data, "layout": {**self.layout, **layout} if layout else self.layout}
+
+
+def _axes(x: str, y: str) -> Dict[str, Any]:
+    return dict(xaxis=dict(title=dict(text=x)), yaxis=dict(title=dict(text=y)))
+
+
+def _message(title: str, height: int = 350) -> Dict[str, Any]:
+    """Empty figure with a title, for charts whose columns are missing."""
+    return FigureTemplate([], title=dict(text=title), height=height, margin=MARGIN).render()
+
+
+SEQUENTIAL = [list(step) for step in pio.templates[pio.templates.default].layout.colorscale.sequential]
+
+# ===========================
+# Templates (built once at import)
+# ===========================
+TIME_SERIES = FigureTemplate(
+    [go.Scatter(
+        mode="lines+markers",
+        marker=dict(symbol="circle"),
+        line=dict(color="#636efa", dash="solid"),
+        hovertemplate="%{x}<br>count=%{y}<extra></extra>",
+        showlegend=False,
+    )],
+    height=350, margin=MARGIN, **_axes("YM", "count"),
+)
+
+BOROUGH_BAR = FigureTemplate(
+    [go.Bar(
+        marker=dict(color="#636efa"),
+        hovertemplate=f"{COL_BOROUGH}=%{{x}}<br>count=%{{y}}<extra></extra>",
+        showlegend=False,
+    )],
+    height=350, margin=MARGIN, **_axes(COL_BOROUGH, "count"),
+)
+
+INJURY_PIE = FigureTemplate(
+    [go.Pie(hovertemplate=f"{COL_PERSON_INJURY}=%{{label}}<br>count=%{{value}}<extra></extra>")],
+    height=350,
+    margin=MARGIN,
+    legend=dict(orientation="h", yanchor="bottom", y=-0.2, xanchor="center", x=0.5),
+)
+
+DENSITY_MAP = FigureTemplate(
+    [
+        go.Densitymap(
+            radius=8,
+            coloraxis="coloraxis",
+            hovertemplate="%{z:,} persons<extra></extra>",
+        ),
+        # Invisible bin markers so box/lasso selection works on the map
+        go.Scattermap(
+            mode="markers",
+            marker=dict(size=10, opacity=0),
+            hovertemplate="%{customdata:,} persons<extra></extra>",
+            showlegend=False,
+        ),
+    ],
+    height=400,
+    margin=MARGIN,
+    map=dict(center=NYC_CENTER, zoom=9, style="carto-positron"),
+    coloraxis=dict(colorscale=SEQUENTIAL, colorbar=dict(title=dict(text="persons"))),
+)
+
+HOUR_HEATMAP = FigureTemplate(
+    [go.Heatmap(
+        coloraxis="coloraxis",
+        hovertemplate="hour=%{x}<br>%{y}<br>count=%{z}<extra></extra>",
+    )],
+    height=350,
+    margin=MARGIN,
+    coloraxis=dict(colorscale=SEQUENTIAL, colorbar=dict(title=dict(text="count"))),
+    **_axes(COL_HOUR, COL_BOROUGH),
+)
+
+MISSING = {
+    "time": _message("Year data missing"),
+    "borough": _message("BOROUGH column missing"),
+    "injury": _message("PERSON_INJURY missing"),
+    "location": _message("Latitude/Longitude missing", height=400),
+    "heatmap": _message("Hour or Borough missing"),
+}
+
+
+# ===========================
+# Builders: aggregates -> figure dicts
+# ===========================
+def time_series_figure(agg: ReportAggregates) -> Dict[str, Any]:
+    counts = agg.by_year_month
+    if counts is None:
+        return MISSING["time"]
+    counts = counts.sort_index()
+    if counts.index.nlevels == 2:
+        years = counts.index.get_level_values(0).astype(str)
+        months = counts.index.get_level_values(1).astype(str)
+        x = np.asarray(years + "-" + months, dtype=object)
+        return TIME_SERIES.render(dict(x=x, y=counts.to_numpy()))
+    return TIME_SERIES.render(
+        dict(x=counts.index.to_numpy(), y=counts.to_numpy()),
+        xaxis={**TIME_SERIES.layout["xaxis"], "title": dict(text=COL_YEAR)},
+    )
+
+
+def borough_figure(agg: ReportAggregates) -> Dict[str, Any]:
+    if agg.by_borough is None:
+        return MISSING["borough"]
+    counts = agg.by_borough.sort_values(ascending=False)
+    return BOROUGH_BAR.render(dict(
+        x=np.asarray(counts.index, dtype=object), y=counts.to_numpy()
+    ))
+
+
+def injury_figure(agg: ReportAggregates) -> Dict[str, Any]:
+    if agg.by_injury is None:
+        return MISSING["injury"]
+    counts = agg.by_injury.sort_values(ascending=False)
+    return INJURY_PIE.render(dict(
+        labels=np.asarray(counts.index, dtype=object), values=counts.to_numpy()
+    ))
+
+
+def location_figure(agg: ReportAggregates) -> Dict[str, Any]:
+    if not agg.has_locations:
+        return MISSING["location"]
+    # Binned counts: payload is bounded by MAX_MAP_BINS, not by crashes
+    size, bins = pick_density_level(agg.density)
+    lat, lon = cell_centers(bins.index.to_numpy(), size)
+    z = bins.to_numpy()
+    return DENSITY_MAP.render(
+        dict(lat=lat, lon=lon, z=z),
+        dict(lat=lat, lon=lon, customdata=z),
+    )
+
+
+def heatmap_figure(agg: ReportAggregates) -> Dict[str, Any]:
+    counts = agg.by_borough_hour
+    if counts is None:
+        return MISSING["heatmap"]
+    # Already grouped by (borough, hour): lay the counts out on the grid
+    # directly instead of letting a histogram re-bin them
+    if len(counts):
+        grid = counts.unstack(fill_value=0).sort_index()
+    else:
+        grid = pd.DataFrame(dtype="int64")
+    grid = grid.reindex(columns=range(24), fill_value=0)
+    return HOUR_HEATMAP.render(dict(
+        x=np.arange(24),
+        y=np.asarray(grid.index, dtype=object),
+        z=grid.to_numpy(),
+    ))
+
+
+# ===========================
+# Wire encoding
+# ===========================
+# Narrowest Plotly.js typed-array type per integer range (no 64-bit ints)
+_INT_TYPES = [np.uint8, np.int8, np.uint16, np.int16, np.uint32, np.int32]
+
+
+def typed_array(values: np.ndarray) -> Dict[str, Any]:
+    """
+    Plotly.js typed-array spec ({dtype, bdata, shape}) of a numeric array:
+    base64 of the raw bytes instead of decimal text. Counts take the
+    narrowest integer type that holds them; floats (the map coordinates)
+    are sent as float32, about half a metre at NYC's latitude.
+    """
+    if values.dtype.kind == "f":
+        packed = values.astype(np.float32)
+    else:
+        lo, hi = (int(values.min()), int(values.max())) if values.size else (0, 0)
+        packed = next(
+            (values.astype(t) for t in _INT_TYPES if np.iinfo(t).min <= lo and hi <= np.iinfo(t).max),
+            values.astype(np.float64),
+        )
+    packed = np.ascontiguousarray(packed)
+    spec = {"dtype": packed.dtype.str[1:], "bdata": base64.b64encode(packed.tobytes()).decode("ascii")}
+    if packed.ndim > 1:
+        spec["shape"] = ", ".join(str(n) for n in packed.shape)
+    return spec
+
+
+def pack_figure(fig: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy of a figure dict with its numeric trace arrays sent as typed arrays."""
+    data = [
+        {
+            key: typed_array(value)
+            if isinstance(value, np.ndarray) and value.dtype.kind in "iuf"
+            else value
+            for key, value in trace.items()
+        }
+        for trace in fig.get("data", [])
+    ]
+    return {**fig, "data": data}
@@ -1,9 +1,13 @@
+import calendar
+
 from dash import html, dcc
 import dash_bootstrap_components as dbc
 import pandas as pd
 
+from project.utils.options import DEFAULT_TOP_OPTIONS, build_vocabularies
+
 
-def create_layout(df: pd.DataFrame) -> html.Div:
+def create_layout(df: pd.DataFrame, top_options: int = DEFAULT_TOP_OPTIONS) -> html.Div:
     """
     Create the full Dash layout for the NYC collisions dashboard.
 
@@ -14,22 +18,37 @@ def create_layout(df: pd.DataFrame) -> html.Div:
       - CONTRIBUTING_FACTOR_VEHICLE_1
       - PERSON_TYPE
       - PERSON_INJURY
+      - CRASH_MONTH, CRASH_HOUR
+
+    Every filter dropdown is multi-select (values OR within a dropdown,
+    AND across dropdowns). The label dropdowns ship only their
+    `top_options` most frequent values; typing searches the rest on the
+    server (see the dropdown-options callbacks).
     """
 
-    # ---- Safe unique-option helpers ----
-    def sorted_unique(col):
-        if col not in df.columns:
+    # ---- Most frequent labels per dropdown (counted once) ----
+    vocabularies = build_vocabularies(df)
+
+    def top_values(field):
+        vocab = vocabularies.get(field)
+        if vocab is None:
             return []
-        return sorted(v for v in df[col].dropna().unique())
+        if len(vocab) <= top_options:
+            return sorted(vocab.labels)  # complete list: keep it alphabetical
+        return vocab.top(top_options)
 
-    borough_options = sorted_unique("BOROUGH")
+    borough_options = top_values("borough")
     year_options = sorted(
         int(y) for y in df["CRASH_YEAR"].dropna().unique()
     ) if "CRASH_YEAR" in df.columns else []
-    vehicle_type_options = sorted_unique("VEHICLE_TYPE_CODE_1")
-    factor_options = sorted_unique("CONTRIBUTING_FACTOR_VEHICLE_1")
-    person_type_options = sorted_unique("PERSON_TYPE")
-    injury_options = sorted_unique("PERSON_INJURY")
+    vehicle_type_options = top_values("vehicle_type")
+    factor_options = top_values("factor")
+    person_type_options = top_values("person_type")
+    injury_options = top_values("injury")
+    month_options = sorted(
+        int(m) for m in df["CRASH_MONTH"].dropna().unique()
+    ) if "CRASH_MONTH" in df.columns else []
+    hour_options = list(range(24)) if "CRASH_HOUR" in df.columns else []
 
     # ======================= LAYOUT ==========================
     return dbc.Container(
@@ -76,7 +95,8 @@ def create_layout(df: pd.DataFrame) -> html.Div:
                                             {"label": b, "value": b}
                                             for b in borough_options
                                         ],
-                                        placeholder="Select borough",
+                                        placeholder="Select boroughs",
+                                        multi=True,
                                         clearable=True,
                                     ),
                                 ],
@@ -91,7 +111,8 @@ def create_layout(df: pd.DataFrame) -> html.Div:
                                             {"label": int(y), "value": int(y)}
                                             for y in year_options
                                         ],
-                                        placeholder="Select year",
+                                        placeholder="Select years",
+                                        multi=True,
                                         clearable=True,
                                     ),
                                 ],
@@ -106,7 +127,8 @@ def create_layout(df: pd.DataFrame) -> html.Div:
                                             {"label": v, "value": v}
                                             for v in vehicle_type_options
                                         ],
-                                        placeholder="Select vehicle type",
+                                        placeholder="Select or type vehicle types",
+                                        multi=True,
                                         clearable=True,
                                     ),
                                 ],
@@ -123,7 +145,8 @@ def create_layout(df: pd.DataFrame) -> html.Div:
                                             {"label": f, "value": f}
                                             for f in factor_options
                                         ],
-                                        placeholder="Select factor",
+                                        placeholder="Select or type factors",
+                                        multi=True,
                                         clearable=True,
                                     ),
                                 ],
@@ -138,7 +161,8 @@ def create_layout(df: pd.DataFrame) -> html.Div:
                                             {"label": p, "value": p}
                                             for p in person_type_options
                                         ],
-                                        placeholder="Select person type",
+                                        placeholder="Select person types",
+                                        multi=True,
                                         clearable=True,
                                     ),
                                 ],
@@ -153,7 +177,46 @@ def create_layout(df: pd.DataFrame) -> html.Div:
                                             {"label": i, "value": i}
                                             for i in injury_options
                                         ],
-                                        placeholder="Select injury",
+                                        placeholder="Select injuries",
+                                        multi=True,
+                                        clearable=True,
+                                    ),
+                                ],
+                            ),
+                        ],
+                    ),
+
+                    dbc.Row(
+                        className="filters-row",
+                        children=[
+                            dbc.Col(
+                                className="filter-item",
+                                children=[
+                                    html.Div("Month", className="small-label"),
+                                    dcc.Dropdown(
+                                        id="month-dropdown",
+                                        options=[
+                                            {"label": calendar.month_abbr[m], "value": m}
+                                            for m in month_options
+                                        ],
+                                        placeholder="Select months",
+                                        multi=True,
+                                        clearable=True,
+                                    ),
+                                ],
+                            ),
+                            dbc.Col(
+                                className="filter-item",
+                                children=[
+                                    html.Div("Hour of day", className="small-label"),
+                                    dcc.Dropdown(
+                                        id="hour-dropdown",
+                                        options=[
+                                            {"label": f"{h:02d}:00", "value": h}
+                                            for h in hour_options
+                                        ],
+                                        placeholder="Select hours",
+                                        multi=True,
                                         clearable=True,
                                     ),
                                 ],
@@ -185,6 +248,16 @@ def create_layout(df: pd.DataFrame) -> html.Div:
                             "color": "#555",
                         },
                     ),
+
+                    # Stage of a report still being aggregated (background jobs)
+                    html.Div(
+                        id="report-progress",
+                        style={
+                            "marginTop": "4px",
+                            "fontSize": "12px",
+                            "color": "#2563eb",
+                        },
+                    ),
                 ],
             ),
 
@@ -294,10 +367,12 @@ def create_layout(df: pd.DataFrame) -> html.Div:
                         className="graph-card graph-half",
                         children=[
                             html.H3(
-                                "Crash locations (sample)",
+                                "Crash density",
                                 style={"fontSize": "17px", "marginBottom": "8px"},
                             ),
                             dcc.Graph(id="location-scatter-graph", style={"height": "350px"}),
+                            # Last box/lasso selection on the map (report area)
+                            dcc.Store(id="map-selection"),
                         ],
                     ),
                 ],
@@ -319,5 +394,17 @@ def create_layout(df: pd.DataFrame) -> html.Div:
                     ),
                 ],
             ),
+
+            # ---------------- REPORT STATE ----------------
+            # Current filter selection (aggregated once, server-side) and the
+            # input digest of what each report part last rendered
+            dcc.Store(id="report-selection"),
+            *[
+                dcc.Store(id=f"{part}-digest")
+                for part in [
+                    "kpis", "time-series", "borough-bar",
+                    "injury-pie", "location-map", "heatmap",
+                ]
+            ],
         ],
     )
@@ -0,0 +1,5 @@
+import sys
+
+from project.pipeline.run import main
+
+sys.exit(main())
@@ -0,0 +1,89 @@
+import io
+from pathlib import Path
+from typing import List, Tuple, Union
+
+import pandas as pd
+
+from project.pipeline.stages import CRASH_DATE, CRASH_TIME
+
+# Bytes scanned per read while looking for chunk boundaries
+_SCAN_BLOCK = 16 << 20
+
+
+def read_header(path: Union[Path, str]) -> Tuple[List[str], int]:
+    """Column names of a CSV and the byte offset where its data starts."""
+    with open(path, "rb") as f:
+        line = f.readline()
+    return list(pd.read_csv(io.BytesIO(line), nrows=0).columns), len(line)
+
+
+def split_csv(path: Union[Path, str], chunk_bytes: int) -> List[Tuple[int, int]]:
+    """
+    (start, end) byte ranges of roughly `chunk_bytes` that each hold whole
+    CSV records, so workers can parse their own range without the driver
+    reading the data for them.
+
+    A boundary is the first newline past the target offset that is outside
+    quotes (even number of '"' since the header), so quoted fields with
+    embedded newlines never straddle two chunks.
+    """
+    path = Path(path)
+    size = path.stat().st_size
+    _, start = read_header(path)
+
+    bounds = [start]
+    target = start + chunk_bytes
+    quotes = 0  # '"' seen before `base`
+    with open(path, "rb") as f:
+        f.seek(start)
+        base = start
+        while target < size:
+            block = f.read(_SCAN_BLOCK)
+            if not block:
+                break
+            end = base + len(block)
+            while target < end:
+                pos = block.find(b"\n", max(target - base, 0))
+                while pos != -1 and (quotes + block.count(b'"', 0, pos)) % 2:
+                    pos = block.find(b"\n", pos + 1)
+                if pos == -1:
+                    break  # boundary lies in the next block
+                bounds.append(base + pos + 1)
+                target = bounds[-1] + chunk_bytes
+            quotes += block.count(b'"')
+            base = end
+
+    if bounds[-1] < size:
+        bounds.append(size)
+    return [(a, b) for a, b in zip(bounds, bounds[1:]) if b > a]
+
+
+def read_chunk(
+    path: Union[Path, str],
+    start: int,
+    end: int,
+    names: List[str],
+    **read_csv_kwargs,
+) -> pd.DataFrame:
+    """Parse the records in bytes [start, end) of a CSV whose header is `names`."""
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return pd.read_csv(io.BytesIO(data), header=None, names=names, **read_csv_kwargs)
+
+
+def write_csv(df: pd.DataFrame, path: Path, header: bool = True) -> None:
+    """
+    Write through Arrow's CSV writer (~10x DataFrame.to_csv). CRASH DATE
+    is written as a date and CRASH TIME as a time of day, like the
+    notebook's output.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for col, kind in ((CRASH_DATE, pa.date32()), (CRASH_TIME, pa.time32("s"))):
+        if col in table.column_names and pa.types.is_timestamp(table.schema.field(col).type):
+            table = table.set_column(table.column_names.index(col), col, pc.cast(table[col], kind))
+    pa_csv.write_csv(table, str(path), pa_csv.WriteOptions(include_header=header, quoting_style="needed"))
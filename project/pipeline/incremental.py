@@ -0,0 +1,174 @@
+"""
+Append the new and changed collisions of a crashes/persons drop to the
+integrated dataset, instead of rebuilding it.
+
+    python -m project.pipeline.incremental --crashes crashes_drop.csv --persons persons_drop.csv
+
+A drop is any export of the two feeds (a daily delta or a full re-export).
+Rows older than the stored high-water mark (minus a look-back window for
+late amendments) are skipped before cleaning; the rest are cleaned with the
+statistics of the last full build, joined, and compared per collision with
+the stored content hashes. New and changed collisions become one new
+partition next to the dataset; load_data replaces earlier rows of a
+changed collision with the partition's.
+"""
+import argparse
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Optional, List, Dict, Tuple, Any, Union
+
+import numpy as np
+import pandas as pd
+
+from project.pipeline import stages, store
+from project.pipeline.chunks import write_csv
+from project.pipeline.stages import COLLISION_ID, CRASH_DATE, OUTPUT_COLUMNS
+from project.utils.load_data import DEFAULT_DATA_PATH, partitions_dir, read_manifest
+
+# NYPD amends crash records for a few weeks after the fact
+DEFAULT_LOOKBACK_DAYS = 30
+
+PathLike = Union[Path, str]
+
+_PREPARE = {"crashes": stages.prepare_crashes, "persons": stages.prepare_persons}
+
+
+def since_mark(
+    crashes: pd.DataFrame,
+    persons: pd.DataFrame,
+    mark: Dict[str, Any],
+    lookback_days: Optional[int] = DEFAULT_LOOKBACK_DAYS,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Raw rows at or past the high-water mark: crashes after the mark's date
+    minus `lookback_days`, or with a COLLISION_ID above it, and their
+    persons. lookback_days=None keeps every row.
+    """
+    if lookback_days is None or not mark.get("crash_date"):
+        return crashes, persons
+    cutoff = pd.Timestamp(date.fromisoformat(mark["crash_date"]) - timedelta(days=lookback_days))
+    dates = stages._to_datetime(crashes[CRASH_DATE], "%m/%d/%Y")
+    ids = stages.collision_key(crashes[COLLISION_ID])
+    keep = (dates >= cutoff).to_numpy() | (ids > (mark.get("collision_id") or -1)).fillna(False).to_numpy()
+    crashes = crashes[keep]
+    persons = persons[stages.collision_key(persons[COLLISION_ID]).isin(ids[keep].dropna()).to_numpy()]
+    return crashes, persons
+
+
+def clean_delta(
+    crashes: pd.DataFrame, persons: pd.DataFrame, stats: Dict[str, Any]
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Every stage of the full build, with that build's fences, fills and modes."""
+    bounds, fills, modes = store.stats_from_json(stats)
+    out = {}
+    for kind, df in (("crashes", crashes), ("persons", persons)):
+        df = _PREPARE[kind](df.copy())
+        for col, value in fills.get(kind, {}).items():
+            if col in df.columns:
+                df[col] = df[col].fillna(value)
+        df = stages.clip(df, bounds.get(kind, {}))
+        df = df[~pd.Series(stages.row_hashes(df)).duplicated().to_numpy()].reset_index(drop=True)
+        out[kind] = stages.finish_crashes(df, modes) if kind == "crashes" else stages.finish_persons(df)
+    return out["crashes"], out["persons"]
+
+
+def refresh(
+    crashes_path: PathLike,
+    persons_path: PathLike,
+    out_path: PathLike = DEFAULT_DATA_PATH,
+    lookback_days: Optional[int] = DEFAULT_LOOKBACK_DAYS,
+) -> Dict[str, Any]:
+    """
+    Append the drop's new and changed collisions to `out_path` as one
+    partition; returns counts, the partition written (None when nothing
+    changed), the new high-water mark and seconds taken.
+    """
+    out_path = Path(out_path)
+    manifest = read_manifest(out_path)
+    if not manifest:
+        raise FileNotFoundError(
+            f"No refresh state in {partitions_dir(out_path)}; run a full build first (python -m project.pipeline)"
+        )
+    start = time.perf_counter()
+    mark = manifest["high_water"]
+
+    crashes = pd.read_csv(crashes_path, dtype=str)
+    persons = pd.read_csv(persons_path, dtype=str)
+    crashes.columns = [c.strip() for c in crashes.columns]
+    persons.columns = [c.strip() for c in persons.columns]
+    crashes, persons = since_mark(crashes, persons, mark, lookback_days)
+    crashes, persons = clean_delta(crashes, persons, manifest["stats"])
+    joined = stages.join(crashes, persons, OUTPUT_COLUMNS)
+
+    # New: never stored; changed: stored with a different content hash
+    keys = stages.collision_hashes(joined)
+    stored = store.read_collisions(out_path)
+    ids, hashes = keys[COLLISION_ID].to_numpy(), keys["hash"].to_numpy()
+    is_new = ~np.isin(ids, stored.index.to_numpy())
+    is_changed = np.zeros(len(ids), dtype=bool)
+    is_changed[~is_new] = stored.loc[ids[~is_new]].to_numpy() != hashes[~is_new]
+    delta = keys[is_new | is_changed]
+
+    result = {
+        "new": int(is_new.sum()),
+        "changed": int(is_changed.sum()),
+        "unchanged": int(len(keys) - len(delta)),
+        "rows": 0,
+        "partition": None,
+        "high_water": mark,
+    }
+    if len(delta):
+        rows = joined[joined[COLLISION_ID].isin(delta[COLLISION_ID])].reset_index(drop=True)
+        name = f"part-{len(manifest['partitions']) + 1:05d}.csv"
+        write_csv(rows, partitions_dir(out_path) / name)
+
+        mark = store.high_water([delta[COLLISION_ID].max()], [store.max_crash_date(rows)], previous=mark)
+        manifest["partitions"].append({
+            "file": name,
+            "rows": len(rows),
+            "new": result["new"],
+            "changed": result["changed"],
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        })
+        manifest["high_water"] = mark
+        # The manifest commits the partition; the hashes follow it. A crash
+        # in between only makes the next run publish the same collisions
+        # again (a later partition replaces their rows), never skip them
+        store.write_manifest(out_path, manifest)
+        kept = stored[~stored.index.isin(delta[COLLISION_ID])]
+        store.write_collisions(
+            out_path, pd.concat([kept, pd.Series(delta["hash"].to_numpy(), index=delta[COLLISION_ID].to_numpy())])
+        )
+        result.update(rows=len(rows), partition=name, high_water=mark)
+
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    print(
+        f"Refresh: {result['new']:,} new, {result['changed']:,} changed, "
+        f"{result['unchanged']:,} unchanged collisions; "
+        + (f"appended {result['rows']:,} rows as {result['partition']}" if result["partition"] else "nothing to append")
+        + f" ({result['seconds']:.1f}s, high-water {mark['crash_date']} / {mark['collision_id']})",
+        flush=True,
+    )
+    return result
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--crashes", type=Path, required=True, help="crashes drop (export of h9gi-nx95)")
+    parser.add_argument("--persons", type=Path, required=True, help="persons drop (export of f55k-p6yu)")
+    parser.add_argument("--out", type=Path, default=DEFAULT_DATA_PATH)
+    parser.add_argument(
+        "--lookback-days", type=int, default=DEFAULT_LOOKBACK_DAYS,
+        help="days before the high-water date still compared for amendments (-1: compare every row)",
+    )
+    args = parser.parse_args(argv)
+
+    lookback = None if args.lookback_days < 0 else args.lookback_days
+    refresh(args.crashes, args.persons, args.out, lookback_days=lookback)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
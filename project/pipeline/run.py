@@ -0,0 +1,310 @@
+"""
+Rebuild the integrated dataset from the NYC crashes and persons exports.
+
+    python -m project.pipeline                                  # download + rebuild
+    python -m project.pipeline --crashes Crashes.csv --persons Persons.csv --workers 8
+
+Every stage (parse, clean, clip, dedupe, impute, join) runs chunk by chunk
+in a process pool; workers read their own byte range of the CSVs and pass
+chunks between stages as Feather files. Statistics that need every row (IQR
+fences, the age median, group modes, duplicate rows) are combined in the
+driver from just the columns they need.
+
+A full build also records its statistics, collision hashes and high-water
+mark next to the output, so later drops can be appended with
+`python -m project.pipeline.incremental` instead of rebuilding.
+--partitioned also writes the year/borough store load_data(lazy=True)
+opens; after a refresh it is rebuilt on its next open.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional, List, Dict, Tuple, Any, Union
+
+import numpy as np
+import pandas as pd
+
+from project.pipeline.chunks import read_chunk, read_header, split_csv, write_csv
+from project.pipeline import stages, store
+from project.pipeline.stages import COLLISION_ID, OUTPUT_COLUMNS, PERSON_AGE
+from project.utils.load_data import DEFAULT_DATA_PATH, open_partitioned
+
+CRASHES_URL = "https://data.cityofnewyork.us/api/views/h9gi-nx95/rows.csv?accessType=download"
+PERSONS_URL = "https://data.cityofnewyork.us/api/views/f55k-p6yu/rows.csv?accessType=download"
+
+RAW_DIR = Path(__file__).resolve().parents[1] / "data" / "raw"
+DEFAULT_CRASHES = RAW_DIR / "crashes.csv"
+DEFAULT_PERSONS = RAW_DIR / "persons.csv"
+
+# Bytes of CSV per chunk (~150k crash rows); bounds each worker's memory
+DEFAULT_CHUNK_BYTES = 64 << 20
+
+PathLike = Union[Path, str]
+
+
+def _download(url: str, path: Path) -> None:
+    print(f"{path.name} not found locally. Downloading from {url} ...", flush=True)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    urllib.request.urlretrieve(url, tmp)
+    tmp.replace(path)
+
+
+@contextmanager
+def _timed(timings: Dict[str, float], name: str):
+    start = time.perf_counter()
+    yield
+    timings[name] = round(time.perf_counter() - start, 3)
+    print(f"  {name:<12} {timings[name]:8.2f}s", flush=True)
+
+
+# ===========================
+# Per-chunk work (runs in the pool)
+# ===========================
+_PREPARE = {"crashes": stages.prepare_crashes, "persons": stages.prepare_persons}
+
+
+def _prepare_chunk(kind: str, path: str, start: int, end: int, names: List[str], out: Path) -> int:
+    """Parse + clean one byte range of a raw CSV into a Feather part."""
+    df = read_chunk(path, start, end, names, dtype=str)
+    df = _PREPARE[kind](df)
+    df.reset_index(drop=True).to_feather(out)
+    return len(df)
+
+
+def _clip_chunk(part: Path, bounds: Dict[str, Tuple[float, float]], fills: Dict[str, Any]) -> np.ndarray:
+    """Fill + clip one part in place; returns its row hashes for dedupe."""
+    df = pd.read_feather(part)
+    for col, value in fills.items():
+        df[col] = df[col].fillna(value)
+    df = stages.clip(df, bounds)
+    df.to_feather(part)
+    return stages.row_hashes(df)
+
+
+def _finish_chunk(
+    kind: str,
+    part: Path,
+    keep: np.ndarray,
+    modes: Dict[str, pd.Series],
+    n_buckets: int,
+    out_dir: Path,
+) -> int:
+    """Drop duplicates, impute and split one part into join buckets."""
+    df = pd.read_feather(part)[keep].reset_index(drop=True)
+    df = stages.finish_crashes(df, modes) if kind == "crashes" else stages.finish_persons(df)
+    buckets = stages.bucket_of(df[COLLISION_ID], n_buckets)
+    for b in np.unique(buckets):
+        df[buckets == b].reset_index(drop=True).to_feather(out_dir / f"{kind}-{b:04d}-{part.stem}.feather")
+    part.unlink()
+    return len(df)
+
+
+def _join_bucket(
+    crash_parts: List[Path], person_parts: List[Path], out: Path
+) -> Tuple[int, List[str], pd.DataFrame, Optional[str]]:
+    """
+    Join one bucket and write it as header-less CSV; returns its row count,
+    columns, collision hashes and latest crash date (for the refresh state).
+    """
+    crashes = pd.concat([pd.read_feather(p) for p in crash_parts], ignore_index=True)
+    if person_parts:
+        persons = pd.concat([pd.read_feather(p) for p in person_parts], ignore_index=True)
+    else:
+        persons = pd.DataFrame({COLLISION_ID: pd.Series(dtype="Int64")})
+    joined = stages.join(crashes, persons, OUTPUT_COLUMNS)
+    write_csv(joined, out, header=False)
+    return len(joined), list(joined.columns), stages.collision_hashes(joined), store.max_crash_date(joined)
+
+
+
+# ===========================
+# Driver
+# ===========================
+def _columns(part: Path) -> List[str]:
+    """Column names of a Feather part, without reading its data."""
+    import pyarrow as pa
+
+    with pa.memory_map(str(part)) as source:
+        return pa.ipc.open_file(source).schema.names
+
+
+def _read_column(parts: List[Path], columns: List[str], keep: Optional[List[np.ndarray]] = None) -> pd.DataFrame:
+    frames = []
+    for i, part in enumerate(parts):
+        df = pd.read_feather(part, columns=columns)
+        frames.append(df[keep[i]] if keep is not None else df)
+    return pd.concat(frames, ignore_index=True)
+
+
+def _fences(parts: List[Path], columns: List[str], fills: Dict[str, Any]) -> Dict[str, Tuple[float, float]]:
+    """IQR fences per column over all parts, read one column at a time."""
+    bounds = {}
+    available = set(_columns(parts[0])) if parts else set()
+    for col in columns:
+        if col not in available:
+            continue
+        values = _read_column(parts, [col])[col]
+        if col in fills:
+            values = values.fillna(fills[col])
+        fence = stages.iqr_bounds(values)
+        if fence is not None:
+            bounds[col] = fence
+    return bounds
+
+
+def _keep_masks(hashes: List[np.ndarray]) -> List[np.ndarray]:
+    """First occurrence of every row hash, in part order, split back per part."""
+    dup = pd.Series(np.concatenate(hashes) if hashes else np.empty(0, np.uint64)).duplicated().to_numpy()
+    return np.split(~dup, np.cumsum([len(h) for h in hashes])[:-1])
+
+
+def run_pipeline(
+    crashes_path: PathLike = DEFAULT_CRASHES,
+    persons_path: PathLike = DEFAULT_PERSONS,
+    out_path: PathLike = DEFAULT_DATA_PATH,
+    workers: Optional[int] = None,
+    chunk_bytes: int = DEFAULT_CHUNK_BYTES,
+    work_dir: Optional[PathLike] = None,
+) -> Dict[str, Any]:
+    """
+    Clean both exports and write their join to `out_path`; returns row
+    counts and per-stage seconds. Output rows are grouped by join bucket
+    (crash order within a bucket), not in the exports' order.
+    """
+    crashes_path, persons_path, out_path = Path(crashes_path), Path(persons_path), Path(out_path)
+    for path, url in ((crashes_path, CRASHES_URL), (persons_path, PERSONS_URL)):
+        if not path.exists():
+            _download(url, path)
+
+    workers = workers or os.cpu_count() or 1
+    n_buckets = workers * 2
+    timings: Dict[str, float] = {}
+    rows: Dict[str, int] = {}
+    work = Path(tempfile.mkdtemp(prefix="pipeline-", dir=work_dir))
+    print(f"Pipeline: {workers} workers, work dir {work}", flush=True)
+
+    try:
+        with ProcessPoolExecutor(workers) as pool:
+            # Parse + clean: each worker reads its own byte range
+            parts: Dict[str, List[Path]] = {}
+            with _timed(timings, "parse+clean"):
+                futures = {}
+                for kind, path in (("crashes", crashes_path), ("persons", persons_path)):
+                    names, _ = read_header(path)
+                    ranges = split_csv(path, chunk_bytes)
+                    parts[kind] = [work / f"{kind}-{i:05d}.feather" for i in range(len(ranges))]
+                    futures[kind] = [
+                        pool.submit(_prepare_chunk, kind, str(path), a, b, names, out)
+                        for (a, b), out in zip(ranges, parts[kind])
+                    ]
+                for kind, fs in futures.items():
+                    rows[f"{kind}_raw"] = sum(f.result() for f in fs)
+
+            # Clip: global fences (and the age median) from the driver
+            with _timed(timings, "clip"):
+                fills = {kind: {} for kind in parts}
+                if parts["persons"] and PERSON_AGE in _columns(parts["persons"][0]):
+                    age = _read_column(parts["persons"], [PERSON_AGE])[PERSON_AGE]
+                    fills["persons"][PERSON_AGE] = age.median()
+                clip_columns = {"crashes": stages.CRASH_CLIP_COLUMNS, "persons": stages.PERSON_CLIP_COLUMNS}
+                hashes, bounds = {}, {}
+                for kind in parts:
+                    bounds[kind] = _fences(parts[kind], clip_columns[kind], fills[kind])
+                    hashes[kind] = pool.map(_clip_chunk, parts[kind], [bounds[kind]] * len(parts[kind]),
+                                            [fills[kind]] * len(parts[kind]))
+                hashes = {kind: list(h) for kind, h in hashes.items()}
+
+            # Dedupe across chunks by row hash; impute from the kept rows
+            with _timed(timings, "dedupe"):
+                keep = {kind: _keep_masks(h) for kind, h in hashes.items()}
+            with _timed(timings, "impute"):
+                modes = {}
+                for target, group_cols in stages.CRASH_IMPUTE:
+                    cols = [*group_cols, target]
+                    if parts["crashes"] and set(cols) <= set(_columns(parts["crashes"][0])):
+                        pairs = _read_column(parts["crashes"], cols, keep["crashes"])
+                        modes[target] = stages.group_modes(pairs, group_cols, target)
+                futures = [
+                    pool.submit(_finish_chunk, kind, part, mask, modes, n_buckets, work)
+                    for kind in parts
+                    for part, mask in zip(parts[kind], keep[kind])
+                ]
+                for kind in parts:
+                    rows[kind] = 0
+                for f, kind in zip(futures, [k for k in parts for _ in parts[k]]):
+                    rows[kind] += f.result()
+
+            # Join bucket by bucket, then stitch the CSV pieces together
+            with _timed(timings, "join"):
+                jobs = []
+                for b in range(n_buckets):
+                    crash_parts = sorted(work.glob(f"crashes-{b:04d}-*.feather"))
+                    if crash_parts:
+                        person_parts = sorted(work.glob(f"persons-{b:04d}-*.feather"))
+                        out = work / f"joined-{b:04d}.csv"
+                        jobs.append((out, pool.submit(_join_bucket, crash_parts, person_parts, out)))
+                results = [(out, f.result()) for out, f in jobs]
+
+        with _timed(timings, "write"):
+            out_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = out_path.with_name(out_path.name + ".tmp")
+            header = results[0][1][1] if results else list(OUTPUT_COLUMNS)
+            with open(tmp, "wb") as f:
+                f.write((",".join(header) + "\n").encode())
+                for out, _ in results:
+                    with open(out, "rb") as piece:
+                        shutil.copyfileobj(piece, f)
+            tmp.replace(out_path)
+            rows["integrated"] = sum(r[0] for _, r in results)
+
+        # What a later incremental refresh (project.pipeline.incremental) builds on
+        empty = stages.collision_hashes(pd.DataFrame({COLLISION_ID: pd.Series(dtype="Int64")}))
+        keys = pd.concat([empty] + [r[2] for _, r in results], ignore_index=True)
+        top = [keys[COLLISION_ID].max()] if len(keys) else []
+        mark = store.high_water(top, [r[3] for _, r in results])
+        store.reset(out_path, store.stats_to_json(bounds, fills, modes), keys, mark)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    print(
+        f"Wrote {rows['integrated']:,} rows to {out_path} "
+        f"({rows['crashes']:,} crashes, {rows['persons']:,} persons) "
+        f"in {sum(timings.values()):.1f}s",
+        flush=True,
+    )
+    return {"rows": rows, "seconds": timings}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--crashes", type=Path, default=DEFAULT_CRASHES, help="raw crashes CSV (downloaded if missing)")
+    parser.add_argument("--persons", type=Path, default=DEFAULT_PERSONS, help="raw persons CSV (downloaded if missing)")
+    parser.add_argument("--out", type=Path, default=DEFAULT_DATA_PATH)
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: all CPUs)")
+    parser.add_argument("--chunk-mb", type=float, default=DEFAULT_CHUNK_BYTES / (1 << 20))
+    parser.add_argument("--work-dir", type=Path, default=None, help="scratch space for chunk files")
+    parser.add_argument(
+        "--partitioned", action="store_true",
+        help="also write the year/borough partitioned store (see load_data(lazy=True))",
+    )
+    args = parser.parse_args(argv)
+
+    run_pipeline(
+        args.crashes, args.persons, args.out,
+        workers=args.workers, chunk_bytes=int(args.chunk_mb * (1 << 20)), work_dir=args.work_dir,
+    )
+    if args.partitioned:
+        print(open_partitioned(args.out), flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,292 @@
+from typing import Optional, List, Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+# ===========================
+# Raw column names (NYC Open Data exports)
+# ===========================
+CRASH_DATE = "CRASH DATE"
+CRASH_TIME = "CRASH TIME"
+COLLISION_ID = "COLLISION_ID"
+BOROUGH = "BOROUGH"
+ZIP_CODE = "ZIP CODE"
+LATITUDE = "LATITUDE"
+LONGITUDE = "LONGITUDE"
+ON_STREET = "ON STREET NAME"
+CROSS_STREET = "CROSS STREET NAME"
+OFF_STREET = "OFF STREET NAME"
+
+INJURY_COLUMNS = [
+    f"NUMBER OF {who} {what}"
+    for who in ["PERSONS", "PEDESTRIANS", "CYCLIST", "MOTORIST"]
+    for what in ["INJURED", "KILLED"]
+]
+
+# Crash label columns: blanks become UNKNOWN
+CRASH_TEXT_COLUMNS = [BOROUGH, ON_STREET, CROSS_STREET]
+
+# Blank vehicle slots, by what an empty slot means
+VEHICLE_DEFAULTS = {
+    "VEHICLE TYPE CODE 2": "Single Vehicle",
+    "CONTRIBUTING FACTOR VEHICLE 2": "None / Single Vehicle",
+    **{f"VEHICLE TYPE CODE {i}": "No Vehicle" for i in (3, 4, 5)},
+    **{f"CONTRIBUTING FACTOR VEHICLE {i}": "No Vehicle" for i in (3, 4, 5)},
+}
+
+DATE_PART_COLUMNS = ["CRASH_YEAR", "CRASH_MONTH", "CRASH_HOUR"]
+
+# Numeric crash columns clipped to [Q1 - 1.5 IQR, Q3 + 1.5 IQR]; identifiers
+# (COLLISION_ID, ZIP CODE) are left alone so keys never merge
+CRASH_CLIP_COLUMNS = [LATITUDE, LONGITUDE, *INJURY_COLUMNS, *DATE_PART_COLUMNS]
+
+# Missing target -> mode of the target within its group
+CRASH_IMPUTE = [(ZIP_CODE, [BOROUGH]), (ON_STREET, [BOROUGH])]
+
+PERSON_AGE = "PERSON_AGE"
+PERSON_ID = "PERSON_ID"
+PERSON_TEXT_COLUMNS = [
+    "PERSON_TYPE", "PERSON_INJURY", "EJECTION", "EMOTIONAL_STATUS",
+    "BODILY_INJURY", "POSITION_IN_VEHICLE", "SAFETY_EQUIPMENT",
+    "PED_ROLE", "PERSON_SEX",
+]
+PERSON_DROP_COLUMNS = ["PED_LOCATION", "PED_ACTION", "CONTRIBUTING_FACTOR_1", "CONTRIBUTING_FACTOR_2"]
+PERSON_REQUIRED = [PERSON_ID, "VEHICLE_ID", "PED_ROLE"]
+PERSON_CLIP_COLUMNS = [PERSON_AGE]
+MAX_AGE = 110
+
+# Columns of the integrated CSV the dashboard reads (crash, then person level)
+OUTPUT_COLUMNS = [
+    COLLISION_ID, CRASH_DATE, CRASH_TIME, BOROUGH, ZIP_CODE, LATITUDE, LONGITUDE,
+    "LOCATION", ON_STREET, CROSS_STREET, *INJURY_COLUMNS,
+    "CONTRIBUTING FACTOR VEHICLE 1", "VEHICLE TYPE CODE 1", *DATE_PART_COLUMNS,
+    PERSON_ID, "PERSON_TYPE", "PERSON_INJURY", PERSON_AGE, "PERSON_SEX",
+    "BODILY_INJURY", "POSITION_IN_VEHICLE", "SAFETY_EQUIPMENT", "PED_ROLE",
+]
+
+
+# ===========================
+# Helpers
+# ===========================
+def _to_datetime(values: pd.Series, fmt: str) -> pd.Series:
+    """
+    Parse with a fixed format (fast path), falling back to inference for
+    the rest. Each distinct string is parsed once: a chunk repeats a few
+    hundred dates and ~1,440 times over ~100k rows.
+    """
+    codes, uniques = pd.factorize(values)
+    uniques = pd.Series(uniques, dtype=object)
+    parsed = pd.to_datetime(uniques, format=fmt, errors="coerce")
+    retry = parsed.isna()
+    if retry.any():
+        parsed[retry] = pd.to_datetime(uniques[retry], format="mixed", errors="coerce")
+    out = parsed.to_numpy()[codes]
+    out[codes < 0] = np.datetime64("NaT")
+    return pd.Series(out, index=values.index, name=values.name)
+
+
+def fill_unknown(values: pd.Series, fill: str = "UNKNOWN") -> pd.Series:
+    """
+    Strip labels; blank and missing ones become `fill`. Returns a
+    categorical, stripping each distinct label once.
+    """
+    codes, uniques = pd.factorize(values)
+    labels = pd.Index(uniques, dtype=object).astype(str).str.strip()
+    labels = labels.where(labels != "", fill).append(pd.Index([fill]))
+    codes = np.where(codes < 0, len(labels) - 1, codes)
+    # Labels equal after stripping share a category
+    categories = labels[np.unique(codes)].unique().sort_values()
+    return pd.Series(
+        pd.Categorical.from_codes(categories.get_indexer(labels)[codes], categories),
+        index=values.index,
+        name=values.name,
+    )
+
+
+def collision_key(values: pd.Series) -> pd.Series:
+    """COLLISION_ID as a nullable integer, however it was written ("12", "12.0")."""
+    return pd.to_numeric(values, errors="coerce").round().astype("Int64")
+
+
+def iqr_bounds(values: pd.Series) -> Optional[Tuple[float, float]]:
+    """(lower, upper) Tukey fences, or None when the IQR is missing or zero."""
+    q1, q3 = values.quantile([0.25, 0.75])
+    iqr = q3 - q1
+    if pd.isna(iqr) or iqr == 0:
+        return None
+    return q1 - 1.5 * iqr, q3 + 1.5 * iqr
+
+
+def clip(df: pd.DataFrame, bounds: Dict[str, Tuple[float, float]]) -> pd.DataFrame:
+    """Clip columns to their fences; integer columns are clipped to whole numbers."""
+    for col, (lower, upper) in bounds.items():
+        if col not in df.columns:
+            continue
+        if pd.api.types.is_integer_dtype(df[col].dtype):
+            lower, upper = np.ceil(lower), np.floor(upper)
+        df[col] = df[col].clip(lower=lower, upper=upper)
+    return df
+
+
+def row_hashes(df: pd.DataFrame) -> np.ndarray:
+    """
+    64-bit hash of every row's values, for dropping duplicates across chunks.
+    Numbers are hashed as float64, so 5 hashes the same whether a chunk's
+    column came out int64 or (with a missing value) float64.
+    """
+    numeric = [
+        c for c in df.columns
+        if pd.api.types.is_numeric_dtype(df[c].dtype) and not pd.api.types.is_bool_dtype(df[c].dtype)
+    ]
+    if numeric:
+        df = df.astype({c: "float64" for c in numeric})
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+
+def collision_hashes(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    One content hash per COLLISION_ID (wrapping sum of its row hashes, so
+    row order does not matter), to tell changed collisions from unchanged.
+    """
+    keyed = df[df[COLLISION_ID].notna()]
+    ids = keyed[COLLISION_ID].to_numpy(dtype=np.int64)
+    hashes = row_hashes(keyed)
+    order = np.argsort(ids, kind="stable")
+    ids, hashes = ids[order], hashes[order]
+    starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]]) if len(ids) else np.empty(0, np.int64)
+    return pd.DataFrame({
+        COLLISION_ID: ids[starts],
+        "hash": np.add.reduceat(hashes, starts) if len(ids) else np.empty(0, np.uint64),
+    })
+
+
+def group_modes(df: pd.DataFrame, group_cols: List[str], target: str) -> pd.Series:
+    """
+    Most common non-missing `target` per group (ties -> smallest value, like
+    Series.mode().iloc[0]), from one groupby over (group, target) pairs.
+    """
+    # Rows missing the target or a group key never vote (groupby drops them)
+    counts = df.groupby(group_cols + [target], observed=True).size().reset_index(name="n")
+    # Highest count first, then smallest value; first row per group wins
+    counts = counts.sort_values(["n", target], ascending=[False, True], kind="stable")
+    return counts.drop_duplicates(group_cols).set_index(group_cols)[target]
+
+
+def impute_group_mode(df: pd.DataFrame, group_cols: List[str], target: str, modes: pd.Series) -> pd.Series:
+    """
+    `target` with missing values replaced by their group's mode.
+
+    Vectorized form of filling row by row: the group keys of the missing
+    rows are looked up in `modes` in one reindex.
+    """
+    missing = df[target].isna()
+    if not missing.any() or modes.empty:
+        return df[target]
+    if len(group_cols) == 1:
+        keys = df.loc[missing, group_cols[0]].to_numpy()
+    else:
+        keys = pd.MultiIndex.from_frame(df.loc[missing, group_cols])
+    fill = pd.Series(modes.reindex(keys).to_numpy(), index=df.index[missing])
+    values = df[target]
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        new = pd.Index(fill.dropna().unique()).difference(values.cat.categories)
+        values = values.cat.add_categories(new)
+    return values.fillna(fill)
+
+
+# ===========================
+# Crashes
+# ===========================
+def prepare_crashes(df: pd.DataFrame) -> pd.DataFrame:
+    """Parse and row-level cleaning: dates, numbers, required fields, labels."""
+    df.columns = [c.strip() for c in df.columns]
+
+    df[CRASH_DATE] = _to_datetime(df[CRASH_DATE], "%m/%d/%Y")
+    df[CRASH_TIME] = _to_datetime(df[CRASH_TIME], "%H:%M")
+    df["CRASH_YEAR"] = df[CRASH_DATE].dt.year
+    df["CRASH_MONTH"] = df[CRASH_DATE].dt.month
+    df["CRASH_HOUR"] = df[CRASH_TIME].dt.hour
+
+    for col in [LATITUDE, LONGITUDE, ZIP_CODE]:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+    df[COLLISION_ID] = collision_key(df[COLLISION_ID])
+
+    df = df.dropna(subset=[COLLISION_ID, CRASH_DATE, CRASH_TIME])
+    location = [c for c in [BOROUGH, ZIP_CODE, LATITUDE, LONGITUDE] if c in df.columns]
+    df = df.dropna(subset=location, how="all").copy()
+    for col in DATE_PART_COLUMNS:
+        df[col] = df[col].astype("int64")
+
+    for col in INJURY_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0).astype("int64")
+
+    for col in CRASH_TEXT_COLUMNS:
+        if col in df.columns:
+            df[col] = fill_unknown(df[col])
+    return df
+
+
+def finish_crashes(df: pd.DataFrame, modes: Dict[str, pd.Series]) -> pd.DataFrame:
+    """Group-mode imputation and vehicle-slot defaults (after clip + dedupe)."""
+    for target, group_cols in CRASH_IMPUTE:
+        if target in modes and target in df.columns and all(g in df.columns for g in group_cols):
+            df[target] = impute_group_mode(df, group_cols, target, modes[target])
+
+    df = df.drop(columns=[OFF_STREET], errors="ignore")
+    for col, default in VEHICLE_DEFAULTS.items():
+        if col in df.columns:
+            df[col] = fill_unknown(df[col], default)
+    return df
+
+
+# ===========================
+# Persons
+# ===========================
+def prepare_persons(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Parse and row-level cleaning: ages in [0, MAX_AGE], ids, labels. The
+    persons' own CRASH_DATE/CRASH_TIME stay raw text; the join takes the
+    crash's.
+    """
+    df.columns = [c.strip() for c in df.columns]
+
+    age = pd.to_numeric(df[PERSON_AGE], errors="coerce")
+    df[PERSON_AGE] = age.mask((age < 0) | (age > MAX_AGE))
+    for col in [PERSON_ID, "VEHICLE_ID"]:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+    df[COLLISION_ID] = collision_key(df[COLLISION_ID])
+
+    for col in PERSON_TEXT_COLUMNS:
+        if col in df.columns:
+            df[col] = fill_unknown(df[col])
+    return df
+
+
+def finish_persons(df: pd.DataFrame) -> pd.DataFrame:
+    """Drop unused columns and persons without their identifying fields."""
+    df = df.drop(columns=PERSON_DROP_COLUMNS, errors="ignore")
+    return df.dropna(subset=[c for c in PERSON_REQUIRED if c in df.columns])
+
+
+# ===========================
+# Join
+# ===========================
+def join(crashes: pd.DataFrame, persons: pd.DataFrame, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Crashes LEFT JOIN persons on COLLISION_ID (one row per person, crashes
+    without persons kept once), restricted to `columns`. CRASH TIME stays a
+    timestamp on 1900-01-01; write_csv prints it as a time of day.
+    """
+    joined = crashes.merge(persons, on=COLLISION_ID, how="left", suffixes=("", "_PERSON"))
+    if columns is not None:
+        joined = joined[[c for c in columns if c in joined.columns]]
+    return joined.drop_duplicates()
+
+
+def bucket_of(keys: pd.Series, n_buckets: int) -> np.ndarray:
+    """Join bucket per row: rows with the same COLLISION_ID share a bucket."""
+    return (keys.fillna(0).to_numpy(dtype=np.int64) % n_buckets).astype(np.int64)
+
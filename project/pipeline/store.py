@@ -0,0 +1,137 @@
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Optional, List, Dict, Tuple, Any, Union
+
+import numpy as np
+import pandas as pd
+
+from project.pipeline.stages import COLLISION_ID, CRASH_DATE
+from project.utils.load_data import MANIFEST_NAME, partitions_dir
+
+# Content hash of every stored collision (see stages.collision_hashes)
+COLLISIONS_NAME = "collisions.feather"
+
+PathLike = Union[Path, str]
+
+
+# ===========================
+# Cleaning statistics
+# ===========================
+def stats_to_json(
+    bounds: Dict[str, Dict[str, Tuple[float, float]]],
+    fills: Dict[str, Dict[str, Any]],
+    modes: Dict[str, pd.Series],
+) -> Dict[str, Any]:
+    """
+    The whole-history statistics a full build cleaned with (IQR fences,
+    fills, group modes), so a refresh cleans its delta the same way.
+    """
+    return {
+        "bounds": {k: {c: [float(lo), float(hi)] for c, (lo, hi) in b.items()} for k, b in bounds.items()},
+        "fills": {k: {c: _plain(v) for c, v in f.items()} for k, f in fills.items()},
+        "modes": {
+            target: {
+                "groups": list(m.index.names),
+                "rows": [[*_key(k), _plain(v)] for k, v in m.items()],
+            }
+            for target, m in modes.items()
+        },
+    }
+
+
+def stats_from_json(stats: Dict[str, Any]):
+    """(bounds, fills, modes) back from stats_to_json."""
+    bounds = {k: {c: tuple(v) for c, v in b.items()} for k, b in stats.get("bounds", {}).items()}
+    fills = stats.get("fills", {})
+    modes = {}
+    for target, m in stats.get("modes", {}).items():
+        groups = m["groups"]
+        frame = pd.DataFrame(m["rows"], columns=[*groups, target])
+        modes[target] = frame.set_index(groups)[target]
+    return bounds, fills, modes
+
+
+def _plain(value: Any) -> Any:
+    """JSON-safe scalar (numpy -> Python, NaN -> None)."""
+    if pd.isna(value):
+        return None
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _key(key: Any) -> List[Any]:
+    return [_plain(k) for k in (key if isinstance(key, tuple) else (key,))]
+
+
+# ===========================
+# High-water mark
+# ===========================
+def high_water(max_ids: List[Any], max_dates: List[Optional[str]], previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Largest COLLISION_ID and CRASH DATE (ISO) among the given maxima and `previous`."""
+    previous = previous or {}
+    ids = [int(i) for i in [*max_ids, previous.get("collision_id")] if i is not None and pd.notna(i)]
+    dates = [d for d in [*max_dates, previous.get("crash_date")] if d is not None]
+    return {"collision_id": max(ids, default=None), "crash_date": max(dates, default=None)}
+
+
+def max_crash_date(df: pd.DataFrame) -> Optional[str]:
+    """Latest CRASH DATE of a cleaned frame as an ISO date."""
+    if CRASH_DATE not in df.columns or df[CRASH_DATE].isna().all():
+        return None
+    return df[CRASH_DATE].max().date().isoformat()
+
+
+# ===========================
+# Manifest + collision hashes next to the dataset
+# ===========================
+def read_collisions(out_path: PathLike) -> pd.Series:
+    """Stored content hash per COLLISION_ID."""
+    path = partitions_dir(out_path) / COLLISIONS_NAME
+    if not path.exists():
+        return pd.Series(dtype=np.uint64)
+    frame = pd.read_feather(path)
+    return pd.Series(frame["hash"].to_numpy(), index=frame[COLLISION_ID].to_numpy())
+
+
+def write_collisions(out_path: PathLike, hashes: pd.Series) -> None:
+    frame = pd.DataFrame({COLLISION_ID: hashes.index.to_numpy(dtype=np.int64), "hash": hashes.to_numpy()})
+    _replace(partitions_dir(out_path) / COLLISIONS_NAME, lambda tmp: frame.to_feather(tmp))
+
+
+def write_manifest(out_path: PathLike, manifest: Dict[str, Any]) -> None:
+    """Write the manifest last: it is what makes a new partition visible."""
+    _replace(
+        partitions_dir(out_path) / MANIFEST_NAME,
+        lambda tmp: tmp.write_text(json.dumps(manifest, indent=2, sort_keys=True)),
+    )
+
+
+def reset(out_path: PathLike, stats: Dict[str, Any], keys: pd.DataFrame, mark: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Start a fresh partition store after a full build: no partitions, the
+    build's statistics, its collision hashes and high-water mark.
+    """
+    directory = partitions_dir(out_path)
+    shutil.rmtree(directory, ignore_errors=True)
+    directory.mkdir(parents=True)
+    write_collisions(out_path, pd.Series(keys["hash"].to_numpy(), index=keys[COLLISION_ID].to_numpy()))
+    manifest = {
+        "built": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "high_water": mark,
+        "stats": stats,
+        "partitions": [],
+    }
+    write_manifest(out_path, manifest)
+    return manifest
+
+
+def _replace(path: Path, write) -> None:
+    tmp = path.with_name(path.name + f".{os.getpid()}.tmp")
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+
@@ -1,15 +1,54 @@
+import numpy as np
 import pandas as pd
+import pytest
 from pathlib import Path
 
 from project.utils.load_data import (
     load_data,
+    _cache_paths,
     DEFAULT_DATA_PATH,
     COL_YEAR,
+    COL_MONTH,
+    COL_HOUR,
+    COL_LAT,
+    COL_LON,
+    COL_COLLISION_ID,
     COL_BOROUGH,
     COL_PERSON_TYPE,
     COL_PERSON_INJURY,
+    COL_VEHICLE_TYPE,
+    COL_FACTOR,
+    COL_STREET,
+    COL_IS_INJURED,
+    COL_IS_KILLED,
+    COL_FIRST_PERSON,
+    iter_chunks,
 )
-from project.utils.filters import apply_filters, parse_search_query
+from project.utils.filters import (
+    apply_filters,
+    parse_search_query,
+    filter_key,
+    normalize_filters,
+)
+from project.utils.cube import CountCube
+from project.utils.spatial import (
+    GridIndex,
+    METERS_PER_DEGREE_LAT,
+    SPATIAL_CELL_DEGREES,
+    selection_to_shape,
+    spatial_mask,
+)
+from project.utils.cache import ReportCache
+from project.utils.aggregates import aggregate_frame, stream_aggregates
+from project.utils.warmup import popular_filters, warm_up
+from project.benchmarks.synthetic import generate_dataset, write_dataset, write_raw
+from project.utils.metrics import Metrics, register_metrics_endpoint
+from project.utils.search import SearchEngine
+from project.benchmarks.run import compare, off_pin, parse_size
+from project.utils import index as filter_index
+from project.pipeline import stages
+from project.pipeline.run import run_pipeline
+from project.pipeline import incremental
 
 
 # ---------------------------
@@ -77,3 +116,1004 @@ def test_search_parser():
     # These should be detected
     assert parsed.get("borough") == "Brooklyn"
     assert parsed.get("year") == 2022
+
+
+# ---------------------------
+# TEST 5 — columnar cache is reused, and rebuilt when the CSV changes
+# ---------------------------
+def test_load_data_columnar_cache(tmp_path):
+    csv = tmp_path / "integrated.csv"
+    pd.DataFrame({
+        "BOROUGH": [" BROOKLYN", "QUEENS "],
+        "CRASH YEAR": [2022, 2023],
+        "PERSON INJURY": ["Injured", "Killed"],
+    }).to_csv(csv, index=False)
+
+    first = load_data(csv)
+    cache, meta = _cache_paths(csv)
+    assert cache.exists() and meta.exists()
+
+    cached = load_data(csv, columns=[COL_BOROUGH])
+    assert list(cached.columns) == [COL_BOROUGH]
+    assert cached[COL_BOROUGH].tolist() == first[COL_BOROUGH].tolist() == ["BROOKLYN", "QUEENS"]
+
+    pd.DataFrame({"BOROUGH": ["BRONX"], "CRASH YEAR": [2024]}).to_csv(csv, index=False)
+    assert load_data(csv)[COL_BOROUGH].tolist() == ["BRONX"]
+
+
+# ---------------------------
+# TEST 6 — lean mode keeps only app columns, with narrow dtypes
+# ---------------------------
+def test_load_data_lean_dtypes(tmp_path):
+    csv = tmp_path / "integrated.csv"
+    pd.DataFrame({
+        "COLLISION_ID": [4000001, 4000001, 4000002],
+        "BOROUGH": ["BROOKLYN ", None, "QUEENS"],
+        "CRASH YEAR": [2022, 2022, 2023],
+        "CRASH MONTH": [1, 1, None],
+        "CRASH HOUR": [8, 8, 23],
+        "LATITUDE": [40.7, 40.7, None],
+        "LONGITUDE": [-73.9, -73.9, -73.8],
+        "PERSON AGE": [30, 41, 25],
+    }).to_csv(csv, index=False)
+
+    df = load_data(csv, use_cache=False)
+
+    assert "PERSON AGE" not in df.columns
+    assert df[COL_YEAR].dtype == "int16"
+    assert df[COL_MONTH].dtype == "Int8"  # nullable: one month is missing
+    assert df[COL_LAT].dtype == "float32"
+    assert df[COL_COLLISION_ID].dtype == "int32"
+    assert isinstance(df[COL_BOROUGH].dtype, pd.CategoricalDtype)
+    assert df[COL_BOROUGH].isna().sum() == 1
+    assert df[COL_BOROUGH].dropna().tolist() == ["BROOKLYN", "QUEENS"]
+
+
+# ---------------------------
+# TEST 7 — chunked streaming gives the same aggregates as an in-memory frame
+# ---------------------------
+def test_stream_aggregates_match_frame(tmp_path):
+    n = 1000
+    csv = tmp_path / "integrated.csv"
+    pd.DataFrame({
+        "COLLISION_ID": [i // 3 for i in range(n)],
+        "BOROUGH": [["BROOKLYN", "QUEENS", "BRONX"][i % 3] for i in range(n)],
+        "CRASH YEAR": [2012 + i % 13 for i in range(n)],
+        "CRASH MONTH": [1 + i % 12 for i in range(n)],
+        "CRASH HOUR": [i % 24 for i in range(n)],
+        "LATITUDE": [40.5 + (i % 100) / 250 for i in range(n)],
+        "LONGITUDE": [-74.0 + (i % 50) / 100 for i in range(n)],
+        "PERSON INJURY": [["Injured", "Killed", "Unspecified"][i % 3] for i in range(n)],
+    }).to_csv(csv, index=False)
+
+    streamed = stream_aggregates(csv, chunksize=128)
+    full = aggregate_frame(load_data(csv, use_cache=False))
+
+    assert streamed.total_persons == full.total_persons == n
+    assert streamed.total_crashes == full.total_crashes == 334
+    assert streamed.injuries == full.injuries
+    assert streamed.fatalities == full.fatalities
+    pd.testing.assert_series_equal(streamed.by_year_month, full.by_year_month, check_dtype=False)
+    pd.testing.assert_series_equal(streamed.by_borough_hour, full.by_borough_hour, check_dtype=False)
+    assert streamed.located_persons == full.located_persons == n
+    for size, counts in full.density.items():
+        pd.testing.assert_series_equal(streamed.density[size], counts)
+
+
+# ---------------------------
+# TEST 8 — indexed filtering matches the scanning path (bitmaps and row ids)
+# ---------------------------
+@pytest.mark.parametrize("bitmap_max_values", [1, 32])
+def test_apply_filters_index_matches_scan(monkeypatch, bitmap_max_values):
+    monkeypatch.setattr(filter_index, "BITMAP_MAX_VALUES", bitmap_max_values)
+    n = 500
+    df = pd.DataFrame({
+        COL_BOROUGH: [["Brooklyn", "QUEENS", "Bronx", None][i % 4] for i in range(n)],
+        COL_YEAR: [2018 + i % 5 for i in range(n)],
+        COL_PERSON_INJURY: [["Injured", "Killed", "Unspecified"][i % 3] for i in range(n)],
+        COL_VEHICLE_TYPE: pd.Categorical([["Sedan", "Taxi", "Bus"][i % 7 % 3] for i in range(n)]),
+    })
+    index = filter_index.FilterIndex(df)
+
+    for filters in [
+        {"borough": "brooklyn"},
+        {"borough": ["Queens", "BRONX"], "year": [2019, "2021"]},
+        {"vehicle_type": ["Taxi", "Bus"], "injury": "Killed", "year": 2020},
+        {"year": "not-a-year"},
+        {"borough": "NOWHERE"},
+        {},
+    ]:
+        scanned = apply_filters(df, **filters)
+        indexed = apply_filters(df, index=index, **filters)
+        assert indexed.index.equals(scanned.index), filters
+
+
+# ---------------------------
+# TEST 9 — equivalent filters share a cache key; the cache is a bounded LRU
+# ---------------------------
+def test_filter_key_and_report_cache(tmp_path):
+    assert filter_key(borough="queens", year="2022") == filter_key(borough=["QUEENS"], year=[2022])
+    assert filter_key(borough=None, year=[]) == ()
+    assert filter_key(borough="QUEENS") != filter_key(borough="BRONX")
+
+    blob = "x" * 1000
+    cache = ReportCache(max_bytes=2500, disk_dir=tmp_path)
+    cache.set("a", blob)
+    cache.set("b", blob)
+    assert cache.get("a") == blob  # "a" becomes most recently used
+    cache.set("c", blob)  # evicts "b" from memory
+    assert cache.stats()["evictions"] == 1
+
+    other_worker = ReportCache(max_bytes=2500, disk_dir=tmp_path)
+    assert other_worker.get("b") == blob
+    assert other_worker.get("missing") is None
+    stats = other_worker.stats()
+    assert (stats["disk_hits"], stats["misses"]) == (1, 1)
+
+    # The disk tier is scanned once, then only when this worker's writes
+    # push its estimate past the limit (trimmed to 90% of it)
+    disk = ReportCache(disk_dir=tmp_path / "disk", disk_max_bytes=10_000)
+    scans = []
+    trim = disk._disk_trim
+    disk._disk_trim = lambda: (scans.append(1), trim())
+    for i in range(8):
+        disk.set(i, blob)
+    assert len(scans) == 1
+    for i in range(8, 10):  # ~1 KB pickles: the 10th passes 10_000 bytes
+        disk.set(i, blob)
+    assert len(scans) == 2
+    assert sum(f.stat().st_size for f in (tmp_path / "disk").glob("*.pkl")) <= 9_000
+
+    # A cached None is a hit, not recomputed
+    calls = []
+    for _ in range(3):
+        assert cache.get_or_compute("none", lambda: calls.append(1)) is None
+    assert len(calls) == 1
+
+
+# ---------------------------
+# TEST 10 — the count cube answers filters like aggregating filtered rows
+# ---------------------------
+def test_count_cube_matches_row_aggregation():
+    n = 600
+    df = pd.DataFrame({
+        COL_COLLISION_ID: [i // 2 for i in range(n)],
+        COL_BOROUGH: [["BROOKLYN", "QUEENS", None][i // 2 % 3] for i in range(n)],
+        COL_YEAR: [2019 + i // 2 % 4 for i in range(n)],
+        COL_MONTH: [1 + i // 2 % 12 for i in range(n)],
+        COL_HOUR: [i // 2 % 24 for i in range(n)],
+        COL_PERSON_INJURY: [["Injured", "Killed", "Unspecified"][i % 3] for i in range(n)],
+        COL_PERSON_TYPE: [["Pedestrian", "Occupant"][i % 2] for i in range(n)],
+        COL_LAT: [None if i % 10 == 0 else 40.5 + i % 40 / 100 for i in range(n)],
+        COL_LON: [-74.0 + i % 30 / 50 for i in range(n)],
+    })
+    cube = CountCube(df)
+
+    for filters in [
+        {},
+        {"borough": "queens"},
+        {"year": [2019, 2021], "person_type": "Pedestrian"},
+        {"injury": "Killed", "months": [1, 2, 3]},
+        {"borough": "NOWHERE"},
+    ]:
+        expected = aggregate_frame(apply_filters(df, **filters))
+        got = cube.query(normalize_filters(**filters))
+        assert got.total_persons == expected.total_persons, filters
+        assert got.total_crashes == expected.total_crashes, filters
+        assert got.injuries == expected.injuries, filters
+        assert got.located_persons == expected.located_persons, filters
+        for size, counts in expected.density.items():
+            pd.testing.assert_series_equal(got.density[size], counts)
+        for name in ["by_year_month", "by_borough", "by_injury", "by_borough_hour"]:
+            pd.testing.assert_series_equal(
+                getattr(got, name), getattr(expected, name),
+                check_dtype=False, check_index_type=False, check_names=False,
+            )
+
+
+# ---------------------------
+# TEST 11 — category-code filtering and search match the string path
+# ---------------------------
+def test_categorical_filters_match_strings():
+    raw = pd.DataFrame({
+        COL_BOROUGH: ["Brooklyn", "QUEENS", None, "Queens ", "BRONX"],
+        COL_PERSON_INJURY: ["Injured", "Killed", "Injured", None, "Unspecified"],
+        COL_VEHICLE_TYPE: ["Sedan", "Taxi", "SEDAN", "Bus", None],
+    })
+    cat = raw.apply(lambda s: s.str.strip().str.upper().astype("category"))
+
+    for filters in [
+        {"borough": "queens"},
+        {"borough": ["BROOKLYN", "Bronx"], "injury": "injured"},
+        {"vehicle_type": "sedan"},
+        {"search_text": "SED"},
+        {"search_text": "kill"},
+        {"search_text": "("},  # plain substring, not a regex
+    ]:
+        from_strings = apply_filters(raw, **filters)
+        from_codes = apply_filters(cat, **filters)
+        assert from_codes.index.equals(from_strings.index), filters
+
+
+# ---------------------------
+# TEST 12 — bbox / radius / polygon filters, with and without the grid index
+# ---------------------------
+def test_spatial_filters_with_grid_index():
+    n = 400
+    df = pd.DataFrame({
+        COL_BOROUGH: [["BROOKLYN", "QUEENS"][i % 2] for i in range(n)],
+        COL_LAT: [None if i % 25 == 0 else 40.5 + (i * 7 % 100) / 250 for i in range(n)],
+        COL_LON: [-74.2 + (i * 13 % 100) / 200 for i in range(n)],
+    })
+    grid = GridIndex(df[COL_LAT].to_numpy(dtype="float32"), df[COL_LON].to_numpy(dtype="float32"))
+    index = filter_index.FilterIndex(df)
+
+    for shape in [
+        {"bbox": (40.6, -74.1, 40.7, -73.9)},
+        {"radius": (40.7, -73.95, 1500)},
+        {"polygon": [(40.55, -74.15), (40.85, -74.0), (40.55, -73.75)]},
+        {"bbox": (0.0, 0.0, 1.0, 1.0)},
+    ]:
+        scanned = apply_filters(df, borough="queens", **shape)
+        indexed = apply_filters(df, borough="queens", index=index, spatial_index=grid, **shape)
+        assert indexed.index.equals(scanned.index), shape
+
+    inside = apply_filters(df, bbox=(40.6, -74.1, 40.7, -73.9))
+    assert inside[COL_LAT].between(40.6, 40.7).all()
+
+    # Points exactly on a bbox edge or the radius: both paths agree, edges included
+    lat0, lon0, meters = 40.7, -73.95, 1500
+    edge = pd.DataFrame({
+        COL_LAT: [40.6, 40.7, 40.65, 40.65, lat0 + meters / METERS_PER_DEGREE_LAT, lat0, 40.7 + 1e-7],
+        COL_LON: [-74.0, -74.0, -74.1, -73.9, lon0, lon0, -74.0],
+    })
+    edge_grid = GridIndex(edge[COL_LAT].to_numpy(dtype="float32"), edge[COL_LON].to_numpy(dtype="float32"))
+    for shape in [{"bbox": (40.6, -74.1, 40.7, -73.9)}, {"radius": (lat0, lon0, meters)}]:
+        scanned = apply_filters(edge, **shape)
+        indexed = apply_filters(edge, spatial_index=edge_grid, **shape)
+        assert indexed.index.equals(scanned.index), shape
+    assert list(apply_filters(edge, bbox=(40.6, -74.1, 40.7, -73.9)).index) == [0, 1, 2, 3, 5, 6]
+
+    # Edges on grid cell boundaries, points at float32(edge) and its float32
+    # neighbours: rounding may move a point across the cell boundary
+    rng = np.random.default_rng(0)
+    for _ in range(300):
+        cells = rng.integers(0, 40, size=4)
+        bbox = (
+            40.5 + cells[0] * SPATIAL_CELL_DEGREES, -74.2 + cells[1] * SPATIAL_CELL_DEGREES,
+            40.7 + cells[2] * SPATIAL_CELL_DEGREES, -73.9 + cells[3] * SPATIAL_CELL_DEGREES,
+        )
+        mid_lat, mid_lon = np.float32((bbox[0] + bbox[2]) / 2), np.float32((bbox[1] + bbox[3]) / 2)
+        lat, lon = [], []
+        for k, edge in enumerate(bbox):
+            e = np.float32(edge)
+            for v in (np.nextafter(e, np.float32(-np.inf)), e, np.nextafter(e, np.float32(np.inf))):
+                lat.append(v if k % 2 == 0 else mid_lat)
+                lon.append(v if k % 2 == 1 else mid_lon)
+        lat, lon = np.array(lat, dtype="float32"), np.array(lon, dtype="float32")
+        expected = np.flatnonzero(spatial_mask(lat, lon, bbox=bbox))
+        np.testing.assert_array_equal(GridIndex(lat, lon).select(bbox=bbox), expected, err_msg=str(bbox))
+        radius = (float(mid_lat), float(mid_lon), 5000.0)
+        np.testing.assert_array_equal(
+            GridIndex(lat, lon).select(radius=radius), np.flatnonzero(spatial_mask(lat, lon, radius=radius))
+        )
+
+    assert selection_to_shape({"range": {"map": [[-74.1, 40.7], [-73.9, 40.6]]}}) == {
+        "bbox": (40.6, -74.1, 40.7, -73.9)
+    }
+    assert selection_to_shape(None) == {}
+
+
+# ---------------------------
+# TEST 13 — warm-up precomputes the initial and popular filtered reports
+# ---------------------------
+def test_warm_up_fills_report_cache():
+    df = pd.DataFrame({
+        COL_BOROUGH: ["QUEENS", "QUEENS", "BRONX", None],
+        COL_YEAR: [2021, 2022, 2022, 2020],
+        COL_PERSON_INJURY: ["INJURED", "KILLED", "INJURED", "INJURED"],
+    })
+    combos = popular_filters(df)
+    assert combos[0] == {"borough": "QUEENS"}
+    assert {"year": 2022} in combos and {"borough": "BRONX", "year": 2022} in combos
+
+    cache = ReportCache()
+    calls = []
+
+    def report(**filters):
+        return cache.get_or_compute(filter_key(**filters), lambda: calls.append(filters) or len(calls))
+
+    stats = warm_up(report, combos + [{"borough": "queens"}])
+    assert stats["reports"] == len(combos) + 1
+    # Unfiltered + each combination; "queens" reuses the "QUEENS" entry
+    assert calls[0] == {} and len(calls) == len(combos) + 1
+
+
+# ---------------------------
+# TEST 14 — synthetic benchmark data loads like the real CSV; baseline compare
+# ---------------------------
+def test_synthetic_dataset_and_baseline_compare(tmp_path):
+    path = write_dataset(tmp_path / "synthetic.csv", 2000, seed=1)
+    df = load_data(path, use_cache=False)
+    assert len(df) == 2000
+    assert {COL_BOROUGH, COL_YEAR, COL_MONTH, COL_HOUR, COL_LAT, COL_COLLISION_ID} <= set(df.columns)
+    assert df[COL_COLLISION_ID].nunique() < len(df)  # several persons per crash
+    assert df[COL_BOROUGH].isna().any() and df[COL_LAT].isna().any()
+
+    assert parse_size("100k") == 100_000 and parse_size("1M") == 1_000_000
+    baseline = {"results": {"1000": {"load_csv": {"seconds": 1.0}, "tiny": {"seconds": 0.001}}}}
+    current = {"results": {"1000": {"load_csv": {"seconds": 1.2}, "tiny": {"seconds": 0.01}}}}
+    assert compare(current, baseline, tolerance=0.25) == []
+    current["results"]["1000"]["load_csv"]["seconds"] = 1.5
+    assert len(compare(current, baseline, tolerance=0.25)) == 1
+    # A stage the baseline never recorded is reported, not skipped
+    current["results"]["1000"]["load_csv"]["seconds"] = 1.0
+    current["results"]["1000"]["new_stage"] = {"seconds": 0.5}
+    assert compare(current, baseline, tolerance=0.25) == ["new_stage @ 1,000 rows: no baseline entry"]
+
+    # On another host only the stage ratios count: uniformly slower is fine,
+    # losing the index speed-up is not
+    baseline = {
+        "meta": {"cpu_count": 8},
+        "results": {"1000": {"apply_filters_scan": {"seconds": 0.1}, "apply_filters": {"seconds": 0.02}}},
+    }
+    current = {
+        "meta": {"cpu_count": 1},
+        "results": {"1000": {"apply_filters_scan": {"seconds": 0.3}, "apply_filters": {"seconds": 0.06}}},
+    }
+    assert compare(current, baseline, tolerance=0.25) == []
+    current["results"]["1000"]["apply_filters"]["seconds"] = 0.1
+    assert compare(current, baseline, tolerance=0.25) == [
+        "apply_filters/apply_filters_scan @ 1,000 rows: 0.333 vs baseline 0.200 (+67%)"
+    ]
+    assert "numpy 2.4.6 (pinned 2.0.2)" in off_pin({"numpy": "2.4.6", "requirements": {"numpy": "2.0.2"}})
+
+
+# ---------------------------
+# TEST 15 — stage metrics, slow-request log and the /metrics endpoint
+# ---------------------------
+def test_metrics_stages_and_endpoint(caplog):
+    from flask import Flask
+
+    registry = Metrics(slow_seconds=0.0)
+    with registry.request("generate_report", filters={"borough": "QUEENS"}):
+        with registry.stage("apply_filters") as st:
+            st.rows = 42
+        with registry.stage("figures"):
+            pass
+
+    snap = registry.snapshot()
+    assert snap["stages"]["apply_filters"]["count"] == 1
+    assert snap["stages"]["apply_filters"]["rows"] == 42
+    assert snap["requests"]["generate_report"]["count"] == 1
+    slow = snap["slow_requests"][0]
+    assert [s["stage"] for s in slow["stages"]] == ["apply_filters", "figures"]
+    assert slow["filters"] == {"borough": "QUEENS"}
+    assert "generate_report" in caplog.text
+
+    server = Flask(__name__)
+    register_metrics_endpoint(server, registry, sources={"report_cache": lambda: {"hits": 3}})
+    body = server.test_client().get("/metrics").get_json()
+    assert body["stages"]["figures"]["count"] == 1
+    assert body["report_cache"] == {"hits": 3}
+
+
+# ---------------------------
+# TEST 16 — per-part report callbacks share one selection and skip unchanged parts
+# ---------------------------
+def test_report_parts_skip_unchanged_outputs():
+    from dash import Dash, no_update
+    from project import callbacks
+    from project.components.layout import create_layout
+
+    df = pd.DataFrame({
+        COL_COLLISION_ID: [1, 1, 2, 3, 4],
+        COL_BOROUGH: ["QUEENS", "QUEENS", "BRONX", "BRONX", "QUEENS"],
+        COL_YEAR: [2021, 2021, 2022, 2022, 2022],
+        COL_MONTH: [1, 1, 2, 3, 4],
+        COL_HOUR: [8, 8, 9, 17, 23],
+        COL_PERSON_INJURY: ["INJURED", "KILLED", "INJURED", "UNSPECIFIED", "INJURED"],
+        COL_PERSON_TYPE: ["OCCUPANT", "PEDESTRIAN", "OCCUPANT", "OCCUPANT", "BICYCLIST"],
+        COL_LAT: [40.70, 40.70, 40.85, 40.86, None],
+        COL_LON: [-73.80, -73.80, -73.90, -73.88, None],
+    })
+    app = Dash(__name__)
+    app.layout = create_layout(df)
+    callbacks.register_callbacks(app, df)
+    cb = {k: v["callback"].__wrapped__ for k, v in app.callback_map.items()}
+    select = cb["report-selection.data"]
+    kpis = next(f for k, f in cb.items() if "kpis-digest" in k)
+    boro = next(f for k, f in cb.items() if "borough-bar-digest" in k)
+
+    everything = select(None, *[None] * 10)
+    out = kpis(everything, None)
+    assert out[:4] == ["4", "5", "3", "1"]
+
+    queens = select(1, "", ["QUEENS"], *[None] * 8)
+    assert kpis(queens, out[-1])[0] == "2"
+    boro_out = boro(queens, None)
+    # A new selection (here typed as a search) with the same Queens rows
+    # leaves the borough chart alone
+    same_rows = select(1, "queens 2021-2022", *[None] * 9)
+    assert boro(same_rows, boro_out[-1]) == [no_update, no_update]
+    assert boro(select(1, None, ["QUEENS"], [2021], *[None] * 7), boro_out[-1])[0] is not no_update
+
+
+# ---------------------------
+# TEST 17 — template figures are valid and plot the aggregated counts as-is
+# ---------------------------
+def test_template_figures_from_aggregates():
+    import plotly.graph_objects as go
+    from project.components import figures
+    from project.utils.aggregates import ReportAggregates
+
+    df = pd.DataFrame({
+        COL_BOROUGH: ["QUEENS", "QUEENS", "BRONX"],
+        COL_YEAR: [2021, 2022, 2022],
+        COL_MONTH: [1, 5, 5],
+        COL_HOUR: [8, 8, 23],
+        COL_PERSON_INJURY: ["INJURED", "KILLED", "INJURED"],
+        COL_LAT: [40.70, 40.71, 40.85],
+        COL_LON: [-73.80, -73.80, -73.90],
+    })
+    agg = aggregate_frame(df)
+    builders = [
+        figures.time_series_figure, figures.borough_figure, figures.injury_figure,
+        figures.location_figure, figures.heatmap_figure,
+    ]
+    for build in builders:
+        go.Figure(build(agg))  # raises if the spec is invalid
+        go.Figure(build(ReportAggregates()))  # "missing" placeholders
+
+    heat = figures.heatmap_figure(agg)["data"][0]
+    assert list(heat["y"]) == ["BRONX", "QUEENS"]
+    assert heat["z"][1][8] == 2 and heat["z"][0][23] == 1 and heat["z"].sum() == 3
+    assert list(figures.time_series_figure(agg)["data"][0]["x"]) == ["2021-1", "2022-5"]
+    # Templates are shared, never mutated by a render
+    assert "x" not in figures.BOROUGH_BAR.data[0]
+
+
+# ---------------------------
+# TEST 18 — multi-select months/hours: OR within a filter, AND across filters
+# ---------------------------
+def test_multi_select_months_and_hours():
+    n = 480
+    df = pd.DataFrame({
+        COL_BOROUGH: pd.Categorical([["BROOKLYN", "QUEENS", "BRONX"][i % 3] for i in range(n)]),
+        COL_YEAR: [2018 + i % 5 for i in range(n)],
+        COL_MONTH: [1 + i % 12 for i in range(n)],
+        COL_HOUR: [i % 24 for i in range(n)],
+    })
+    index = filter_index.FilterIndex(df)
+    nights = [22, 23, 0, 1, 2, 3, 4, 5]
+    filters = {"borough": ["Brooklyn", "QUEENS"], "year": [2019, 2020, 2021], "hours": nights}
+
+    expected = df[
+        df[COL_BOROUGH].isin(["BROOKLYN", "QUEENS"])
+        & df[COL_YEAR].between(2019, 2021)
+        & df[COL_HOUR].isin(nights)
+    ]
+    assert apply_filters(df, **filters).index.equals(expected.index)
+    assert apply_filters(df, index=index, **filters).index.equals(expected.index)
+
+    winter = apply_filters(df, index=index, months=[12, 1, 2])
+    assert set(winter[COL_MONTH]) == {12, 1, 2}
+    assert filter_key(months=[2, 1]) == filter_key(months=["1", 2])
+
+
+# ---------------------------
+# TEST 19 — search engine: typos, ranges and time phrases
+# ---------------------------
+def test_search_engine_parses_typos_and_ranges():
+    engine = SearchEngine(
+        {
+            "borough": ["BROOKLYN", "QUEENS", "STATEN ISLAND"],
+            "person_type": ["PEDESTRIAN", "BICYCLIST"],
+            "injury": ["KILLED", "INJURED"],
+            "vehicle_type": ["SEDAN", "BOX TRUCK"],
+        },
+        years=range(2012, 2025),
+    )
+
+    r = engine.parse("Brookyln 2019-2021 pedestrains kiled at night")
+    assert r["borough"] == ["BROOKLYN"]
+    assert r["year"] == [2019, 2020, 2021]
+    assert r["person_type"] == ["PEDESTRIAN"]
+    assert r["injury"] == ["KILLED"]
+    assert r["hours"] == [22, 23, 0, 1, 2, 3, 4, 5]
+
+    r = engine.parse("staten island cyclist box truck since 2023 in march 8am")
+    assert r["borough"] == ["STATEN ISLAND"]
+    assert r["person_type"] == ["BICYCLIST"]
+    assert r["vehicle_type"] == ["BOX TRUCK"]
+    assert r["year"] == [2023, 2024]
+    assert r["months"] == [3] and r["hours"] == [8]
+
+    # "and" lists years; it only closes a range after "between"
+    assert engine.parse("2019 and 2021")["year"] == [2019, 2021]
+    r = engine.parse("between 2019 and 2021")
+    assert r["year"] == [2019, 2020, 2021] and r["keywords"] == []
+    # "from" followed by an end year is a closed range
+    assert engine.parse("from 2020 to 2022")["year"] == [2020, 2021, 2022]
+    assert engine.parse("since 2019 through 2020 in queens")["year"] == [2019, 2020]
+    assert engine.parse("before 2014")["year"] == [2012, 2013]
+    # Without known years, open ranges keep the nearest year on their side
+    bare = SearchEngine({"borough": ["QUEENS"]})
+    assert bare.parse("before 2020")["year"] == [2019]
+    assert bare.parse("since 2020")["year"] == [2020]
+    assert bare.parse("after 2020")["year"] == [2021]
+
+    # Short tokens never fuzzy-match; unknown words are kept as keywords
+    assert engine.parse("bus queen")["keywords"] == ["bus"]
+    assert engine.parse(None)["borough"] == []
+
+
+# ---------------------------
+# TEST 20 — free text: word-prefix index matches the scan, combines with filters
+# ---------------------------
+def test_text_index_matches_scan():
+    n = 300
+    df = pd.DataFrame({
+        COL_BOROUGH: [["BROOKLYN", "QUEENS", "BRONX"][i % 3] for i in range(n)],
+        COL_YEAR: [2019 + i % 4 for i in range(n)],
+        COL_VEHICLE_TYPE: [["SEDAN", "BOX TRUCK", "PICK-UP TRUCK", None][i % 4] for i in range(n)],
+        COL_FACTOR: [["UNSAFE SPEED", "DRIVER INATTENTION/DISTRACTION"][i % 2] for i in range(n)],
+        COL_STREET: [["ATLANTIC AVENUE", "QUEENS BOULEVARD", "BROADWAY", None, "3 AVENUE"][i % 5] for i in range(n)],
+    }).astype({c: "category" for c in [COL_BOROUGH, COL_VEHICLE_TYPE, COL_FACTOR, COL_STREET]})
+    index = filter_index.FilterIndex(df)
+
+    for filters in [
+        {"search_text": "truck"},
+        {"search_text": "Box  TRUCK"},
+        {"search_text": "atl"},
+        {"search_text": "queens"},  # borough or street
+        {"search_text": "inattention avenue", "borough": "BRONX"},
+        {"search_text": "pick-up", "year": [2020, 2021]},
+        {"search_text": "nothing"},
+    ]:
+        scanned = apply_filters(df, **filters)
+        indexed = apply_filters(df, index=index, **filters)
+        assert indexed.index.equals(scanned.index), filters
+
+    trucks = apply_filters(df, index=index, search_text="truck")
+    assert set(trucks[COL_VEHICLE_TYPE]) == {"BOX TRUCK", "PICK-UP TRUCK"}
+    assert index.known_terms("show atlantic trucks") == ["atlantic"]
+    assert filter_key(search_text="Truck box") == filter_key(search_text="box truck")
+
+
+# ---------------------------
+# TEST 21 — pipeline: chunked, parallel run matches one chunk; vectorized imputation
+# ---------------------------
+def test_pipeline_chunk_invariant(tmp_path):
+    crashes, persons = write_raw(tmp_path / "raw", 3000, seed=3)
+
+    whole = run_pipeline(crashes, persons, tmp_path / "whole.csv", workers=1, chunk_bytes=1 << 30)
+    chunked = run_pipeline(crashes, persons, tmp_path / "chunked.csv", workers=2, chunk_bytes=40_000)
+    assert whole["rows"] == chunked["rows"]
+
+    a, b = (pd.read_csv(tmp_path / f"{name}.csv") for name in ["whole", "chunked"])
+    a, b = (d.sort_values(list(d.columns)).reset_index(drop=True) for d in (a, b))
+    pd.testing.assert_frame_equal(a, b)
+
+    assert not a.duplicated().any()
+    assert a["PERSON_AGE"].dropna().between(0, stages.MAX_AGE).all()  # NaN: crash without persons
+    assert a[stages.BOROUGH].notna().all()
+
+    # Group-mode fill equals the row-by-row version (ties -> smallest value)
+    df = pd.DataFrame({
+        "BOROUGH": ["A", "A", "A", "A", "B", "B", "B", "C", None],
+        "ZIP CODE": [1.0, 2.0, 2.0, None, 5.0, 4.0, None, None, None],
+    })
+    modes = stages.group_modes(df, ["BOROUGH"], "ZIP CODE")
+    filled = stages.impute_group_mode(df, ["BOROUGH"], "ZIP CODE", modes)
+    assert filled.tolist()[:7] == [1.0, 2.0, 2.0, 2.0, 5.0, 4.0, 4.0]
+    assert filled.iloc[7:].isna().all()
+
+    labels = stages.fill_unknown(pd.Series([" Sedan", "Sedan", "", None]))
+    assert labels.tolist() == ["Sedan", "Sedan", "UNKNOWN", "UNKNOWN"]
+
+
+# ---------------------------
+# TEST 22 — incremental refresh appends partitions; the app extends its data in place
+# ---------------------------
+def test_incremental_refresh(tmp_path):
+    from dash import Dash
+    from project import callbacks
+    from project.utils.index import FilterIndex
+    from project.utils.load_data import dataset_version, load_shared, read_manifest
+    from project.utils.refresh import apply_new_partitions
+
+    crashes_csv, persons_csv = write_raw(tmp_path / "raw", 2000, seed=5)
+    crashes = pd.read_csv(crashes_csv, dtype=str)
+    persons = pd.read_csv(persons_csv, dtype=str)
+    dates = pd.to_datetime(crashes["CRASH DATE"], format="%m/%d/%Y")
+    old = crashes[dates < dates.quantile(0.8)]
+
+    def drop(name, c):
+        c.to_csv(tmp_path / f"{name}-c.csv", index=False)
+        persons[persons["COLLISION_ID"].isin(c["COLLISION_ID"])].to_csv(tmp_path / f"{name}-p.csv", index=False)
+        return tmp_path / f"{name}-c.csv", tmp_path / f"{name}-p.csv"
+
+    out = tmp_path / "integrated.csv"
+    run_pipeline(*drop("base", old), out, workers=1)
+    mark = read_manifest(out)["high_water"]
+    version = dataset_version(out)
+
+    def report_for(df, **kwargs):
+        index = FilterIndex(df)
+        return callbacks.register_callbacks(Dash(__name__), df, index=index, cube=CountCube(df, index), **kwargs)
+
+    live = report_for(load_data(out, use_cache=False))
+    # Memory-mapped like the app: refreshes rewrite and re-map the shared file
+    mapped = report_for(load_data(out, mmap=True), shared_path=out)
+
+    # Drop 1: the full export; only the newer collisions are appended
+    first = incremental.refresh(*drop("all", crashes), out, lookback_days=None)
+    assert first["new"] > 0 and first["changed"] == 0 and first["partition"] == "part-00001.csv"
+    assert first["high_water"]["crash_date"] > mark["crash_date"]
+    assert incremental.refresh(*drop("all", crashes), out)["partition"] is None
+    assert dataset_version(out) != version
+
+    assert apply_new_partitions(live.extend, out, seen=0) == 1
+    assert apply_new_partitions(mapped.extend, out, seen=0) == 1
+    assert load_shared(out)[1] == "memory-mapped"  # written by the refresh, current
+    fresh = report_for(load_data(out, use_cache=False))
+    for filters in [{}, {"borough": ["QUEENS"]}, {"year": [2020, 2021], "injury": ["KILLED"]}]:
+        np.testing.assert_equal(live(**filters), fresh(**filters), err_msg=str(filters))
+        np.testing.assert_equal(mapped(**filters), fresh(**filters), err_msg=str(filters))
+
+    # Drop 2: an old crash amended; its rows are replaced, not duplicated
+    amended = crashes.copy()
+    target = old["COLLISION_ID"].iloc[0]
+    amended.loc[amended["COLLISION_ID"] == target, "VEHICLE TYPE CODE 1"] = "Amended Truck"
+    second = incremental.refresh(*drop("amended", amended), out, lookback_days=None)
+    assert second["changed"] == 1 and second["new"] == 0
+
+    df = load_data(out, use_cache=False)
+    rows = df[df[COL_COLLISION_ID] == int(target)]
+    assert len(rows) > 0 and (rows[COL_VEHICLE_TYPE] == "AMENDED TRUCK").all()
+    part = pd.read_csv(tmp_path / "integrated.parts" / "part-00002.csv")
+    assert len(rows) == (part["COLLISION_ID"] == int(target)).sum()
+
+    assert apply_new_partitions(live.extend, out, seen=1) == 2
+    assert apply_new_partitions(mapped.extend, out, seen=1) == 2
+    fresh = report_for(df)
+    for filters in [{}, {"vehicle_type": ["AMENDED TRUCK"]}, {"borough": ["BRONX"], "year": [2019]}]:
+        np.testing.assert_equal(live(**filters), fresh(**filters), err_msg=str(filters))
+        np.testing.assert_equal(mapped(**filters), fresh(**filters), err_msg=str(filters))
+    shared, _ = load_shared(out)
+    pd.testing.assert_frame_equal(shared, df, check_categorical=False)
+    assert not shared[COL_YEAR].to_numpy().flags.writeable
+
+
+# ---------------------------
+# TEST 23 — partitioned store: pruned reads match filtering the full frame
+# ---------------------------
+def test_partitioned_store_prunes_partitions(tmp_path):
+    from project.utils.load_data import PartitionedDataset, store_dir
+
+    path = write_dataset(tmp_path / "synthetic.csv", 3000, seed=3)
+    df = load_data(path)
+    store = load_data(path, lazy=True)
+    assert isinstance(store, PartitionedDataset) and len(store) == len(df)
+    assert (store_dir(path) / "CRASH_YEAR=2022" / "BOROUGH=STATEN%20ISLAND" / "part-0.feather").exists()
+    assert (store_dir(path) / "CRASH_YEAR=2022" / "BOROUGH=__HIVE_DEFAULT_PARTITION__").exists()
+
+    full = store.read()
+    assert full[COL_YEAR].dtype == df[COL_YEAR].dtype
+    assert all(full[c].dtype == df[c].dtype for c in df.columns if c != COL_BOROUGH)
+    assert isinstance(full[COL_BOROUGH].dtype, pd.CategoricalDtype)
+
+    def rows(frame):
+        return frame.astype(str).sort_values(list(frame.columns)).reset_index(drop=True)
+
+    for filters in [
+        {"borough": "queens", "year": "2023"},
+        {"borough": ["BRONX", "STATEN ISLAND"], "injury": "INJURED"},
+        {"year": [2019, 2020], "search_text": "sedan"},
+        {"borough": "NOWHERE"},
+        {},
+    ]:
+        expected = apply_filters(df, **filters)
+        pd.testing.assert_frame_equal(rows(apply_filters(store, **filters)), rows(expected), obj=str(filters))
+
+    # Queens 2023 opens one file; a different CSV rebuilds the store
+    assert len(store.prune({COL_BOROUGH: ["QUEENS"], COL_YEAR: [2023]})) == 1
+    generate_dataset(500, seed=4).to_csv(path, index=False)
+    assert len(load_data(path, lazy=True)) == 500
+
+
+# ---------------------------
+# TEST 24 — severity / first-person flags: KPIs as sums, also from the cube
+# ---------------------------
+def test_kpi_flags_match_labels_and_distinct_crashes(tmp_path):
+    path = write_dataset(tmp_path / "synthetic.csv", 3000, seed=6)
+    df = load_data(path, use_cache=False)
+    labels = df[COL_PERSON_INJURY].astype(str).str.lower()
+    assert df[COL_IS_INJURED].dtype == bool
+    assert (df[COL_IS_INJURED] == labels.str.contains("injur")).all()
+    assert (df[COL_IS_KILLED] == labels.str.contains("fatal|kill")).all()
+    assert df[COL_FIRST_PERSON].sum() == df[COL_COLLISION_ID].nunique()
+
+    # Chunks: each collision is still counted once
+    chunks = list(iter_chunks(path, chunksize=700))
+    assert sum(int(c[COL_FIRST_PERSON].sum()) for c in chunks) == df[COL_COLLISION_ID].nunique()
+
+    index = filter_index.FilterIndex(df)
+    cube = CountCube(df, index)
+    for filters in [
+        {},
+        {"borough": "QUEENS", "year": 2022},
+        {"vehicle_type": "SEDAN", "hours": [7, 8]},
+        {"person_type": "PEDESTRIAN"},  # person-level: crashes from collision ids
+        {"injury": "KILLED", "borough": "BROOKLYN"},
+    ]:
+        rows = apply_filters(df, **filters)
+        agg = cube.query(normalize_filters(**filters))
+        assert agg.total_crashes == rows[COL_COLLISION_ID].nunique(), filters
+        assert agg.injuries == int(rows[COL_PERSON_INJURY].astype(str).str.contains("INJUR").sum()), filters
+        assert agg.fatalities == aggregate_frame(rows).fatalities == int(rows[COL_IS_KILLED].sum()), filters
+
+    added = cube.extend(df.iloc[:10], index.extend(df.iloc[:10]))
+    assert added.query({}).injuries == cube.query({}).injuries + int(df[COL_IS_INJURED].iloc[:10].sum())
+
+
+# ---------------------------
+# TEST 25 — background reports: job processes hand aggregates over the disk tier
+# ---------------------------
+def test_background_report_registration(tmp_path):
+    import multiprocessing
+    from dash import Dash
+    from project import callbacks
+
+    df = load_data(write_dataset(tmp_path / "synthetic.csv", 2000, seed=1), use_cache=False)
+    with pytest.raises(ValueError):
+        callbacks.register_callbacks(Dash(__name__), df, cache=ReportCache(), background=True)
+
+    app = Dash(__name__)
+    cache = ReportCache(disk_dir=tmp_path / "cache")
+    report = callbacks.register_callbacks(app, df, cache=cache, background=True)
+    spec = app.callback_map["report-selection.data"]["background"]
+    assert [str(o) for o in spec["progress"]] == ["report-progress.children"]
+
+    # A job process aggregates the selection; the parts in this process reuse it
+    filters = {"borough": ["QUEENS"], "year": [2022]}
+    job = multiprocessing.get_context("fork").Process(target=report, kwargs=filters)
+    job.start()
+    job.join(60)
+    assert job.exitcode == 0
+    report(**filters)
+    assert cache.disk_hits >= 1
+
+
+# ---------------------------
+# TEST 26 — memory-mapped frame: read-only views, same reports as the copy
+# ---------------------------
+def test_memory_mapped_frame(tmp_path):
+    from dash import Dash
+    from project import callbacks
+    from project.utils.load_data import _shared_paths, read_shared, write_shared
+
+    path = write_dataset(tmp_path / "synthetic.csv", 2000, seed=7)
+    df = load_data(path)
+    shared = load_data(path, mmap=True)
+    assert _shared_paths(path)[0].exists()
+    pd.testing.assert_frame_equal(shared, df)
+
+    # Every column is a view of the mapped file, not a private copy
+    for col in shared.columns:
+        values = shared[col]
+        arr = values.cat.codes.to_numpy() if isinstance(values.dtype, pd.CategoricalDtype) else values.to_numpy()
+        assert not arr.flags.writeable, col
+    assert list(load_data(path, columns=[COL_YEAR, COL_BOROUGH], mmap=True).columns) == [COL_YEAR, COL_BOROUGH]
+
+    # Every column kind round-trips, nullable ints with their missing values
+    kinds = pd.DataFrame({
+        "masked": pd.array([1, None, 3], dtype="Int32"),
+        "flag": [True, False, True],
+        "label": pd.Categorical(["a", None, "b"]),
+        "text": ["x", "y", None],
+    })
+    write_shared(kinds, tmp_path / "kinds.arrow")
+    pd.testing.assert_frame_equal(read_shared(tmp_path / "kinds.arrow"), kinds)
+
+    def report_for(frame):
+        index = filter_index.FilterIndex(frame)
+        return callbacks.register_callbacks(Dash(__name__), frame, index=index, cube=CountCube(frame, index))
+
+    mapped, copied = report_for(shared), report_for(df)
+    for filters in [{}, {"borough": ["QUEENS"], "year": [2022]}, {"bbox": (40.70, -74.02, 40.75, -73.97)}]:
+        np.testing.assert_equal(mapped(**filters), copied(**filters), err_msg=str(filters))
+
+
+# ---------------------------
+# TEST 27 — dropdown options: top values in the page, the rest searched on the server
+# ---------------------------
+def test_dropdown_option_search(tmp_path):
+    from dash import Dash
+    from project import callbacks
+    from project.components.layout import create_layout
+    from project.utils.options import OptionVocabulary, build_vocabularies
+
+    vocab = OptionVocabulary(pd.Series(["Taxi", "Sedan", "Sedan", "Pick-up Truck", "Box Truck", "Truck", None]))
+    assert vocab.top(2) == ["Sedan", "Box Truck"]  # most frequent, ties alphabetical
+    # Prefix, then word prefix, then substring; each by frequency
+    assert vocab.search("tr") == ["Truck", "Box Truck", "Pick-up Truck"]
+    assert vocab.search("UP") == ["Pick-up Truck"]
+    assert vocab.search("xyz") == []
+    assert vocab.options(["Taxi"], keep=["Sedan"]) == [
+        {"label": "Taxi", "value": "Taxi"},
+        {"label": "Sedan", "value": "Sedan"},
+    ]
+
+    df = load_data(write_dataset(tmp_path / "synthetic.csv", 2000, seed=3), use_cache=False)
+    vocabularies = build_vocabularies(df)
+    layout = create_layout(df, top_options=3)
+    shipped = layout["vehicle-dropdown"].options
+    assert [o["value"] for o in shipped] == vocabularies["vehicle_type"].top(3)
+
+    app = Dash(__name__)
+    callbacks.register_callbacks(app, df, top_options=3)
+    assert "vehicle-dropdown.options" in app.callback_map
+    assert "borough-dropdown.options" in app.callback_map  # 5 boroughs > 3
+    update = app.callback_map["vehicle-dropdown.options"]["callback"].__wrapped__
+    label = vocabularies["vehicle_type"].labels[-1]
+    assert update(label.lower(), [])[0] == {"label": label, "value": label}
+    assert [o["value"] for o in update(None, [label])][:3] == vocabularies["vehicle_type"].top(3)
+
+
+# ---------------------------
+# TEST 28 — report payload: typed arrays on the wire, response sizes recorded
+# ---------------------------
+def test_compact_payload_and_sizes():
+    import base64
+    import gzip
+    from flask import Flask, jsonify
+    from project.components import figures
+    from project.utils.metrics import register_payload_metrics
+
+    spec = figures.typed_array(np.array([[0, 3], [250, 7]]))
+    assert spec["dtype"] == "u1" and spec["shape"] == "2, 2"
+    assert np.frombuffer(base64.b64decode(spec["bdata"]), np.uint8).tolist() == [0, 3, 250, 7]
+    assert figures.typed_array(np.array([-1, 70000]))["dtype"] == "i4"
+    coords = figures.typed_array(np.array([40.712345, -73.95]))
+    assert np.allclose(np.frombuffer(base64.b64decode(coords["bdata"]), np.float32), [40.712345, -73.95], atol=1e-5)
+
+    fig = {"data": [{"type": "heatmap", "z": np.eye(2, dtype="int64"), "y": np.array(["A", "B"], dtype=object)}], "layout": {}}
+    packed = figures.pack_figure(fig)
+    assert packed["data"][0]["z"]["dtype"] == "u1" and list(packed["data"][0]["y"]) == ["A", "B"]
+    assert isinstance(fig["data"][0]["z"], np.ndarray)  # input untouched
+    # Templates carry only the trace types they draw
+    assert set(figures.DENSITY_MAP.layout["template"]["data"]) <= {"densitymap", "scattermap"}
+
+    server = Flask(__name__)
+    registry = Metrics(track_memory=False)
+
+    @server.route("/_dash-update-component", methods=["POST"])
+    def update():
+        return jsonify(response={"graph": {"figure": "x" * 5000}})
+
+    @server.after_request
+    def compress(response):  # stands in for the compression extension
+        response.set_data(gzip.compress(response.get_data()))
+        return response
+
+    register_payload_metrics(server, registry)
+    client = server.test_client()
+    client.post("/_dash-update-component", json={"output": "graph.figure"})
+    client.post("/_dash-update-component", json={"output": "graph.figure"})
+    sizes = registry.snapshot()["payloads"]["graph.figure"]
+    assert sizes["count"] == 2 and sizes["mean_kb"] > 4.8 and sizes["wire_mean_kb"] < 0.5
+
+
+# ---------------------------
+# TEST 29 — background reports end to end: progress, cancelling, timings back in the worker
+# ---------------------------
+def test_background_job_progress_and_cancel(tmp_path, monkeypatch):
+    import json
+    import time
+    import diskcache
+    from dash import Dash, DiskcacheManager
+    from project import callbacks
+    from project.components.layout import create_layout
+    from project.utils.metrics import metrics
+
+    df = load_data(write_dataset(tmp_path / "synthetic.csv", 2000, seed=1), use_cache=False)
+    real_apply = callbacks.apply_filters
+
+    def slow_apply(*args, **kwargs):  # keeps each job running long enough to watch
+        time.sleep(1.5)
+        return real_apply(*args, **kwargs)
+
+    monkeypatch.setattr(callbacks, "apply_filters", slow_apply)
+    manager = DiskcacheManager(diskcache.Cache(tmp_path / "jobs"))
+    app = Dash(__name__, background_callback_manager=manager)
+    app.layout = create_layout(df)
+    callbacks.register_callbacks(app, df, cache=ReportCache(disk_dir=tmp_path / "cache"), background=True)
+    client = app.server.test_client()
+    spec = app.callback_map["report-selection.data"]
+
+    def click(borough, query=""):
+        # What the browser posts for a click, and again for each poll of its job
+        values = {"borough-dropdown": [borough]}
+        body = {
+            "output": "report-selection.data",
+            "outputs": {"id": "report-selection", "property": "data"},
+            "inputs": [{"id": "generate-button", "property": "n_clicks", "value": 1}],
+            "state": [{**s, "value": values.get(s["id"])} for s in spec["state"]],
+            "changedPropIds": ["generate-button.n_clicks"],
+        }
+        return client.post("/_dash-update-component" + query, json=body).get_json()
+
+    first = click("QUEENS")
+    time.sleep(0.5)
+    assert manager.job_running(first["job"])
+    second = click("BRONX", f"?oldJob={first['job']}")
+    # The superseded job is terminated as soon as the new click arrives
+    for _ in range(50):
+        if not manager.job_running(first["job"]):
+            break
+        time.sleep(0.1)
+    assert not manager.job_running(first["job"])
+
+    progress, result = [], None
+    for _ in range(100):
+        poll = click("BRONX", f"?cacheKey={second['cacheKey']}&job={second['job']}")
+        progress += list((poll.get("progress") or {}).values())
+        if "response" in poll:
+            result = poll["response"]["report-selection"]["data"]
+            break
+        time.sleep(0.1)
+    assert result is not None and result["filters"]["borough"] == ["BRONX"]
+    assert any("Filtering rows" in json.dumps(p) for p in progress)
+    # Long past when it would have finished, the cancelled job left no result
+    assert not manager.result_ready(first["cacheKey"])
+
+    # The job's timings reach this worker's metrics once, through the first part
+    metrics.reset()
+    parts = {
+        name: next(v["callback"].__wrapped__ for k, v in app.callback_map.items() if f"{name}-digest.data" in k)
+        for name in ("kpis", "heatmap")
+    }
+    for update in parts.values():
+        update(result, None)
+    snapshot = metrics.snapshot()
+    assert snapshot["requests"]["generate_report"]["count"] == 1
+    assert snapshot["stages"]["apply_filters"]["count"] == 1
+    assert snapshot["stages"]["apply_filters"]["mean_ms"] >= 1500
+
+
+# ---------------------------
+# TEST 30 — incremental refresh: a crash after the manifest never loses the delta
+# ---------------------------
+def test_incremental_refresh_survives_crash(tmp_path, monkeypatch):
+    from project.pipeline import store
+    from project.utils.load_data import read_manifest
+
+    crashes_csv, persons_csv = write_raw(tmp_path / "raw", 1500, seed=9)
+    crashes = pd.read_csv(crashes_csv, dtype=str)
+    persons = pd.read_csv(persons_csv, dtype=str)
+    dates = pd.to_datetime(crashes["CRASH DATE"], format="%m/%d/%Y")
+    old = crashes[dates < dates.quantile(0.8)]
+    old.to_csv(tmp_path / "old-c.csv", index=False)
+    persons[persons["COLLISION_ID"].isin(old["COLLISION_ID"])].to_csv(tmp_path / "old-p.csv", index=False)
+    out = tmp_path / "integrated.csv"
+    run_pipeline(tmp_path / "old-c.csv", tmp_path / "old-p.csv", out, workers=1)
+
+    def crash(*args, **kwargs):
+        raise OSError("disk full")
+
+    # Dies between committing the partition and storing its hashes
+    with monkeypatch.context() as m:
+        m.setattr(store, "write_collisions", crash)
+        with pytest.raises(OSError):
+            incremental.refresh(crashes_csv, persons_csv, out, lookback_days=None)
+    assert len(read_manifest(out)["partitions"]) == 1
+
+    # The re-run still sees the delta and appends it; rows are not duplicated
+    again = incremental.refresh(crashes_csv, persons_csv, out, lookback_days=None)
+    assert again["partition"] == "part-00002.csv" and again["new"] > 0
+    assert incremental.refresh(crashes_csv, persons_csv, out, lookback_days=None)["partition"] is None
+    df = load_data(out, use_cache=False)
+    part = pd.read_csv(tmp_path / "integrated.parts" / "part-00002.csv")
+    assert len(df[df[COL_COLLISION_ID].isin(part["COLLISION_ID"])]) == len(part)
@@ -0,0 +1,179 @@
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Optional, List, Union, Dict
+
+import numpy as np
+import pandas as pd
+
+from project.utils.load_data import (
+    DEFAULT_DATA_PATH,
+    COL_BOROUGH,
+    COL_YEAR,
+    COL_MONTH,
+    COL_HOUR,
+    COL_LAT,
+    COL_LON,
+    COL_COLLISION_ID,
+    COL_PERSON_INJURY,
+    COL_IS_INJURED,
+    COL_IS_KILLED,
+    INJURED_PATTERN,
+    KILLED_PATTERN,
+    iter_chunks,
+)
+from project.utils.spatial import density_counts
+
+DEFAULT_CHUNKSIZE = 500_000
+
+
+# ===========================
+# Group-by helpers
+# ===========================
+def _plain_index(index: pd.Index) -> pd.Index:
+    """Drop categorical levels so counts from different chunks align on labels."""
+    if isinstance(index, pd.MultiIndex):
+        return index.set_levels(
+            [lvl.astype(object) if isinstance(lvl, pd.CategoricalIndex) else lvl
+             for lvl in index.levels]
+        )
+    if isinstance(index, pd.CategoricalIndex):
+        return index.astype(object)
+    return index
+
+
+def _counts(df: pd.DataFrame, cols: List[str]) -> Optional[pd.Series]:
+    """Row counts per combination of `cols` (None if a column is missing)."""
+    if not all(c in df.columns for c in cols):
+        return None
+    counts = df.groupby(cols, observed=True).size()
+    counts = counts[counts > 0]
+    counts.index = _plain_index(counts.index)
+    return counts
+
+
+def _add_counts(a: Optional[pd.Series], b: Optional[pd.Series]) -> Optional[pd.Series]:
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return a.add(b, fill_value=0).astype("int64")
+
+
+def _add_density(a: Optional[Dict], b: Optional[Dict]) -> Optional[Dict]:
+    if a is None or b is None:
+        return a if b is None else b
+    return {size: _add_counts(a[size], b[size]) for size in a}
+
+
+# ===========================
+# Aggregates behind the report
+# ===========================
+@dataclass
+class ReportAggregates:
+    """
+    Everything generate_report renders, as counts instead of rows.
+
+    Count series are None when the source lacks the needed columns, so the
+    report can show the same "missing" placeholders as before.
+    """
+
+    total_persons: int = 0
+    by_year_month: Optional[pd.Series] = None
+    by_borough: Optional[pd.Series] = None
+    by_injury: Optional[pd.Series] = None
+    by_borough_hour: Optional[pd.Series] = None
+    # Sorted distinct collision ids (memory bounded by crashes, not persons)
+    collision_ids: Optional[np.ndarray] = None
+    # Map: {grid cell size: counts per non-empty cell} (see spatial.py)
+    density: Optional[Dict[float, pd.Series]] = None
+    located_persons: int = 0
+    # Distinct crashes of a compact() copy, whose collision_ids were dropped
+    # (or summed from IS_FIRST_PERSON by the cube)
+    crash_count: Optional[int] = None
+    # Sums of the IS_INJURED / IS_KILLED flags (None: match by_injury labels)
+    injured_persons: Optional[int] = None
+    killed_persons: Optional[int] = None
+
+    @property
+    def total_crashes(self) -> int:
+        if self.collision_ids is None:
+            return self.total_persons if self.crash_count is None else self.crash_count
+        return len(self.collision_ids)
+
+    def _injury_total(self, pattern: str) -> int:
+        if self.by_injury is None:
+            return 0
+        labels = self.by_injury.index.astype(str).str.lower()
+        return int(self.by_injury[labels.str.contains(pattern)].sum())
+
+    @property
+    def injuries(self) -> int:
+        if self.injured_persons is not None:
+            return self.injured_persons
+        return self._injury_total(INJURED_PATTERN)
+
+    @property
+    def fatalities(self) -> int:
+        if self.killed_persons is not None:
+            return self.killed_persons
+        return self._injury_total(KILLED_PATTERN)
+
+    @property
+    def has_locations(self) -> bool:
+        return self.density is not None
+
+    def compact(self) -> "ReportAggregates":
+        """Copy for caching a finished selection: keeps the crash count, not the ids."""
+        return replace(self, collision_ids=None, crash_count=self.total_crashes)
+
+    def fold(self, df: pd.DataFrame) -> "ReportAggregates":
+        """Add the rows of `df` to these aggregates (in place) and return self."""
+        self.total_persons += len(df)
+
+        time_cols = [COL_YEAR, COL_MONTH] if COL_MONTH in df.columns else [COL_YEAR]
+        self.by_year_month = _add_counts(self.by_year_month, _counts(df, time_cols))
+        self.by_borough = _add_counts(self.by_borough, _counts(df, [COL_BOROUGH]))
+        self.by_injury = _add_counts(self.by_injury, _counts(df, [COL_PERSON_INJURY]))
+        self.by_borough_hour = _add_counts(
+            self.by_borough_hour, _counts(df, [COL_BOROUGH, COL_HOUR])
+        )
+
+        if COL_IS_INJURED in df.columns and COL_IS_KILLED in df.columns:
+            self.injured_persons = (self.injured_persons or 0) + int(df[COL_IS_INJURED].sum())
+            self.killed_persons = (self.killed_persons or 0) + int(df[COL_IS_KILLED].sum())
+
+        if COL_COLLISION_ID in df.columns:
+            ids = pd.unique(df[COL_COLLISION_ID].dropna().to_numpy())
+            if self.collision_ids is None:
+                self.collision_ids = np.sort(ids)
+            else:
+                self.collision_ids = np.union1d(self.collision_ids, ids)
+
+        if COL_LAT in df.columns and COL_LON in df.columns:
+            lat = df[COL_LAT].to_numpy(dtype="float64", na_value=np.nan)
+            lon = df[COL_LON].to_numpy(dtype="float64", na_value=np.nan)
+            self.located_persons += int((~(np.isnan(lat) | np.isnan(lon))).sum())
+            self.density = _add_density(self.density, density_counts(lat, lon))
+
+        return self
+
+
+def aggregate_frame(df: pd.DataFrame) -> ReportAggregates:
+    """Aggregate an in-memory (usually already filtered) frame."""
+    return ReportAggregates().fold(df)
+
+
+def stream_aggregates(
+    path: Union[Path, str] = DEFAULT_DATA_PATH,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+) -> ReportAggregates:
+    """
+    Build the unfiltered report aggregates by streaming the CSV in chunks.
+
+    Memory stays bounded by one chunk plus the (small) aggregates, so this
+    works for files far larger than RAM.
+    """
+    agg = ReportAggregates()
+    for chunk in iter_chunks(path, chunksize=chunksize):
+        agg.fold(chunk)
+    return agg
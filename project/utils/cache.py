@@ -0,0 +1,187 @@
+import hashlib
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Union, Dict, Any, Hashable
+
+# Defaults sized for a handful of reports (~100-300 KB of figure JSON each)
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_DISK_MAX_BYTES = 512 * 1024 * 1024
+
+# The shared disk tier is scanned (one stat per file) only when this
+# worker's running estimate of it passes the limit, or this often, since
+# other workers write to it too; a scan trims it to this fraction
+DISK_TRIM_INTERVAL = 60.0
+DISK_TRIM_TARGET = 0.9
+
+# get()'s default for a miss, so a cached None is still a hit
+_MISSING = object()
+
+
+class ReportCache:
+    """
+    Bounded LRU cache of finished reports, keyed on normalized filter tuples.
+
+    Values are stored pickled, so eviction is by actual byte size and cached
+    reports cannot be mutated by callers. With `disk_dir`, entries are also
+    written there (one file per key) so gunicorn workers on the same host
+    share each other's results; that tier is trimmed oldest-access first.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        disk_dir: Optional[Union[Path, str]] = None,
+        disk_max_bytes: int = DEFAULT_DISK_MAX_BYTES,
+        namespace: str = "",
+    ):
+        self.max_bytes = max_bytes
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_max_bytes = disk_max_bytes
+        self.namespace = namespace
+        # Bytes on disk as of the last scan plus this worker's writes since
+        self._disk_size: Optional[int] = None
+        self._disk_scanned = 0.0
+
+        self._items: "OrderedDict[Hashable, bytes]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+
+    # ---------- public API ----------
+    def get(self, key: Hashable, default: Any = None) -> Optional[Any]:
+        """The cached value of `key`, or `default` on a miss."""
+        with self._lock:
+            blob = self._items.get(key)
+            if blob is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return pickle.loads(blob)
+
+        blob = self._disk_get(key)
+        if blob is None:
+            with self._lock:
+                self.misses += 1
+            return default
+
+        with self._lock:
+            self.disk_hits += 1
+            self._put(key, blob)
+        return pickle.loads(blob)
+
+    def set(self, key: Hashable, value: Any) -> None:
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._put(key, blob)
+        self._disk_set(key, blob)
+
+    def get_or_compute(self, key: Hashable, compute):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def reset(self, namespace: str) -> None:
+        """Drop the memory tier and read/write the disk tier under `namespace` from now on."""
+        with self._lock:
+            self._items.clear()
+            self._size = 0
+            self.namespace = namespace
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._items),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
+
+    # ---------- memory tier ----------
+    def _put(self, key: Hashable, blob: bytes) -> None:
+        if len(blob) > self.max_bytes:
+            return
+        old = self._items.pop(key, None)
+        if old is not None:
+            self._size -= len(old)
+        self._items[key] = blob
+        self._size += len(blob)
+        while self._size > self.max_bytes:
+            _, evicted = self._items.popitem(last=False)
+            self._size -= len(evicted)
+            self.evictions += 1
+
+    # ---------- disk tier ----------
+    def _disk_path(self, key: Hashable) -> Path:
+        digest = hashlib.sha1(repr((self.namespace, key)).encode()).hexdigest()
+        return self.disk_dir / f"{digest}.pkl"
+
+    def _disk_get(self, key: Hashable) -> Optional[bytes]:
+        if self.disk_dir is None:
+            return None
+        path = self._disk_path(key)
+        try:
+            blob = path.read_bytes()
+            os.utime(path)  # mark as recently used for trimming
+            return blob
+        except OSError:
+            return None
+
+    def _disk_set(self, key: Hashable, blob: bytes) -> None:
+        if self.disk_dir is None or len(blob) > self.disk_max_bytes:
+            return
+        path = self._disk_path(key)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            tmp.write_bytes(blob)
+            os.replace(tmp, path)
+        except OSError:
+            tmp.unlink(missing_ok=True)
+            return
+        with self._lock:
+            if self._disk_size is not None:
+                self._disk_size += len(blob)
+            due = (
+                self._disk_size is None
+                or self._disk_size > self.disk_max_bytes
+                or time.monotonic() - self._disk_scanned > DISK_TRIM_INTERVAL
+            )
+        if due:
+            self._disk_trim()
+
+    def _disk_trim(self) -> None:
+        """Delete least recently used files until the tier is under DISK_TRIM_TARGET of its limit."""
+        entries = []
+        for path in self.disk_dir.glob("*.pkl"):
+            try:
+                st = path.stat()
+            except OSError:  # removed by another worker
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        if total > self.disk_max_bytes:
+            for _, size, path in sorted(entries):
+                if total <= self.disk_max_bytes * DISK_TRIM_TARGET:
+                    break
+                path.unlink(missing_ok=True)
+                total -= size
+        with self._lock:
+            self._disk_size = total
+            self._disk_scanned = time.monotonic()
@@ -0,0 +1,253 @@
+import copy
+from typing import Optional, List, Dict, Hashable
+
+import numpy as np
+import pandas as pd
+
+from project.utils.aggregates import ReportAggregates
+from project.utils.index import FilterIndex, encode_column, extend_codes
+from project.utils.spatial import DensityGrid, DENSITY_CELL_DEGREES
+from project.utils.load_data import (
+    COL_BOROUGH,
+    COL_YEAR,
+    COL_MONTH,
+    COL_HOUR,
+    COL_LAT,
+    COL_LON,
+    COL_COLLISION_ID,
+    COL_PERSON_INJURY,
+    COL_PERSON_TYPE,
+    COL_VEHICLE_TYPE,
+    COL_FACTOR,
+    COL_IS_INJURED,
+    COL_IS_KILLED,
+    COL_FIRST_PERSON,
+)
+
+# Every dimension a dashboard dropdown (or the report) can slice by
+CUBE_DIMENSIONS = [
+    COL_YEAR,
+    COL_MONTH,
+    COL_HOUR,
+    COL_BOROUGH,
+    COL_PERSON_INJURY,
+    COL_PERSON_TYPE,
+    COL_VEHICLE_TYPE,
+    COL_FACTOR,
+]
+
+# Dimensions that differ between the persons of one crash: filtering on them
+# can drop a crash's first row, so its crashes are counted from collision ids
+PERSON_DIMENSIONS = [COL_PERSON_INJURY, COL_PERSON_TYPE]
+
+# Load-time flags summed per cell (see load_data)
+FLAG_COLUMNS = [COL_IS_INJURED, COL_IS_KILLED, COL_FIRST_PERSON]
+
+
+def _gather_ranges(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Positions covered by the ranges [start, start + length), concatenated."""
+    total = int(lengths.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    shift = np.repeat(starts - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+    return shift + np.arange(total)
+
+
+class CountCube:
+    """
+    Person counts materialized per non-empty cell of CUBE_DIMENSIONS.
+
+    query() answers any dropdown combination by masking cells and summing
+    their counts, so the charts cost O(cells) instead of O(rows). The KPI
+    flags are summed per cell too: injuries, deaths and, unless a person
+    dimension is filtered, crashes (first persons). Otherwise distinct
+    crashes come from exact per-cell collision-id sets (CSR layout). The
+    map density is binned from the rows the FilterIndex selects.
+    """
+
+    def __init__(self, df: pd.DataFrame, index: Optional[FilterIndex] = None):
+        self.dims = [c for c in CUBE_DIMENSIONS if c in df.columns]
+        self.labels: Dict[str, pd.Index] = {}
+        self.codes_by_key: Dict[str, Dict[Hashable, List[int]]] = {}
+
+        # Mixed-radix cell key; code -1 (missing) is shifted to digit 0
+        key = np.zeros(len(df), dtype=np.int64)
+        radices = []
+        for col in self.dims:
+            codes, labels, by_key = encode_column(col, df[col])
+            self.labels[col] = labels
+            self.codes_by_key[col] = by_key
+            radices.append(len(labels) + 1)
+            key = key * radices[-1] + (codes.astype(np.int64) + 1)
+        if np.prod(np.array(radices, dtype=float)) >= 2**63:
+            raise ValueError("Cube dimensions are too wide for a 64-bit cell key")
+
+        cell_keys, cell_of_row, self.cell_counts = np.unique(
+            key, return_inverse=True, return_counts=True
+        )
+        self.n_cells = len(cell_keys)
+        self.cell_flags: Dict[str, np.ndarray] = {
+            col: np.bincount(cell_of_row, weights=df[col].to_numpy(dtype=np.float64), minlength=self.n_cells)
+            .astype(np.int64)
+            for col in FLAG_COLUMNS
+            if col in df.columns
+        }
+
+        # Decode each cell's per-dimension code (back to -1 = missing)
+        self.cell_codes: Dict[str, np.ndarray] = {}
+        for col, radix in zip(reversed(self.dims), reversed(radices)):
+            self.cell_codes[col] = (cell_keys % radix - 1).astype(
+                np.int16 if radix <= 2**15 else np.int32
+            )
+            cell_keys = cell_keys // radix
+
+        # Exact distinct collision ids per cell: ids[offsets[c]:offsets[c + 1]]
+        self.collision_ids = None
+        if COL_COLLISION_ID in df.columns:
+            ids = df[COL_COLLISION_ID].to_numpy(dtype="float64", na_value=np.nan)
+            ok = ~np.isnan(ids)
+            pairs = pd.DataFrame({"cell": cell_of_row[ok], "id": ids[ok].astype(np.int64)})
+            pairs = pairs.drop_duplicates().sort_values(["cell", "id"])
+            self.collision_ids = pairs["id"].to_numpy()
+            per_cell = np.bincount(pairs["cell"].to_numpy(), minlength=self.n_cells)
+            self.collision_offsets = np.concatenate([[0], np.cumsum(per_cell)])
+
+        # Row-level data only needed for the map density
+        self.index = index if index is not None else FilterIndex(df)
+        self.grid = None
+        if COL_LAT in df.columns and COL_LON in df.columns:
+            self.grid = DensityGrid(
+                df[COL_LAT].to_numpy(dtype="float64", na_value=np.nan),
+                df[COL_LON].to_numpy(dtype="float64", na_value=np.nan),
+            )
+
+    def extend(self, rows: pd.DataFrame, index: Optional[FilterIndex] = None) -> "CountCube":
+        """
+        A copy with `rows` added. Their cells are merged into the existing
+        ones (which keep their numbers), so only the new rows are encoded;
+        `index` is the FilterIndex already extended with `rows`.
+        """
+        new = copy.copy(self)
+        new.labels, new.codes_by_key = dict(self.labels), dict(self.codes_by_key)
+        row_codes = {}
+        for col in self.dims:
+            values = rows[col] if col in rows.columns else pd.Series([None] * len(rows))
+            row_codes[col], new.codes_by_key[col], added = extend_codes(
+                col, values, self.codes_by_key[col], len(self.labels[col])
+            )
+            if added:
+                new.labels[col] = self.labels[col].append(pd.Index(added))
+
+        # Old cells first: with sort=False they keep numbers 0..n_cells-1
+        codes = pd.DataFrame({
+            col: np.concatenate([self.cell_codes[col].astype(np.int64), row_codes[col]])
+            for col in self.dims
+        })
+        cell = codes.groupby(self.dims, sort=False).ngroup().to_numpy()
+        new.n_cells = int(cell.max()) + 1 if len(cell) else 0
+        new.cell_counts = np.bincount(
+            cell, weights=np.concatenate([self.cell_counts, np.ones(len(rows))]), minlength=new.n_cells
+        ).astype(np.int64)
+        new.cell_codes = {}
+        for col in self.dims:
+            radix = len(new.labels[col]) + 1
+            col_codes = np.empty(new.n_cells, dtype=np.int16 if radix <= 2**15 else np.int32)
+            col_codes[cell] = codes[col].to_numpy()
+            new.cell_codes[col] = col_codes
+        cell_of_row = cell[self.n_cells:]
+        new.cell_flags = {}
+        for col, sums in self.cell_flags.items():
+            flags = rows[col].to_numpy(dtype=np.float64) if col in rows.columns else np.zeros(len(rows))
+            new.cell_flags[col] = np.bincount(
+                cell, weights=np.concatenate([sums, flags]), minlength=new.n_cells
+            ).astype(np.int64)
+
+        if self.collision_ids is not None and COL_COLLISION_ID in rows.columns:
+            ids = rows[COL_COLLISION_ID].to_numpy(dtype="float64", na_value=np.nan)
+            ok = ~np.isnan(ids)
+            old_cells = np.repeat(np.arange(self.n_cells), np.diff(self.collision_offsets))
+            pair_cell = np.concatenate([old_cells, cell_of_row[ok]])
+            pair_id = np.concatenate([self.collision_ids, ids[ok].astype(np.int64)])
+            order = np.lexsort((pair_id, pair_cell))
+            pair_cell, pair_id = pair_cell[order], pair_id[order]
+            first = np.r_[True, (pair_cell[1:] != pair_cell[:-1]) | (pair_id[1:] != pair_id[:-1])]
+            new.collision_ids = pair_id[first]
+            per_cell = np.bincount(pair_cell[first], minlength=new.n_cells)
+            new.collision_offsets = np.concatenate([[0], np.cumsum(per_cell)])
+
+        new.index = index if index is not None else self.index.extend(rows)
+        if self.grid is not None:
+            new.grid = self.grid.extend(
+                rows[COL_LAT].to_numpy(dtype="float64", na_value=np.nan),
+                rows[COL_LON].to_numpy(dtype="float64", na_value=np.nan),
+            )
+        return new
+
+    # ---------- selection ----------
+    def select_cells(self, wanted: Dict[str, List[Hashable]]) -> np.ndarray:
+        """Positions of the cells matching {column: [index keys]}."""
+        sel = None
+        for col, keys in wanted.items():
+            if col not in self.cell_codes or not keys:
+                continue
+            # Lookup table over codes; the extra last slot (code -1) stays False
+            allowed = np.zeros(len(self.labels[col]) + 1, dtype=bool)
+            allowed[[c for k in keys for c in self.codes_by_key[col].get(k, [])]] = True
+            hit = allowed[self.cell_codes[col]]
+            sel = hit if sel is None else sel & hit
+        if sel is None:
+            return np.arange(self.n_cells)
+        return np.flatnonzero(sel)
+
+    def _group(self, cells: np.ndarray, counts: np.ndarray, cols: List[str]) -> Optional[pd.Series]:
+        """Counts per label combination of `cols` (missing labels dropped)."""
+        if not all(c in self.cell_codes for c in cols):
+            return None
+        codes = [self.cell_codes[c][cells] for c in cols]
+        sizes = [len(self.labels[c]) for c in cols]
+        if 0 in sizes:
+            return pd.Series([], dtype=np.int64)
+        keep = np.logical_and.reduce([c >= 0 for c in codes])
+        flat = np.ravel_multi_index([c[keep] for c in codes], sizes)
+        sums = np.bincount(flat, weights=counts[keep], minlength=int(np.prod(sizes)))
+        nonzero = np.flatnonzero(sums)
+        parts = np.unravel_index(nonzero, sizes)
+
+        levels = [self.labels[c][p] for c, p in zip(cols, parts)]
+        if len(cols) == 1:
+            idx = levels[0].rename(cols[0])
+        else:
+            idx = pd.MultiIndex.from_arrays(levels, names=cols)
+        return pd.Series(sums[nonzero].astype(np.int64), index=idx).sort_index()
+
+    # ---------- queries ----------
+    def query(self, wanted: Dict[str, List[Hashable]]) -> ReportAggregates:
+        """Report aggregates for normalized filters (see normalize_filters)."""
+        cells = self.select_cells(wanted)
+        counts = self.cell_counts[cells]
+
+        time_cols = [COL_YEAR, COL_MONTH] if COL_MONTH in self.dims else [COL_YEAR]
+        agg = ReportAggregates(
+            total_persons=int(counts.sum()),
+            by_year_month=self._group(cells, counts, time_cols),
+            by_borough=self._group(cells, counts, [COL_BOROUGH]),
+            by_injury=self._group(cells, counts, [COL_PERSON_INJURY]),
+            by_borough_hour=self._group(cells, counts, [COL_BOROUGH, COL_HOUR]),
+        )
+
+        flags = {col: int(sums[cells].sum()) for col, sums in self.cell_flags.items()}
+        if COL_IS_INJURED in flags and COL_IS_KILLED in flags:
+            agg.injured_persons, agg.killed_persons = flags[COL_IS_INJURED], flags[COL_IS_KILLED]
+
+        if COL_FIRST_PERSON in flags and not any(wanted.get(c) for c in PERSON_DIMENSIONS):
+            agg.crash_count = flags[COL_FIRST_PERSON]
+        elif self.collision_ids is not None:
+            starts = self.collision_offsets[cells]
+            lengths = self.collision_offsets[cells + 1] - starts
+            agg.collision_ids = np.unique(self.collision_ids[_gather_ranges(starts, lengths)])
+
+        if self.grid is not None:
+            agg.density = self.grid.counts(self.index.select(wanted))
+            agg.located_persons = int(agg.density[DENSITY_CELL_DEGREES[0]].sum())
+
+        return agg
@@ -1,3 +1,6 @@
+import re
+
+import numpy as np
 import pandas as pd
 from typing import Optional, List, Union, Dict, Any
 
@@ -10,7 +13,12 @@ from project.utils.load_data import (
     COL_PERSON_TYPE,
     COL_VEHICLE_TYPE,
     COL_FACTOR,
+    COL_LAT,
+    COL_LON,
+    PartitionedDataset,
 )
+from project.utils.index import FilterIndex, index_key, text_terms, INT_COLUMNS, TEXT_COLUMNS
+from project.utils.spatial import GridIndex, spatial_mask
 
 
 # ===========================
@@ -110,8 +118,111 @@ def _to_list(x):
     return [x] if s != "" else []
 
 
+def _int_list(values) -> List[int]:
+    """Keep the values that convert to int (others are ignored, as before)."""
+    out = []
+    for v in values:
+        try:
+            out.append(int(v))
+        except Exception:
+            pass
+    return out
+
+
+def _label_list(col: str, values) -> list:
+    return [index_key(col, v) for v in _to_list(values)]
+
+
+_FILTER_ARGS = (
+    "borough", "year", "vehicle_type", "factor", "injury", "person_type", "months", "hours",
+)
+
+
+def _code_lookup(values: pd.Series, hit: np.ndarray) -> np.ndarray:
+    """Row mask from a per-category boolean table (missing values never match)."""
+    table = np.append(np.asarray(hit, dtype=bool), False)
+    return table[values.cat.codes.to_numpy()]
+
+
+def _column_mask(values: pd.Series, col: str, keys: list) -> np.ndarray:
+    """Rows of `values` whose index_key is one of `keys`."""
+    keyset = set(keys)
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        # Compare the (small) category dictionary, then integer codes per row
+        hit = [index_key(col, c) in keyset for c in values.cat.categories]
+        return _code_lookup(values, hit)
+    if col in INT_COLUMNS:
+        return values.isin(keys).to_numpy()
+    return values.astype(str).str.strip().str.upper().isin(keys).to_numpy()
+
+
+def _text_mask(values: pd.Series, term: str) -> np.ndarray:
+    """Rows of `values` with a word starting with `term` (as FilterIndex.match_text)."""
+    pattern = r"(?<![a-z0-9])" + re.escape(term)
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        cats = values.cat.categories.astype(str).str.lower()
+        return _code_lookup(values, cats.str.contains(pattern))
+    return values.astype(str).str.lower().str.contains(pattern, na=False).to_numpy()
+
+
+def _shape_mask(df: pd.DataFrame, shapes: Dict[str, Any]) -> np.ndarray:
+    # The GridIndex's float32 coordinates, so both paths test the same values
+    lat = df[COL_LAT].to_numpy(dtype="float32", na_value=np.nan)
+    lon = df[COL_LON].to_numpy(dtype="float32", na_value=np.nan)
+    return spatial_mask(lat, lon, **shapes)
+
+
+def normalize_filters(
+    borough=None,
+    year=None,
+    vehicle_type=None,
+    factor=None,
+    injury=None,
+    person_type=None,
+    months=None,
+    hours=None,
+) -> Dict[str, list]:
+    """Normalize dropdown values into {column: [index keys]} (empty = no filter)."""
+    return {
+        COL_BOROUGH: _label_list(COL_BOROUGH, borough),
+        COL_YEAR: _int_list(_to_list(year)),
+        COL_MONTH: _int_list(_to_list(months)),
+        COL_HOUR: _int_list(_to_list(hours)),
+        COL_PERSON_INJURY: _label_list(COL_PERSON_INJURY, injury),
+        COL_PERSON_TYPE: _label_list(COL_PERSON_TYPE, person_type),
+        COL_VEHICLE_TYPE: _label_list(COL_VEHICLE_TYPE, vehicle_type),
+        COL_FACTOR: _label_list(COL_FACTOR, factor),
+    }
+
+
+def filter_key(
+    search_text: Optional[str] = None, bbox=None, radius=None, polygon=None, **filters
+) -> tuple:
+    """
+    Hashable, order-insensitive key for a filter combination.
+
+    Equivalent selections ("queens" vs ["QUEENS"], 2022 vs "2022") map to
+    the same key; the unfiltered view is the empty tuple. Shape coordinates
+    are rounded to ~1 m.
+    """
+    wanted = normalize_filters(**{k: v for k, v in filters.items() if k in _FILTER_ARGS})
+    key = tuple(
+        (col, tuple(sorted(set(keys), key=str)))
+        for col, keys in wanted.items()
+        if keys
+    )
+    # Words must all match, in any order
+    terms = tuple(sorted(set(text_terms(search_text))))
+    if terms:
+        key += (("search_text", terms),)
+    for name, shape in (("bbox", bbox), ("radius", radius), ("polygon", polygon)):
+        if shape is not None:
+            key += ((name, tuple(np.round(np.asarray(shape, dtype=float), 5).ravel())),)
+    return key
+
+
 def apply_filters(
-    df: pd.DataFrame,
+    df: Union[pd.DataFrame, PartitionedDataset],
     borough=None,
     year=None,
     vehicle_type=None,
@@ -121,91 +232,86 @@ def apply_filters(
     months=None,
     hours=None,
     search_text: Optional[str] = None,
+    index: Optional[FilterIndex] = None,
+    bbox=None,
+    radius=None,
+    polygon=None,
+    spatial_index: Optional[GridIndex] = None,
     **kwargs,
 ) -> pd.DataFrame:
     """
-    Filters dataframe using SINGLE values from Dash dropdowns (your current UI),
-    but also tolerates lists if you later switch dropdowns to multi-select.
+    Filters dataframe using the (multi-select) Dash dropdown values; each
+    filter takes a single value or a list. Values OR within a filter and
+    filters AND together.
 
     Supported filters:
       borough, year, vehicle_type, factor, injury, person_type, months, hours, search_text
+      bbox=(min_lat, min_lon, max_lat, max_lon), radius=(lat, lon, meters),
+      polygon=[(lat, lon), ...]
+
+    With a FilterIndex built for `df`, the dropdown filters are answered by
+    set intersections and a single gather instead of scanning each column.
+    Without one, categorical columns (as load_data returns them) are matched
+    on their category dictionaries and compared per row as integer codes.
+    Likewise a GridIndex (`spatial_index`) turns the shapes into candidate
+    row lookups instead of testing every coordinate.
+    `search_text` keeps rows where every word prefixes a word of one of
+    TEXT_COLUMNS ("box truck" matches "Box Truck" and "Pick-up Truck" on a
+    Box Truck crash); the index answers it from its word index.
+    The result may be `df` itself when nothing is filtered; treat it as
+    read-only.
+
+    `df` may also be a PartitionedDataset (load_data(lazy=True)): only the
+    partitions matching the year/borough filters are read, and the other
+    filters scan that slice, so "Queens 2023" costs what that slice costs.
     """
-    filtered = df.copy()
-
-    # Borough
-    b_list = _to_list(borough)
-    if b_list and COL_BOROUGH in filtered.columns:
-        b_up = [str(b).strip().upper() for b in b_list]
-        filtered = filtered[filtered[COL_BOROUGH].astype(str).str.upper().isin(b_up)]
-
-    # Year
-    y_list = _to_list(year)
-    if y_list and COL_YEAR in filtered.columns:
-        y_int = []
-        for y in y_list:
-            try:
-                y_int.append(int(y))
-            except Exception:
-                pass
-        if y_int:
-            filtered = filtered[filtered[COL_YEAR].isin(y_int)]
-
-    # Months
-    m_list = _to_list(months)
-    if m_list and COL_MONTH in filtered.columns:
-        m_int = []
-        for m in m_list:
-            try:
-                m_int.append(int(m))
-            except Exception:
-                pass
-        if m_int:
-            filtered = filtered[filtered[COL_MONTH].isin(m_int)]
-
-    # Hours
-    h_list = _to_list(hours)
-    if h_list and COL_HOUR in filtered.columns:
-        h_int = []
-        for h in h_list:
-            try:
-                h_int.append(int(h))
-            except Exception:
-                pass
-        if h_int:
-            filtered = filtered[filtered[COL_HOUR].isin(h_int)]
-
-    # Injury
-    inj_list = _to_list(injury)
-    if inj_list and COL_PERSON_INJURY in filtered.columns:
-        filtered = filtered[filtered[COL_PERSON_INJURY].isin(inj_list)]
-
-    # Person type
-    p_list = _to_list(person_type)
-    if p_list and COL_PERSON_TYPE in filtered.columns:
-        filtered = filtered[filtered[COL_PERSON_TYPE].isin(p_list)]
-
-    # Vehicle type
-    v_list = _to_list(vehicle_type)
-    if v_list and COL_VEHICLE_TYPE in filtered.columns:
-        filtered = filtered[filtered[COL_VEHICLE_TYPE].isin(v_list)]
-
-    # Contributing factor
-    f_list = _to_list(factor)
-    if f_list and COL_FACTOR in filtered.columns:
-        filtered = filtered[filtered[COL_FACTOR].isin(f_list)]
-
-    # Free-text search (OR across columns, not AND)
-    if search_text:
-        text = search_text.strip().lower()
-        if text:
-            masks = []
-            for col in [COL_FACTOR, COL_VEHICLE_TYPE, COL_BOROUGH, COL_PERSON_TYPE, COL_PERSON_INJURY]:
-                if col in filtered.columns:
-                    masks.append(filtered[col].astype(str).str.lower().str.contains(text, na=False))
-            if masks:
-                mask = masks[0]
-                for m in masks[1:]:
-                    mask = mask | m
-                filtered = filtered[mask]
+    wanted = normalize_filters(
+        borough=borough,
+        year=year,
+        vehicle_type=vehicle_type,
+        factor=factor,
+        injury=injury,
+        person_type=person_type,
+        months=months,
+        hours=hours,
+    )
+    wanted = {col: keys for col, keys in wanted.items() if keys and col in df.columns}
+
+    if isinstance(df, PartitionedDataset):
+        # Partition keys hold for every row read, so those filters are done
+        pruned = {col: wanted.pop(col) for col in df.by if col in wanted}
+        df = df.read(pruned)
+        index = spatial_index = None
+
+    shapes = {"bbox": bbox, "radius": radius, "polygon": polygon}
+    has_shape = any(v is not None for v in shapes.values()) and COL_LAT in df.columns
+
+    terms = text_terms(search_text)
+
+    if index is not None and index.covers(df):
+        rows = index.select(wanted, text=search_text)
+        if has_shape:
+            if spatial_index is not None and spatial_index.covers(df):
+                hit = spatial_index.select(**shapes)
+            else:
+                hit = np.flatnonzero(_shape_mask(df, shapes))
+            rows = hit if rows is None else np.intersect1d(rows, hit, assume_unique=True)
+        filtered = df if rows is None else df.take(rows)
+    else:
+        mask = None
+        for col, keys in wanted.items():
+            m = _column_mask(df[col], col, keys)
+            mask = m if mask is None else mask & m
+        if has_shape:
+            m = _shape_mask(df, shapes)
+            mask = m if mask is None else mask & m
+        # Free text: every word (AND), in any text column (OR)
+        text_cols = [col for col in TEXT_COLUMNS if col in df.columns]
+        for term in terms if text_cols else []:
+            m = np.zeros(len(df), dtype=bool)
+            for col in text_cols:
+                m |= _text_mask(df[col], term)
+            mask = m if mask is None else mask & m
+        filtered = df if mask is None else df[mask]
 
     return filtered
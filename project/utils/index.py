@@ -0,0 +1,329 @@
+import copy
+import re
+from bisect import bisect_left
+from typing import Optional, List, Dict, Any, Hashable
+
+import numpy as np
+import pandas as pd
+
+from project.utils.load_data import (
+    COL_BOROUGH,
+    COL_YEAR,
+    COL_MONTH,
+    COL_HOUR,
+    COL_PERSON_INJURY,
+    COL_PERSON_TYPE,
+    COL_VEHICLE_TYPE,
+    COL_FACTOR,
+    COL_STREET,
+)
+
+# Columns apply_filters can answer from the index
+INDEXED_COLUMNS = [
+    COL_BOROUGH,
+    COL_YEAR,
+    COL_MONTH,
+    COL_HOUR,
+    COL_PERSON_INJURY,
+    COL_PERSON_TYPE,
+    COL_VEHICLE_TYPE,
+    COL_FACTOR,
+]
+
+# Columns the free-text search matches words in (OR across columns)
+TEXT_COLUMNS = [
+    COL_FACTOR,
+    COL_VEHICLE_TYPE,
+    COL_BOROUGH,
+    COL_PERSON_TYPE,
+    COL_PERSON_INJURY,
+    COL_STREET,
+]
+
+# Columns with at most this many values get one packed bitmap per value
+# (N/8 bytes each); wider ones get sorted row-id arrays (4N bytes in total).
+BITMAP_MAX_VALUES = 32
+
+INT_COLUMNS = {COL_YEAR, COL_MONTH, COL_HOUR}
+
+
+def index_key(col: str, value: Any) -> Hashable:
+    """
+    Canonical lookup key for a value of `col`, matching apply_filters:
+    year/month/hour compare as ints, labels stripped and upper-cased (the
+    form load_data stores them in).
+    """
+    if col in INT_COLUMNS:
+        return int(value)
+    return str(value).strip().upper()
+
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def text_terms(text: Optional[str]) -> List[str]:
+    """Lower-case words of a free-text query or label ("Pick-up Truck" -> pick, up, truck)."""
+    return _WORD_RE.findall(str(text or "").lower())
+
+
+def encode_column(col: str, values: pd.Series):
+    """
+    Integer codes (-1 = missing), sorted labels, and {index_key: [codes]}.
+
+    Several labels may share a key (e.g. "Queens" / "QUEENS").
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes = values.cat.codes.to_numpy()
+        labels = values.cat.categories
+    else:
+        codes, labels = pd.factorize(values, sort=True)
+
+    codes_by_key: Dict[Hashable, List[int]] = {}
+    for code, label in enumerate(labels):
+        codes_by_key.setdefault(index_key(col, label), []).append(code)
+    return codes, labels, codes_by_key
+
+
+def extend_codes(col: str, values: pd.Series, codes_by_key: Dict[Hashable, List[int]], n_codes: int):
+    """
+    Codes of `values` under an existing encoding: known keys reuse their
+    code, new keys get codes n_codes, n_codes + 1, ... Returns the codes,
+    the grown {key: codes} (a copy) and the new labels in code order.
+    """
+    codes, labels, _ = encode_column(col, values)
+    codes_by_key = {k: list(v) for k, v in codes_by_key.items()}
+    added = []
+    remap = np.empty(len(labels), dtype=np.int64)
+    for code, label in enumerate(labels):
+        key = index_key(col, label)
+        if key not in codes_by_key:
+            codes_by_key[key] = [n_codes + len(added)]
+            added.append(label)
+        remap[code] = codes_by_key[key][0]
+    codes = np.where(codes >= 0, remap[np.maximum(codes, 0)], -1)
+    return codes, codes_by_key, added
+
+
+# ===========================
+# Per-column index
+# ===========================
+class ColumnIndex:
+    """Row positions for every distinct value of one column."""
+
+    def __init__(self, col: str, values: pd.Series):
+        self.n_rows = len(values)
+
+        codes, labels, self.codes_by_key = encode_column(col, values)
+
+        self.is_bitmap = len(labels) <= BITMAP_MAX_VALUES
+        if self.is_bitmap:
+            self.bitmaps = [np.packbits(codes == code) for code in range(len(labels))]
+        else:
+            # CSR layout: rows of code c are order[offsets[c]:offsets[c + 1]]
+            order = np.argsort(codes, kind="stable").astype(_row_dtype(self.n_rows))
+            counts = np.bincount(codes[codes >= 0], minlength=len(labels))
+            n_missing = self.n_rows - counts.sum()
+            self.order = order
+            self.offsets = np.concatenate([[0], np.cumsum(counts)]) + n_missing
+
+    @property
+    def n_codes(self) -> int:
+        return len(self.bitmaps) if self.is_bitmap else len(self.offsets) - 1
+
+    def extend(self, col: str, values: pd.Series) -> "ColumnIndex":
+        """
+        A copy with `values` appended as rows n_rows onwards. New labels
+        get new codes; existing rows are not re-encoded.
+        """
+        codes, codes_by_key, added = extend_codes(col, values, self.codes_by_key, self.n_codes)
+        n_codes = self.n_codes + len(added)
+
+        new = copy.copy(self)
+        new.codes_by_key = codes_by_key
+        new.n_rows = self.n_rows + len(codes)
+        if self.is_bitmap:
+            old = [np.unpackbits(b, count=self.n_rows) for b in self.bitmaps]
+            old += [np.zeros(self.n_rows, dtype=np.uint8)] * (n_codes - self.n_codes)
+            new.bitmaps = [np.packbits(np.concatenate([o, codes == c])) for c, o in enumerate(old)]
+        else:
+            # Insert each new row at the end of its code's run (new codes
+            # at the very end, missing values after the missing block)
+            ends = np.concatenate([self.offsets, np.full(n_codes - self.n_codes, self.offsets[-1])])
+            by_code = np.argsort(codes, kind="stable")
+            where = np.where(codes[by_code] >= 0, ends[codes[by_code] + 1], self.offsets[0])
+            rows = (self.n_rows + by_code).astype(_row_dtype(new.n_rows))
+            new.order = np.insert(self.order.astype(rows.dtype), where, rows)
+            counts = np.bincount(codes[codes >= 0], minlength=n_codes)
+            n_missing = int((codes < 0).sum())
+            new.offsets = ends + n_missing + np.concatenate([[0], np.cumsum(counts)])
+        return new
+
+    def select(self, keys: List[Hashable]):
+        """Bitmap (OR of values) or sorted row ids for rows matching any key."""
+        return self.select_codes([c for k in keys for c in self.codes_by_key.get(k, [])])
+
+    def select_codes(self, codes: List[int]):
+        """Like select(), for category codes."""
+        if self.is_bitmap:
+            bits = np.zeros((self.n_rows + 7) // 8, dtype=np.uint8)
+            for code in codes:
+                bits |= self.bitmaps[code]
+            return bits
+
+        parts = [self.order[self.offsets[c]:self.offsets[c + 1]] for c in codes]
+        if not parts:
+            return np.empty(0, dtype=self.order.dtype)
+        if len(parts) == 1:
+            return parts[0]
+        # Each part is already sorted: the stable sort (timsort) merges runs
+        return np.sort(np.concatenate(parts), kind="stable")
+
+
+def _row_dtype(n_rows: int):
+    return np.int32 if n_rows < 2**31 else np.int64
+
+
+# ===========================
+# Word index for free text
+# ===========================
+class TokenIndex:
+    """
+    Sorted words of every label in the text columns, each with the
+    (column, codes) it occurs in.
+
+    A query word matches every indexed word it prefixes, which is one
+    bisect range over the sorted words, so lookups never touch rows; the
+    rows come from the column's ColumnIndex.
+    """
+
+    def __init__(self, columns: Dict[str, ColumnIndex]):
+        postings: Dict[str, Dict[str, List[int]]] = {}
+        for col, column in columns.items():
+            for key, codes in column.codes_by_key.items():
+                for word in set(text_terms(key)):
+                    postings.setdefault(word, {}).setdefault(col, []).extend(codes)
+        self.words = sorted(postings)
+        self.postings = [postings[w] for w in self.words]
+
+    def lookup(self, prefix: str) -> Dict[str, List[int]]:
+        """{column: codes} of the labels with a word starting with `prefix`."""
+        lo = bisect_left(self.words, prefix)
+        hi = bisect_left(self.words, prefix + "\uffff", lo)
+        found: Dict[str, set] = {}
+        for posting in self.postings[lo:hi]:
+            for col, codes in posting.items():
+                found.setdefault(col, set()).update(codes)
+        return {col: sorted(codes) for col, codes in found.items()}
+
+
+# ===========================
+# Whole-frame index
+# ===========================
+class FilterIndex:
+    """
+    Inverted index over the filter columns, built once at load time.
+
+    select() turns {column: [keys]} into sorted row positions by OR-ing
+    values within a column and intersecting across columns, so filtering
+    becomes one gather (df.take) instead of a scan per filter. Free text is
+    answered the same way through a TokenIndex over TEXT_COLUMNS.
+    """
+
+    def __init__(self, df: pd.DataFrame, columns: Optional[List[str]] = None):
+        self.n_rows = len(df)
+        columns = columns or INDEXED_COLUMNS + [c for c in TEXT_COLUMNS if c not in INDEXED_COLUMNS]
+        self.columns: Dict[str, ColumnIndex] = {
+            col: ColumnIndex(col, df[col])
+            for col in columns
+            if col in df.columns
+        }
+        text_columns = {c: self.columns[c] for c in TEXT_COLUMNS if c in self.columns}
+        self.tokens = TokenIndex(text_columns) if text_columns else None
+
+    def covers(self, df: pd.DataFrame) -> bool:
+        """Whether this index was built for a frame of df's length."""
+        return len(df) == self.n_rows
+
+    def extend(self, rows: pd.DataFrame) -> "FilterIndex":
+        """A copy indexing `rows` appended after the current ones (this index is unchanged)."""
+        new = copy.copy(self)
+        new.n_rows = self.n_rows + len(rows)
+        new.columns = {
+            col: column.extend(col, rows[col] if col in rows.columns else pd.Series([None] * len(rows)))
+            for col, column in self.columns.items()
+        }
+        text_columns = {c: new.columns[c] for c in TEXT_COLUMNS if c in new.columns}
+        new.tokens = TokenIndex(text_columns) if text_columns else None
+        return new
+
+    def known_terms(self, text: Optional[str]) -> List[str]:
+        """The words of `text` that prefix at least one indexed word."""
+        if self.tokens is None:
+            return []
+        return [t for t in text_terms(text) if self.tokens.lookup(t)]
+
+    def match_text(self, text: Optional[str]) -> Optional[np.ndarray]:
+        """
+        Bitmap of rows where every word of `text` prefixes a word in one of
+        TEXT_COLUMNS, or None for text without words (or no text columns).
+        """
+        if self.tokens is None:
+            return None
+        bitmap = None
+        for term in text_terms(text):
+            bits = np.zeros((self.n_rows + 7) // 8, dtype=np.uint8)
+            for col, codes in self.tokens.lookup(term).items():
+                column = self.columns[col]
+                sel = column.select_codes(codes)
+                bits |= sel if column.is_bitmap else _to_bitmap(sel, self.n_rows)
+            bitmap = bits if bitmap is None else bitmap & bits
+        return bitmap
+
+    def select(
+        self, wanted: Dict[str, List[Hashable]], text: Optional[str] = None
+    ) -> Optional[np.ndarray]:
+        """Sorted row positions matching all filters (and `text`), or None if none apply."""
+        bitmap = self.match_text(text)
+        id_sets = []
+        for col, keys in wanted.items():
+            if col not in self.columns or not keys:
+                continue
+            sel = self.columns[col].select(keys)
+            if self.columns[col].is_bitmap:
+                bitmap = sel if bitmap is None else bitmap & sel
+            else:
+                id_sets.append(sel)
+
+        if bitmap is None and not id_sets:
+            return None
+
+        if not id_sets:
+            return np.flatnonzero(np.unpackbits(bitmap, count=self.n_rows))
+
+        # Intersect sorted id arrays starting from the smallest one
+        id_sets.sort(key=len)
+        rows = id_sets[0]
+        for other in id_sets[1:]:
+            if len(rows) == 0:
+                break
+            pos = np.searchsorted(other, rows)
+            pos[pos == len(other)] = 0
+            rows = rows[other[pos] == rows] if len(other) else rows[:0]
+
+        if bitmap is not None and len(rows):
+            rows = rows[_test_bits(bitmap, rows)]
+
+        return rows
+
+
+def _to_bitmap(rows: np.ndarray, n_rows: int) -> np.ndarray:
+    """Packed (big-endian) bitmap with `rows` set."""
+    mask = np.zeros(n_rows, dtype=bool)
+    mask[rows] = True
+    return np.packbits(mask)
+
+
+def _test_bits(bitmap: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """Boolean mask of which `rows` are set in a packbits (big-endian) bitmap."""
+    shifts = (7 - (rows & 7)).astype(np.uint8)
+    return ((bitmap[rows >> 3] >> shifts) & 1).astype(bool)
@@ -1,6 +1,18 @@
+import contextlib
+import hashlib
+import io
+import json
+import os
+import shutil
+import sys
 from pathlib import Path
-from typing import Union
+from typing import Optional, List, Union, Dict, Any, Iterator, Tuple, Callable
+from urllib.parse import quote
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+from pyarrow import feather
+from pandas.api.types import union_categoricals
 import gdown
 
 # ===========================
@@ -17,6 +29,16 @@ COL_PERSON_INJURY = "PERSON_INJURY"
 COL_PERSON_TYPE = "PERSON_TYPE"
 COL_VEHICLE_TYPE = "VEHICLE_TYPE_CODE_1"
 COL_FACTOR = "CONTRIBUTING_FACTOR_VEHICLE_1"
+COL_STREET = "ON_STREET_NAME"
+
+# Flags derived once at load time, so KPIs are sums instead of string matches
+COL_IS_INJURED = "IS_INJURED"
+COL_IS_KILLED = "IS_KILLED"
+COL_FIRST_PERSON = "IS_FIRST_PERSON"  # first row of its collision: sums count crashes
+
+# PERSON_INJURY labels (lower-cased) that count as injured / killed
+INJURED_PATTERN = "injur"
+KILLED_PATTERN = "fatal|kill"
 
 # ===========================
 # Paths
@@ -27,6 +49,12 @@ DEFAULT_DATA_PATH = (
 
 GDRIVE_ID = "1vJ5IJDLgR2x7_TYkeAWb05EW90jknOcl"
 
+# Bump whenever the renames/typing in _prepare change, so stale caches are rebuilt
+CACHE_SCHEMA_VERSION = 5
+
+# Bytes hashed from the head and tail of the CSV for the cache fingerprint
+_FINGERPRINT_BYTES = 1 << 20
+
 # ===========================
 # Column renames
 # ===========================
@@ -45,8 +73,78 @@ RENAMES = {
     "CRASH YEAR": COL_YEAR,
     "CRASH MONTH": COL_MONTH,
     "CRASH HOUR": COL_HOUR,
+    "ON STREET NAME": COL_STREET,
+}
+
+# ===========================
+# Lean loading: only the columns the app uses, narrow dtypes up front
+# ===========================
+LEAN_COLUMNS = [
+    COL_BOROUGH,
+    COL_YEAR,
+    COL_MONTH,
+    COL_HOUR,
+    COL_LAT,
+    COL_LON,
+    COL_COLLISION_ID,
+    COL_PERSON_INJURY,
+    COL_PERSON_TYPE,
+    COL_VEHICLE_TYPE,
+    COL_FACTOR,
+    COL_STREET,
+    COL_IS_INJURED,
+    COL_IS_KILLED,
+    COL_FIRST_PERSON,
+]
+
+CATEGORY_COLUMNS = [
+    COL_BOROUGH,
+    COL_PERSON_INJURY,
+    COL_PERSON_TYPE,
+    COL_VEHICLE_TYPE,
+    COL_FACTOR,
+    COL_STREET,
+]
+
+# Target dtypes after cleaning (nullable variants are used when values are missing)
+INT_DTYPES = {
+    COL_YEAR: "int16",
+    COL_MONTH: "int8",
+    COL_HOUR: "int8",
+}
+
+# Dtypes passed to read_csv so wide object/float64 columns never materialize
+READ_DTYPES = {
+    COL_YEAR: "float32",
+    COL_MONTH: "float32",
+    COL_HOUR: "float32",
+    COL_LAT: "float32",
+    COL_LON: "float32",
+    COL_COLLISION_ID: "float64",
+    **{col: "category" for col in CATEGORY_COLUMNS},
 }
 
+# Raw date/time columns used to derive year/month/hour when those are absent
+_DATE_COLUMNS = ["CRASH DATE", "CRASH TIME"]
+
+
+def _source_names(targets: List[str]) -> Dict[str, str]:
+    """Map every CSV header that becomes one of `targets` to its target name."""
+    names = {t: t for t in targets}
+    names.update({src: dst for src, dst in RENAMES.items() if dst in targets})
+    return names
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process in MB (None where unsupported)."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
 # ===========================
 # Download helper
 # ===========================
@@ -55,23 +153,701 @@ def _download_csv(path: Path) -> None:
     url = f"https://drive.google.com/uc?id={GDRIVE_ID}"
     gdown.download(url, str(path), quiet=False)
 
+# ===========================
+# Columnar cache helpers
+# ===========================
+def _cache_paths(path: Path, lean: bool = True):
+    """Feather file holding the prepared frame, plus its JSON fingerprint."""
+    cache = path.with_suffix(".lean.feather" if lean else ".feather")
+    return cache, cache.with_name(cache.name + ".json")
+
+
+def _source_fingerprint(path: Path, lean: bool) -> Dict[str, Any]:
+    """Size, mtime and a sampled (head + tail) hash of the source CSV."""
+    stat = path.stat()
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        h.update(f.read(_FINGERPRINT_BYTES))
+        if stat.st_size > _FINGERPRINT_BYTES:
+            f.seek(max(stat.st_size - _FINGERPRINT_BYTES, _FINGERPRINT_BYTES))
+            h.update(f.read())
+    return {
+        "schema_version": CACHE_SCHEMA_VERSION,
+        "lean": lean,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": h.hexdigest(),
+    }
+
+
+def dataset_version(path: Union[Path, str] = DEFAULT_DATA_PATH, lean: bool = True) -> str:
+    """Short id of the source CSV + partitions + schema, e.g. to namespace derived caches."""
+    fingerprint = _source_fingerprint(Path(path), lean)
+    fingerprint["partitions"] = [p.name for p in partition_paths(path)]
+    fingerprint = json.dumps(fingerprint, sort_keys=True)
+    return hashlib.sha256(fingerprint.encode()).hexdigest()[:16]
+
+
+def _read_cache(
+    path: Path, lean: bool, columns: Optional[List[str]] = None
+) -> Optional[pd.DataFrame]:
+    """Return the cached frame if it matches the source CSV, else None."""
+    cache, meta = _cache_paths(path, lean)
+    if not cache.exists() or not meta.exists():
+        return None
+    try:
+        stored = json.loads(meta.read_text())
+        if stored != _source_fingerprint(path, lean):
+            return None
+        return pd.read_feather(cache, columns=columns)
+    except Exception as exc:  # corrupt cache or pyarrow missing -> fall back to CSV
+        print("Ignoring columnar cache:", exc)
+        return None
+
+
+def _arrow_safe(df: pd.DataFrame) -> pd.DataFrame:
+    """`df` with a default index and no object columns Arrow cannot store."""
+    out = df.reset_index(drop=True)
+    # Arrow cannot store object columns mixing e.g. ints and strings
+    for col in out.columns:
+        if out[col].dtype == object and pd.api.types.infer_dtype(out[col]).startswith("mixed"):
+            out[col] = out[col].where(out[col].isna(), out[col].astype(str))
+    return out
+
+
+def _write_cache(df: pd.DataFrame, path: Path, lean: bool) -> None:
+    """Persist the prepared frame atomically; failures only cost the next boot."""
+    cache, meta = _cache_paths(path, lean)
+    out = _arrow_safe(df)
+
+    tmp = cache.with_name(cache.name + f".{os.getpid()}.tmp")
+    try:
+        out.to_feather(tmp)
+        os.replace(tmp, cache)
+        meta.write_text(json.dumps(_source_fingerprint(path, lean)))
+    except Exception as exc:
+        print("Could not write columnar cache:", exc)
+        tmp.unlink(missing_ok=True)
+
+
+# ===========================
+# Shared memory-mapped frame (one copy in the page cache for all workers)
+# ===========================
+def _shared_paths(path: Path, lean: bool = True):
+    """Uncompressed Arrow IPC file laid out for zero-copy reads, plus its fingerprint."""
+    shared = path.with_suffix(".lean.arrow" if lean else ".arrow")
+    return shared, shared.with_name(shared.name + ".json")
+
+
+def write_shared(df: pd.DataFrame, target: Union[Path, str]) -> None:
+    """
+    Write `df` as one uncompressed Arrow record batch whose buffers are the
+    numpy arrays pandas uses: bools as bytes, categoricals as their codes
+    (labels in the schema metadata), nullable ints as values + mask.
+    read_shared then maps every such column without copying it.
+    """
+    target = Path(target)
+    fields: Dict[str, pa.Array] = {}
+    layout = []
+    for col in df.columns:
+        values = df[col]
+        dtype = values.dtype
+        if isinstance(dtype, pd.CategoricalDtype):
+            fields[col] = pa.array(values.cat.codes.to_numpy())
+            layout.append({"name": col, "kind": "category", "categories": dtype.categories.tolist()})
+        elif isinstance(values.array, pd.arrays.IntegerArray):
+            fields[col] = pa.array(values.array.to_numpy(dtype=dtype.numpy_dtype, na_value=0))
+            fields[f"{col}.mask"] = pa.array(values.isna().to_numpy().view(np.uint8))
+            layout.append({"name": col, "kind": "masked"})
+        elif dtype == bool:
+            fields[col] = pa.array(values.to_numpy().view(np.uint8))
+            layout.append({"name": col, "kind": "bool"})
+        elif dtype.kind in "iuf":
+            # from_pandas=False keeps NaN as a value, so there is no validity bitmap
+            fields[col] = pa.array(values.to_numpy())
+            layout.append({"name": col, "kind": "numpy"})
+        else:
+            fields[col] = pa.array(values, from_pandas=True)
+            layout.append({"name": col, "kind": "arrow"})
+
+    table = pa.Table.from_arrays(list(fields.values()), names=list(fields)).replace_schema_metadata(
+        {"layout": json.dumps(layout)}
+    )
+    tmp = target.with_name(target.name + f".{os.getpid()}.tmp")
+    try:
+        with pa.OSFile(str(tmp), "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table, max_chunksize=max(len(table), 1))
+        os.replace(tmp, target)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def read_shared(target: Union[Path, str], columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Memory-map a write_shared file. Its columns are read-only views of the
+    mapped pages, which the OS shares between every process mapping the
+    file; only "arrow" (e.g. object) columns are copied into the process.
+    """
+    source = pa.memory_map(str(target), "r")
+    table = pa.ipc.open_file(source).read_all()
+    layout = json.loads(table.schema.metadata[b"layout"])
+
+    def view(name: str) -> np.ndarray:
+        column = table.column(name)
+        chunk = column.chunk(0) if column.num_chunks else pa.array([], type=column.type)
+        return chunk.to_numpy(zero_copy_only=True)
+
+    if columns is not None:
+        # In the requested order, as load_data returns them
+        by_name = {spec["name"]: spec for spec in layout}
+        layout = [by_name[c] for c in columns if c in by_name]
+
+    out = {}
+    for spec in layout:
+        col, kind = spec["name"], spec["kind"]
+        if kind == "category":
+            dtype = pd.CategoricalDtype(spec["categories"])
+            out[col] = pd.Categorical.from_codes(view(col), dtype=dtype, validate=False)
+        elif kind == "masked":
+            out[col] = pd.arrays.IntegerArray(view(col), view(f"{col}.mask").view(bool))
+        elif kind == "bool":
+            out[col] = view(col).view(bool)
+        elif kind == "numpy":
+            out[col] = view(col)
+        else:
+            out[col] = table.column(col).to_pandas()
+    # copy=False keeps one block per column: consolidating would copy them
+    return pd.DataFrame(out, copy=False)
+
+
+def _read_shared(path: Path, lean: bool, columns: Optional[List[str]]) -> Optional[pd.DataFrame]:
+    """The memory-mapped frame if it matches the source data, else None."""
+    shared, meta = _shared_paths(path, lean)
+    if not shared.exists() or not meta.exists():
+        return None
+    try:
+        if json.loads(meta.read_text()).get("version") != dataset_version(path, lean):
+            return None
+        return read_shared(shared, columns)
+    except Exception as exc:  # corrupt file -> rebuild
+        print("Ignoring shared frame:", exc)
+        return None
+
+
+def load_shared(
+    path: Union[Path, str] = DEFAULT_DATA_PATH,
+    columns: Optional[List[str]] = None,
+    lean: bool = True,
+) -> Tuple[pd.DataFrame, str]:
+    """
+    The prepared dataset (with its partitions) memory-mapped from
+    `<stem>.lean.arrow`, rebuilt from load_data when stale.
+    """
+    path = Path(path)
+    df = _read_shared(path, lean, columns)
+    if df is not None:
+        return df, "memory-mapped"
+
+    def build():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return load_data(path, lean=lean)
+
+    return share_frame(build, path, columns=columns, lean=lean), "memory-mapped, rebuilt"
+
+
+def share_frame(
+    build: Callable[[], pd.DataFrame],
+    path: Union[Path, str] = DEFAULT_DATA_PATH,
+    version: Optional[str] = None,
+    columns: Optional[List[str]] = None,
+    lean: bool = True,
+) -> pd.DataFrame:
+    """
+    Memory-map the shared frame of `path` at `version` (default: the
+    current dataset_version), writing it from `build()` first unless a
+    process already has. Workers extending their data after a refresh
+    use it to map the one new file instead of each keeping a private
+    copy; processes still mapping the old file keep its pages until
+    they re-map.
+    """
+    path = Path(path)
+    version = version or dataset_version(path, lean)
+    shared, meta = _shared_paths(path, lean)
+    try:
+        current = json.loads(meta.read_text()).get("version") if shared.exists() else None
+    except (OSError, ValueError):
+        current = None
+    if current != version:
+        # No fingerprint while the file is replaced, so no reader trusts it
+        meta.unlink(missing_ok=True)
+        write_shared(build(), shared)
+        tmp = meta.with_name(meta.name + f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps({"version": version}))
+        os.replace(tmp, meta)
+    return read_shared(shared, columns)
+
+
+# ===========================
+# Incremental partitions (appended by project.pipeline.incremental)
+# ===========================
+MANIFEST_NAME = "manifest.json"
+
+
+def partitions_dir(path: Union[Path, str] = DEFAULT_DATA_PATH) -> Path:
+    """Directory holding the partitions appended to the CSV at `path`."""
+    path = Path(path)
+    return path.with_name(path.stem + ".parts")
+
+
+def read_manifest(path: Union[Path, str] = DEFAULT_DATA_PATH) -> Dict[str, Any]:
+    """High-water mark, cleaning stats and partition list of `path` ({} if none)."""
+    manifest = partitions_dir(path) / MANIFEST_NAME
+    if not manifest.exists():
+        return {}
+    return json.loads(manifest.read_text())
+
+
+def partition_paths(path: Union[Path, str] = DEFAULT_DATA_PATH) -> List[Path]:
+    """CSV partitions appended to `path`, oldest first."""
+    directory = partitions_dir(path)
+    return [directory / p["file"] for p in read_manifest(path).get("partitions", [])]
+
+
+def _collision_ids(df: pd.DataFrame) -> np.ndarray:
+    if COL_COLLISION_ID not in df.columns:
+        return np.empty(0, dtype=np.int64)
+    return np.unique(df[COL_COLLISION_ID].dropna().to_numpy(dtype=np.int64))
+
+
+def concat_frames(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """Concatenate prepared frames, keeping label columns categorical."""
+    if len(frames) == 1:
+        return frames[0]
+    out = pd.concat(frames, ignore_index=True)
+    for col in out.columns:
+        values = [f[col] for f in frames if col in f.columns]
+        if len(values) == len(frames) and all(isinstance(v.dtype, pd.CategoricalDtype) for v in values):
+            out[col] = pd.Series(union_categoricals(values), index=out.index, name=col)
+    return out
+
+
+def combine_partitions(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """
+    The base frame followed by its partitions (oldest first). A partition
+    replaces every earlier row of the collisions it holds, so a collision
+    that changed appears once, in its latest version.
+    """
+    if not frames:
+        return pd.DataFrame()
+    kept = []
+    later = np.empty(0, dtype=np.int64)
+    for df in reversed(frames):
+        if len(later) and COL_COLLISION_ID in df.columns:
+            df = df[~df[COL_COLLISION_ID].isin(later)]
+        kept.append(df)
+        later = np.union1d(later, _collision_ids(df))
+    return concat_frames(kept[::-1])
+
+
+def _replaced_ids(parts: List[Path]) -> List[np.ndarray]:
+    """For the base CSV and each partition: the collision ids later partitions replace."""
+    held = [
+        _collision_ids(pd.read_csv(p, usecols=lambda c: c == COL_COLLISION_ID))
+        for p in parts
+    ]
+    replaced = [np.empty(0, dtype=np.int64)]
+    for ids in reversed(held):
+        replaced.append(np.union1d(replaced[-1], ids))
+    return replaced[::-1]
+
+
+# ===========================
+# Hive-partitioned store (one Feather file per year/borough)
+# ===========================
+PARTITION_COLUMNS = [COL_YEAR, COL_BOROUGH]
+STORE_META_NAME = "_store.json"
+
+# Directory name hive readers (pyarrow.dataset, Spark, DuckDB) use for a missing key
+_HIVE_NULL = "__HIVE_DEFAULT_PARTITION__"
+
+
+def store_dir(path: Union[Path, str] = DEFAULT_DATA_PATH) -> Path:
+    """Directory of the partitioned store built from the CSV at `path`."""
+    path = Path(path)
+    return path.with_name(path.stem + ".hive")
+
+
+def _partition_key(col: str, value: Any) -> Any:
+    """JSON-safe partition key of `value` (None when missing), as index_key compares it."""
+    if pd.isna(value):
+        return None
+    return int(value) if col in INT_DTYPES else str(value).strip().upper()
+
+
+def _hive_name(col: str, key: Any) -> str:
+    return f"{col}={_HIVE_NULL if key is None else quote(str(key), safe='')}"
+
+
+class PartitionedDataset:
+    """
+    Lazy handle on a store written by write_partitioned: nothing is read
+    until read(), which opens only the partitions whose keys match.
+
+    Partition columns live in the directory names (CRASH_YEAR=2023/
+    BOROUGH=QUEENS/part-0.feather), so any hive-aware reader can open the
+    store too; read() puts them back with the dtypes load_data returns.
+    """
+
+    def __init__(self, directory: Union[Path, str], columns: Optional[List[str]] = None):
+        self.directory = Path(directory)
+        meta = json.loads((self.directory / STORE_META_NAME).read_text())
+        self.version: str = meta["version"]
+        self.by: List[str] = meta["by"]
+        self.columns: List[str] = [c for c in meta["columns"] if columns is None or c in columns]
+        # dtypes of the frame the store was written from (labels stay categorical)
+        self.dtypes: Dict[str, str] = meta["dtypes"]
+        self.partitions = pd.DataFrame(
+            [{**p["keys"], "file": p["file"], "rows": p["rows"]} for p in meta["partitions"]],
+            columns=[*self.by, "file", "rows"],
+        )
+
+    def __len__(self) -> int:
+        return int(self.partitions["rows"].sum())
+
+    def __repr__(self) -> str:
+        return f"PartitionedDataset({str(self.directory)!r}, {len(self.partitions)} partitions, {len(self):,} rows)"
+
+    def prune(self, wanted: Optional[Dict[str, list]] = None) -> pd.DataFrame:
+        """
+        Partitions (keys, file, rows) that can hold rows matching
+        {column: [index keys]}; filters on other columns are ignored and a
+        missing key never matches, as in apply_filters.
+        """
+        keep = np.ones(len(self.partitions), dtype=bool)
+        for col, keys in (wanted or {}).items():
+            if col in self.by and keys:
+                keep &= self.partitions[col].isin(keys).to_numpy()
+        return self.partitions[keep]
+
+    def read(
+        self, wanted: Optional[Dict[str, list]] = None, columns: Optional[List[str]] = None
+    ) -> pd.DataFrame:
+        """Rows of the partitions prune(wanted) keeps, as one prepared frame."""
+        columns = self.columns if columns is None else [c for c in self.columns if c in columns]
+        parts = self.prune(wanted)
+        if not len(parts):
+            if not len(self.partitions):
+                return pd.DataFrame(columns=columns)
+            # Nothing matches: an empty frame with the usual dtypes
+            return self._read_parts(self.partitions.head(1), columns).iloc[:0]
+        return self._read_parts(parts, columns)
+
+    def _read_parts(self, parts: pd.DataFrame, columns: List[str]) -> pd.DataFrame:
+        # Concatenate in Arrow and convert once: per-file pandas conversion
+        # costs more than the read itself for small partitions
+        stored = [c for c in columns if c not in self.by]
+        tables = []
+        for part in parts.itertuples(index=False):
+            table = feather.read_table(self.directory / part.file, columns=stored, memory_map=True)
+            for col in self.by:
+                if col in columns:
+                    table = table.append_column(col, _partition_array(col, getattr(part, col), len(table)))
+            tables.append(table.select(columns))
+        df = pa.concat_tables(tables, promote_options="permissive").to_pandas()
+        for col, dtype in self.dtypes.items():
+            if col in df.columns and str(df[col].dtype) != dtype:
+                df[col] = df[col].astype(dtype)
+        return df
+
+
+def _partition_array(col: str, key: Any, n: int) -> pa.Array:
+    """Column `col` of a partition: its key (or missing) on every row."""
+    if col in INT_DTYPES:
+        return pa.nulls(n, pa.int16()) if key is None else pa.array(np.full(n, key, dtype=np.int16))
+    if key is None:
+        return pa.nulls(n, pa.dictionary(pa.int8(), pa.string()))
+    return pa.DictionaryArray.from_arrays(pa.array(np.zeros(n, dtype=np.int8)), pa.array([key]))
+
+
+def write_partitioned(
+    df: pd.DataFrame,
+    directory: Union[Path, str],
+    by: Optional[List[str]] = None,
+    version: str = "",
+) -> PartitionedDataset:
+    """
+    Write `df` as one Feather file per combination of the `by` columns
+    (PARTITION_COLUMNS by default) under `directory`, replacing any store
+    there. The store is built in a temporary directory and swapped in
+    whole; `version` identifies the data it was built from.
+    """
+    directory = Path(directory)
+    by = [c for c in (PARTITION_COLUMNS if by is None else by) if c in df.columns]
+    tmp = directory.with_name(directory.name + f".{os.getpid()}.tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+
+    # Partition number of every row (keys computed per distinct value), then
+    # a stable sort so each partition is one slice
+    flat = np.zeros(len(df), dtype=np.int64)
+    keys: Dict[str, list] = {}
+    for col in by:
+        codes, uniques = pd.factorize(df[col])
+        merged, keys[col] = pd.factorize(
+            pd.Series([_partition_key(col, u) for u in uniques] + [None], dtype=object),
+            use_na_sentinel=False,
+        )
+        flat = flat * len(keys[col]) + merged[codes]  # code -1 -> the trailing None
+    order = np.argsort(flat, kind="stable")
+    bounds = np.flatnonzero(np.diff(flat[order])) + 1
+    starts, ends = np.r_[0, bounds], np.r_[bounds, len(df)]
+    if not len(df):
+        starts, ends = starts[:0], ends[:0]
+
+    partitions = []
+    data = _arrow_safe(df.drop(columns=by))
+    for start, end in zip(starts, ends):
+        digits = np.unravel_index(flat[order[start]], [len(keys[col]) for col in by])
+        key = {col: _partition_key(col, keys[col][d]) for col, d in zip(by, digits)}
+        folder = Path(*[_hive_name(col, key[col]) for col in by])
+        (tmp / folder).mkdir(parents=True, exist_ok=True)
+        part = data.take(order[start:end]).reset_index(drop=True)
+        # Each file carries only the labels it uses
+        for col in part.columns:
+            if isinstance(part[col].dtype, pd.CategoricalDtype):
+                part[col] = part[col].cat.remove_unused_categories()
+        part.to_feather(tmp / folder / "part-0.feather")
+        partitions.append({"keys": key, "file": (folder / "part-0.feather").as_posix(), "rows": int(end - start)})
+
+    meta = {
+        "version": version,
+        "by": by,
+        "columns": list(df.columns),
+        "dtypes": {
+            col: str(dtype) for col, dtype in df.dtypes.items()
+            if not isinstance(dtype, pd.CategoricalDtype) and dtype != object
+        },
+        "partitions": partitions,
+    }
+    (tmp / STORE_META_NAME).write_text(json.dumps(meta, indent=2))
+
+    old = directory.with_name(directory.name + f".{os.getpid()}.old")
+    if directory.exists():
+        os.replace(directory, old)
+    os.replace(tmp, directory)
+    shutil.rmtree(old, ignore_errors=True)
+    return PartitionedDataset(directory)
+
+
+def open_partitioned(
+    path: Union[Path, str] = DEFAULT_DATA_PATH,
+    columns: Optional[List[str]] = None,
+    lean: bool = True,
+) -> PartitionedDataset:
+    """
+    The partitioned store of the CSV at `path` (with its partitions),
+    rebuilt from the prepared frame when missing or built from other data.
+    """
+    directory = store_dir(path)
+    version = dataset_version(path, lean)
+    try:
+        dataset = PartitionedDataset(directory, columns)
+        if dataset.version == version:
+            return dataset
+    except (OSError, ValueError, KeyError):
+        pass
+    print(f"Building partitioned store in {directory}...")
+    write_partitioned(load_data(path, lean=lean), directory, version=version)
+    return PartitionedDataset(directory, columns)
+
+
 # ===========================
 # Load data
 # ===========================
-def load_data(path: Union[Path, str] = DEFAULT_DATA_PATH) -> pd.DataFrame:
+def _read_csv_kwargs(lean: bool) -> Dict[str, Any]:
+    """read_csv arguments for the lean (app columns, narrow dtypes) or full mode."""
+    if not lean:
+        return {"low_memory": False}
+    names = _source_names(LEAN_COLUMNS + _DATE_COLUMNS)
+    return {
+        "usecols": lambda c: c in names,
+        "dtype": {src: READ_DTYPES[dst] for src, dst in names.items() if dst in READ_DTYPES},
+    }
+
+
+def iter_chunks(
+    path: Union[Path, str] = DEFAULT_DATA_PATH,
+    chunksize: int = 500_000,
+    lean: bool = True,
+) -> Iterator[pd.DataFrame]:
+    """Yield the dataset as prepared chunks, never holding more than one in memory."""
+    path = Path(path)
+    if not path.exists():
+        print("CSV not found locally. Downloading from Google Drive...")
+        _download_csv(path)
+
+    parts = partition_paths(path)
+    seen = np.empty(0, dtype=np.int64)
+    for source, replaced in zip([path, *parts], _replaced_ids(parts)):
+        with pd.read_csv(source, chunksize=chunksize, **_read_csv_kwargs(lean)) as reader:
+            for chunk in reader:
+                chunk = _prepare(chunk, lean)
+                if len(replaced) and COL_COLLISION_ID in chunk.columns:
+                    chunk = chunk[~chunk[COL_COLLISION_ID].isin(replaced)]
+                # A collision's first row may have been in an earlier chunk
+                if COL_FIRST_PERSON in chunk.columns:
+                    earlier = chunk[COL_COLLISION_ID].isin(seen).to_numpy()
+                    chunk = chunk.assign(**{COL_FIRST_PERSON: chunk[COL_FIRST_PERSON].to_numpy() & ~earlier})
+                    seen = np.union1d(seen, _collision_ids(chunk))
+                yield chunk
+
+
+def _load_file(
+    path: Path,
+    columns: Optional[List[str]],
+    use_cache: bool,
+    lean: bool,
+    nrows: Optional[int] = None,
+) -> Tuple[pd.DataFrame, str]:
+    """One prepared CSV (from its columnar cache when valid) and where it came from."""
+    df = _read_cache(path, lean, columns) if use_cache else None
+    if df is not None:
+        return df, "columnar cache"
+
+    df = _prepare(pd.read_csv(path, nrows=nrows, **_read_csv_kwargs(lean)), lean)
+    if use_cache:
+        _write_cache(df, path, lean)
+    if columns is not None:
+        df = df[[c for c in columns if c in df.columns]]
+    return df, "csv"
+
+
+def load_partitions(
+    path: Union[Path, str] = DEFAULT_DATA_PATH,
+    start: int = 0,
+    columns: Optional[List[str]] = None,
+    use_cache: bool = True,
+    lean: bool = True,
+) -> pd.DataFrame:
+    """
+    Partitions start, start + 1, ... of `path` as one prepared frame
+    (combined with combine_partitions), e.g. the ones appended since a
+    process loaded the dataset.
+    """
+    parts = partition_paths(path)[start:]
+    return combine_partitions([_load_file(p, columns, use_cache, lean)[0] for p in parts])
+
+
+def load_data(
+    path: Union[Path, str] = DEFAULT_DATA_PATH,
+    columns: Optional[List[str]] = None,
+    use_cache: bool = True,
+    lean: bool = True,
+    nrows: Optional[int] = None,
+    lazy: bool = False,
+    mmap: bool = False,
+) -> Union[pd.DataFrame, PartitionedDataset]:
+    """
+    Load the integrated dataset with the COL_* names and types applied.
+
+    lean=True (the default) reads only LEAN_COLUMNS with narrow dtypes
+    (int16/int8 dates, float32 coordinates, int32 collision ids, categories
+    for the label columns), which lets the full file fit where a 300k-row
+    sample used to. lean=False keeps every column of the CSV. Both add the
+    bool flags IS_INJURED / IS_KILLED (from PERSON_INJURY) and
+    IS_FIRST_PERSON (first row of each collision), so KPIs are sums.
+
+    The first load parses the CSV and stores the prepared frame as a Feather
+    file next to it; later loads read that file (only `columns`, if given) as
+    long as the CSV size/mtime/hash and CACHE_SCHEMA_VERSION still match.
+    Partitions appended by an incremental refresh are loaded the same way
+    (each with its own cache) and combined with combine_partitions.
+    `nrows` reads just the head of the CSV and bypasses the cache and the
+    partitions.
+
+    mmap=True returns the same frame memory-mapped from an uncompressed
+    Arrow file next to the CSV (rebuilt when the data changes): its columns
+    are read-only views of pages the OS shares between all processes that
+    map the file, so gunicorn workers do not each hold a copy.
+
+    lazy=True returns a PartitionedDataset over the year/borough store
+    next to the CSV (built on first use and whenever the data changes)
+    instead of a frame; apply_filters reads only the partitions a filter
+    can match from it.
+    """
     path = Path(path)
+    use_cache = use_cache and nrows is None
 
     if not path.exists():
         print("CSV not found locally. Downloading from Google Drive...")
         _download_csv(path)
 
-    # IMPORTANT: sample to avoid Render OOM
-    df = pd.read_csv(
-        path,
-        low_memory=False,
-        nrows=300_000
+    if lazy:
+        if nrows is not None:
+            raise ValueError("nrows cannot be combined with lazy=True")
+        return open_partitioned(path, columns, lean)
+
+    parts = partition_paths(path) if nrows is None else []
+    # Replacing changed collisions needs their ids, even if not asked for
+    wanted = columns if columns is None or not parts else list(dict.fromkeys([*columns, COL_COLLISION_ID]))
+
+    if mmap:
+        if nrows is not None:
+            raise ValueError("nrows cannot be combined with mmap=True")
+        df, source = load_shared(path, columns, lean)
+    else:
+        df, source = _load_file(path, wanted, use_cache, lean, nrows)
+    if parts and not mmap:
+        df = combine_partitions([df, load_partitions(path, columns=wanted, use_cache=use_cache, lean=lean)])
+        if columns is not None:
+            df = df[[c for c in columns if c in df.columns]]
+    if parts:
+        source += f" + {len(parts)} partitions"
+
+    peak = peak_rss_mb()
+    print(
+        "DATAFRAME SHAPE:", df.shape,
+        f"({source}, {df.memory_usage(deep=True).sum() / 1e6:.1f} MB"
+        + (f", peak RSS {peak:.0f} MB)" if peak is not None else ")"),
     )
+    print("HAS BOROUGH?", COL_BOROUGH in df.columns, "HAS YEAR?", COL_YEAR in df.columns)
+
+    return df
+
+
+def _narrow_int(values: pd.Series, dtype: str) -> pd.Series:
+    """Cast to `dtype`, or its nullable variant if there are missing values."""
+    values = pd.to_numeric(values, errors="coerce")
+    if values.isna().any():
+        return values.astype(dtype.capitalize())
+    return values.astype(dtype)
+
+
+def _clean_category(values: pd.Series, transform) -> pd.Series:
+    """Apply a string transform to the categories only, merging duplicates."""
+    if not isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.astype("category")
+    cats = values.cat.categories.astype(str)
+    inverse, uniq = pd.factorize(transform(cats))
+    codes = values.cat.codes.to_numpy()
+    new_codes = inverse[codes]
+    new_codes[codes < 0] = -1
+    return pd.Series(
+        pd.Categorical.from_codes(new_codes, categories=uniq),
+        index=values.index,
+        name=values.name,
+    )
+
 
+def _label_flag(values: pd.Series, pattern: str) -> np.ndarray:
+    """Rows of a categorical column whose lower-cased label matches `pattern`."""
+    hit = values.cat.categories.astype(str).str.lower().str.contains(pattern)
+    return np.append(np.asarray(hit, dtype=bool), False)[values.cat.codes.to_numpy()]
+
+
+def _prepare(df: pd.DataFrame, lean: bool = True) -> pd.DataFrame:
+    """Apply renames, date derivation and type cleaning to a raw CSV frame."""
     # Rename columns
     rename_map = {k: v for k, v in RENAMES.items() if k in df.columns}
     if rename_map:
@@ -87,23 +863,35 @@ def load_data(path: Union[Path, str] = DEFAULT_DATA_PATH) -> pd.DataFrame:
         t = pd.to_datetime(df["CRASH TIME"], errors="coerce")
         df[COL_HOUR] = t.dt.hour
 
-    # Ensure numeric
-    for col in [COL_YEAR, COL_MONTH, COL_HOUR]:
+    # Narrow numeric types
+    for col, dtype in INT_DTYPES.items():
         if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors="coerce")
-
-    # Clean strings
-    for col in [
-        COL_BOROUGH,
-        COL_PERSON_INJURY,
-        COL_PERSON_TYPE,
-        COL_VEHICLE_TYPE,
-        COL_FACTOR,
-    ]:
+            df[col] = _narrow_int(df[col], dtype)
+
+    for col in [COL_LAT, COL_LON]:
         if col in df.columns:
-            df[col] = df[col].astype(str).str.strip()
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype("float32")
 
-    print("DATAFRAME SHAPE:", df.shape)
-    print("HAS BOROUGH?", COL_BOROUGH in df.columns, "HAS YEAR?", COL_YEAR in df.columns)
+    if COL_COLLISION_ID in df.columns:
+        ids = pd.to_numeric(df[COL_COLLISION_ID], errors="coerce")
+        fits_int32 = ids.max() < 2**31 if ids.notna().any() else True
+        df[COL_COLLISION_ID] = _narrow_int(ids, "int32" if fits_int32 else "int64")
+
+    # Clean strings: canonical upper-case categories, missing values stay missing
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = _clean_category(df[col], lambda c: c.str.strip().str.upper())
+
+    # Severity flags: match the (few) injury labels once, then look up codes
+    if COL_PERSON_INJURY in df.columns:
+        df[COL_IS_INJURED] = _label_flag(df[COL_PERSON_INJURY], INJURED_PATTERN)
+        df[COL_IS_KILLED] = _label_flag(df[COL_PERSON_INJURY], KILLED_PATTERN)
+
+    if COL_COLLISION_ID in df.columns:
+        ids = df[COL_COLLISION_ID]
+        df[COL_FIRST_PERSON] = (ids.notna() & ~ids.duplicated()).to_numpy()
+
+    if lean:
+        df = df[[c for c in LEAN_COLUMNS if c in df.columns]]
 
     return df
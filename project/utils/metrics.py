@@ -0,0 +1,262 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional, List, Dict, Any, Callable
+
+# Requests slower than this (seconds) are logged with their stage breakdown
+DEFAULT_SLOW_SECONDS = float(os.environ.get("SLOW_REQUEST_SECONDS", 1.0))
+
+# Slow requests kept in memory for the /metrics endpoint
+SLOW_LOG_SIZE = 20
+
+slow_log = logging.getLogger("project.slow_requests")
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def current_rss_bytes() -> Optional[int]:
+    """Current resident set size (Linux /proc; None elsewhere). ~10 us per call."""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class _Stage:
+    """One timed block; callers may set `rows` inside the with-block."""
+
+    __slots__ = ("name", "rows", "seconds", "rss_delta")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.rows: Optional[int] = None
+        self.seconds = 0.0
+        self.rss_delta: Optional[int] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        out = {"stage": self.name, "ms": round(self.seconds * 1000, 2)}
+        if self.rows is not None:
+            out["rows"] = self.rows
+        if self.rss_delta is not None:
+            out["rss_delta_mb"] = round(self.rss_delta / 1e6, 2)
+        return out
+
+
+# ===========================
+# Registry
+# ===========================
+class Metrics:
+    """
+    Per-stage counters for the report path, cheap enough to leave on.
+
+    stage() adds two perf_counter calls and two /proc reads to a block and
+    folds the result into running totals. Stages run inside request() are
+    also collected per request, and requests slower than `slow_seconds` are
+    logged as one JSON line (logger "project.slow_requests").
+    """
+
+    def __init__(self, slow_seconds: float = DEFAULT_SLOW_SECONDS, track_memory: bool = True):
+        self.slow_seconds = slow_seconds
+        self.track_memory = track_memory and current_rss_bytes() is not None
+        self._lock = threading.Lock()
+        self._stages: Dict[str, Dict[str, float]] = {}
+        self._requests: Dict[str, Dict[str, float]] = {}
+        self._slow: "deque[Dict[str, Any]]" = deque(maxlen=SLOW_LOG_SIZE)
+        self._payloads: Dict[str, Dict[str, int]] = {}
+        self._local = threading.local()
+
+    # ---------- recording ----------
+    @contextmanager
+    def stage(self, name: str):
+        st = _Stage(name)
+        rss0 = current_rss_bytes() if self.track_memory else None
+        start = time.perf_counter()
+        try:
+            yield st
+        finally:
+            st.seconds = time.perf_counter() - start
+            if rss0 is not None:
+                rss1 = current_rss_bytes()
+                st.rss_delta = rss1 - rss0 if rss1 is not None else None
+            self._record(self._stages, name, st.seconds, st.rows)
+            trace = getattr(self._local, "trace", None)
+            if trace is not None:
+                trace.append(st)
+
+    @contextmanager
+    def request(self, name: str, **fields):
+        """
+        Time a whole callback; its stages are attached to a slow-request log.
+        Yields a dict that holds the request's timings once the block exits,
+        for merge() in another process.
+        """
+        outer = getattr(self._local, "trace", None)
+        self._local.trace = trace = []
+        timing: Dict[str, Any] = {}
+        start = time.perf_counter()
+        try:
+            yield timing
+        finally:
+            seconds = time.perf_counter() - start
+            self._local.trace = outer
+            self._record(self._requests, name, seconds, None)
+            timing.update(
+                request=name,
+                seconds=seconds,
+                stages=[[st.name, st.seconds, st.rows] for st in trace],
+            )
+            if seconds >= self.slow_seconds:
+                timing["slow"] = self._log_slow(name, seconds, trace, fields)
+
+    def merge(self, timing: Dict[str, Any]) -> None:
+        """
+        Fold in a request timed by another process (the dict request()
+        yielded there), e.g. a background job forked from this worker.
+        Its slow-request line was already logged by that process.
+        """
+        for name, seconds, rows in timing.get("stages", []):
+            self._record(self._stages, name, seconds, rows)
+        self._record(self._requests, timing["request"], timing["seconds"], None)
+        if timing.get("slow"):
+            with self._lock:
+                self._slow.append(timing["slow"])
+
+    def _record(self, table, name: str, seconds: float, rows: Optional[int]) -> None:
+        with self._lock:
+            s = table.get(name)
+            if s is None:
+                s = table[name] = {"count": 0, "total_s": 0.0, "max_s": 0.0, "rows": 0}
+            s["count"] += 1
+            s["total_s"] += seconds
+            s["max_s"] = max(s["max_s"], seconds)
+            if rows is not None:
+                s["rows"] += rows
+
+    def payload(self, name: str, raw_bytes: int, wire_bytes: Optional[int] = None) -> None:
+        """Record one response body of callback `name`, before and after compression."""
+        with self._lock:
+            p = self._payloads.get(name)
+            if p is None:
+                p = self._payloads[name] = {"count": 0, "raw": 0, "wire": 0, "max_raw": 0}
+            p["count"] += 1
+            p["raw"] += raw_bytes
+            p["wire"] += raw_bytes if wire_bytes is None else wire_bytes
+            p["max_raw"] = max(p["max_raw"], raw_bytes)
+
+    def _log_slow(self, name, seconds, trace: List[_Stage], fields) -> Dict[str, Any]:
+        entry = {
+            "request": name,
+            "ms": round(seconds * 1000, 1),
+            "at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            **{k: v for k, v in fields.items() if v is not None},
+            "stages": [st.as_dict() for st in trace],
+        }
+        with self._lock:
+            self._slow.append(entry)
+        slow_log.warning(json.dumps(entry, default=str))
+        return entry
+
+    # ---------- reporting ----------
+    def snapshot(self) -> Dict[str, Any]:
+        def table(rows):
+            return {
+                name: {
+                    "count": int(s["count"]),
+                    "mean_ms": round(s["total_s"] / s["count"] * 1000, 3),
+                    "max_ms": round(s["max_s"] * 1000, 3),
+                    "total_s": round(s["total_s"], 3),
+                    **({"rows": int(s["rows"])} if s["rows"] else {}),
+                }
+                for name, s in sorted(rows.items())
+            }
+
+        def payloads(rows):
+            return {
+                name: {
+                    "count": p["count"],
+                    "mean_kb": round(p["raw"] / p["count"] / 1024, 2),
+                    "max_kb": round(p["max_raw"] / 1024, 2),
+                    "wire_mean_kb": round(p["wire"] / p["count"] / 1024, 2),
+                }
+                for name, p in sorted(rows.items())
+            }
+
+        with self._lock:
+            return {
+                "stages": table(self._stages),
+                "requests": table(self._requests),
+                "payloads": payloads(self._payloads),
+                "slow_requests": list(self._slow),
+                "slow_threshold_s": self.slow_seconds,
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stages.clear()
+            self._requests.clear()
+            self._slow.clear()
+            self._payloads.clear()
+
+
+# Process-wide registry used by callbacks.py
+metrics = Metrics()
+
+
+def register_metrics_endpoint(
+    server,
+    registry: Metrics = metrics,
+    sources: Optional[Dict[str, Callable[[], Any]]] = None,
+    path: str = "/metrics",
+) -> None:
+    """
+    Serve registry.snapshot() as JSON on the Flask `server`, plus one key per
+    extra source (e.g. {"report_cache": cache.stats}). Numbers are per worker.
+    """
+    from flask import jsonify
+
+    def metrics_view():
+        body = registry.snapshot()
+        body["pid"] = os.getpid()
+        for name, source in (sources or {}).items():
+            body[name] = source()
+        return jsonify(body)
+
+    server.add_url_rule(path, "metrics", metrics_view)
+
+
+def register_payload_metrics(server, registry: Metrics = metrics) -> None:
+    """
+    Record the response size of every Dash callback on the Flask `server`
+    (registry.payload, keyed by the callback's output as in
+    app.callback_map), uncompressed and as sent. Call it after response
+    compression is set up: the raw size is taken before the other
+    after-request hooks run and the wire size after all of them.
+    """
+    from flask import g, request
+
+    def callback_name():
+        if not request.path.endswith("/_dash-update-component"):
+            return None
+        body = request.get_json(silent=True)
+        return body.get("output") if isinstance(body, dict) else None
+
+    def measure_raw(response):
+        if not response.direct_passthrough and callback_name():
+            g.payload_raw_bytes = len(response.get_data())
+        return response
+
+    def measure_wire(response):
+        raw = g.pop("payload_raw_bytes", None)
+        if raw is not None:
+            wire = len(response.get_data()) if not response.direct_passthrough else None
+            registry.payload(callback_name(), raw, wire)
+        return response
+
+    # Flask runs after-request hooks in reverse order of registration
+    server.after_request(measure_raw)
+    server.after_request_funcs.setdefault(None, []).insert(0, measure_wire)
@@ -0,0 +1,81 @@
+import re
+from typing import Optional, List, Dict, Any
+
+import numpy as np
+import pandas as pd
+
+from project.utils.load_data import (
+    COL_BOROUGH,
+    COL_PERSON_INJURY,
+    COL_PERSON_TYPE,
+    COL_VEHICLE_TYPE,
+    COL_FACTOR,
+)
+
+# Label dropdowns (filter argument -> column) whose options come from the data
+OPTION_COLUMNS = {
+    "borough": COL_BOROUGH,
+    "vehicle_type": COL_VEHICLE_TYPE,
+    "factor": COL_FACTOR,
+    "injury": COL_PERSON_INJURY,
+    "person_type": COL_PERSON_TYPE,
+}
+
+# Options shipped in the page per dropdown; the rest are found by typing
+DEFAULT_TOP_OPTIONS = 50
+# Matches returned per keystroke
+DEFAULT_MATCH_LIMIT = 50
+
+
+class OptionVocabulary:
+    """
+    Distinct values of one column with their row counts, most frequent
+    first, computed once. top() fills the dropdown in the page; search()
+    answers what the user types from the server.
+    """
+
+    def __init__(self, values: pd.Series):
+        counts = values.value_counts(dropna=True, sort=False)
+        counts = counts[counts > 0]
+        # Most frequent first, ties alphabetical
+        order = np.lexsort((counts.index.astype(str), -counts.to_numpy()))
+        self.labels: List[Any] = counts.index[order].tolist()
+        self.counts = counts.to_numpy()[order]
+        self._lower = pd.Index([str(label).lower() for label in self.labels])
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def top(self, n: int = DEFAULT_TOP_OPTIONS) -> List[Any]:
+        return self.labels[:n]
+
+    def search(self, text: Optional[str], limit: int = DEFAULT_MATCH_LIMIT) -> List[Any]:
+        """
+        Up to `limit` labels containing `text` (case-insensitive): labels
+        starting with it, then labels with a word starting with it, then any
+        other match; each group most frequent first.
+        """
+        text = (text or "").strip().lower()
+        if not text:
+            return self.top(limit)
+        contains = self._lower.str.contains(text, regex=False)
+        starts = self._lower.str.startswith(text)
+        word = self._lower.str.contains(r"(?<![a-z0-9])" + re.escape(text))
+        rank = np.where(starts, 0, np.where(word, 1, 2))[contains]
+        hits = np.flatnonzero(contains)[np.argsort(rank, kind="stable")][:limit]
+        return [self.labels[i] for i in hits]
+
+    def options(self, labels: List[Any], keep: Optional[List[Any]] = None) -> List[Dict[str, Any]]:
+        """Dropdown options for `labels`, plus the already selected `keep` values."""
+        seen = set(labels)
+        extra = [v for v in (keep or []) if v not in seen]
+        return [{"label": v, "value": v} for v in [*labels, *extra]]
+
+
+def build_vocabularies(df: pd.DataFrame) -> Dict[str, OptionVocabulary]:
+    """OptionVocabulary per OPTION_COLUMNS dropdown present in `df`."""
+    return {
+        field: OptionVocabulary(df[col])
+        for field, col in OPTION_COLUMNS.items()
+        if col in df.columns
+    }
@@ -0,0 +1,66 @@
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Dict, Any, Callable, Union
+
+from project.utils.load_data import (
+    DEFAULT_DATA_PATH,
+    COL_COLLISION_ID,
+    dataset_version,
+    load_partitions,
+    partition_paths,
+)
+
+# Seconds between manifest checks when the app follows incremental refreshes
+DEFAULT_REFRESH_INTERVAL = 300
+
+
+def apply_new_partitions(
+    extend: Callable[..., Any],
+    path: Union[Path, str] = DEFAULT_DATA_PATH,
+    seen: int = 0,
+) -> int:
+    """
+    Hand the partitions of `path` after the first `seen` to `extend` (the
+    report function's extend, see register_callbacks) as one frame, with
+    the collision ids they replace. Returns the number of partitions seen.
+    """
+    parts = partition_paths(path)
+    if len(parts) <= seen:
+        return seen
+    start = time.perf_counter()
+    rows = load_partitions(path, start=seen)
+    replaced = rows[COL_COLLISION_ID].dropna().unique() if COL_COLLISION_ID in rows.columns else None
+    extend(rows, replaced, dataset_version(path))
+    print(
+        f"Refresh: added {len(parts) - seen} partition(s), {len(rows):,} rows "
+        f"in {time.perf_counter() - start:.2f}s"
+    )
+    return len(parts)
+
+
+def start_refresh_watch(
+    extend: Callable[..., Any],
+    path: Union[Path, str] = DEFAULT_DATA_PATH,
+    interval: float = DEFAULT_REFRESH_INTERVAL,
+    seen: Optional[int] = None,
+) -> threading.Thread:
+    """
+    Check `path` for new partitions every `interval` seconds in a daemon
+    thread and apply them (see apply_new_partitions). `seen` defaults to
+    the partitions present now; pass the count taken when the data was
+    loaded when the watcher starts later (e.g. in a forked worker).
+    """
+    state: Dict[str, int] = {"seen": len(partition_paths(path)) if seen is None else seen}
+
+    def watch():
+        while True:
+            time.sleep(interval)
+            try:
+                state["seen"] = apply_new_partitions(extend, path, state["seen"])
+            except Exception as exc:  # a bad partition must not kill the watcher
+                print("Refresh skipped:", exc)
+
+    thread = threading.Thread(target=watch, name="dataset-refresh", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,295 @@
+import calendar
+import re
+from typing import Optional, List, Dict, Tuple, Iterable, Any
+
+import pandas as pd
+
+from project.utils.load_data import (
+    COL_BOROUGH,
+    COL_YEAR,
+    COL_PERSON_INJURY,
+    COL_PERSON_TYPE,
+    COL_VEHICLE_TYPE,
+    COL_FACTOR,
+)
+
+# Search field -> source column; earlier fields win when a phrase is ambiguous
+SEARCH_FIELDS = {
+    "borough": COL_BOROUGH,
+    "person_type": COL_PERSON_TYPE,
+    "injury": COL_PERSON_INJURY,
+    "vehicle_type": COL_VEHICLE_TYPE,
+    "factor": COL_FACTOR,
+}
+
+# Extra phrasings -> (field, canonical value); used only if the value exists
+ALIASES = {
+    "staten": ("borough", "STATEN ISLAND"),
+    "cyclist": ("person_type", "BICYCLIST"),
+    "cyclists": ("person_type", "BICYCLIST"),
+    "biker": ("person_type", "BICYCLIST"),
+    "pedestrians": ("person_type", "PEDESTRIAN"),
+    "occupants": ("person_type", "OCCUPANT"),
+    "dead": ("injury", "KILLED"),
+    "deaths": ("injury", "KILLED"),
+    "fatal": ("injury", "KILLED"),
+    "fatalities": ("injury", "KILLED"),
+    "injuries": ("injury", "INJURED"),
+    "hurt": ("injury", "INJURED"),
+    "speeding": ("factor", "UNSAFE SPEED"),
+    "distracted": ("factor", "DRIVER INATTENTION/DISTRACTION"),
+}
+
+HOUR_PHRASES = {
+    "night": [22, 23, 0, 1, 2, 3, 4, 5],
+    "nights": [22, 23, 0, 1, 2, 3, 4, 5],
+    "overnight": [0, 1, 2, 3, 4, 5],
+    "late night": [0, 1, 2, 3],
+    "midnight": [0],
+    "morning": [6, 7, 8, 9, 10, 11],
+    "morning rush": [7, 8, 9],
+    "noon": [12],
+    "afternoon": [12, 13, 14, 15, 16, 17],
+    "evening": [18, 19, 20, 21],
+    "evening rush": [16, 17, 18],
+    "rush hour": [7, 8, 9, 16, 17, 18],
+    "rush hours": [7, 8, 9, 16, 17, 18],
+}
+
+# Query words that only link other terms; never reported as keywords
+LINK_WORDS = {
+    "in", "on", "at", "of", "the", "and", "or", "for", "during", "with", "between", "crash", "crashes",
+}
+
+# "and" only joins a range after "between"; "2019 and 2021" is two years
+RANGE_WORDS = {"-", "to", "through", "until", "till"}
+OPEN_RANGE_WORDS = {
+    "since": "from", "after": "after", "from": "from", "before": "before", "between": "between",
+}
+
+# Tokens shorter than this must match exactly (fuzzy matches would be noise)
+FUZZY_MIN_LENGTH = 4
+
+# Fuzzy lookups remembered per engine (misspellings repeat across queries)
+CORRECTION_CACHE_SIZE = 4096
+
+_TOKEN_RE = re.compile(r"\d{1,2}(?::\d{2})?(?:am|pm)|[a-z0-9]+|-")
+_CLOCK_RE = re.compile(r"(\d{1,2})(?::\d{2})?(am|pm)")
+_TERMINAL = "$"
+
+
+def _tokens(text: str) -> List[str]:
+    return _TOKEN_RE.findall(str(text).lower().replace("–", "-"))
+
+
+def _add(out: List[Any], values: Iterable[Any]) -> None:
+    for v in values:
+        if v not in out:
+            out.append(v)
+
+
+def _deletes(token: str) -> Iterable[str]:
+    return (token[:i] + token[i + 1:] for i in range(len(token)))
+
+
+class SearchEngine:
+    """
+    Free-text query parser compiled once from the dataset's values.
+
+    Every categorical value (plus month names, hour phrases and aliases) is
+    a token sequence in a trie, and parse() walks the query once taking the
+    longest phrase at each position. Typos are fixed per token with a
+    precomputed single-deletion dictionary (one edit away, SymSpell style),
+    so each lookup costs O(token length) however large the vocabulary is.
+    """
+
+    def __init__(
+        self,
+        values: Dict[str, Iterable[Any]],
+        years: Iterable[int] = (),
+    ):
+        self.trie: Dict[str, Any] = {}
+        self.years = sorted({int(y) for y in years})
+        self.vocab: Dict[str, str] = {}  # token -> itself, for exact hits
+        self.corrections: Dict[str, List[str]] = {}  # deletion -> tokens
+        self._corrected: Dict[str, Optional[str]] = {}
+
+        for field, field_values in values.items():
+            for value in field_values:
+                if pd.isna(value):
+                    continue
+                self._add(_tokens(value), (field, str(value).strip().upper()))
+
+        known = {v for _, vs in values.items() for v in vs if not pd.isna(v)}
+        known = {str(v).strip().upper() for v in known}
+        for phrase, (field, value) in ALIASES.items():
+            if value in known:
+                self._add(_tokens(phrase), (field, value))
+
+        for month in range(1, 13):
+            for name in {calendar.month_name[month].lower(), calendar.month_abbr[month].lower()}:
+                self._add([name], ("months", month), fuzzy=len(name) > 3)
+        for phrase, hours in HOUR_PHRASES.items():
+            self._add(_tokens(phrase), ("hours", tuple(hours)))
+
+    # ---------- build ----------
+    def _add(self, tokens: List[str], target: Tuple[str, Any], fuzzy: bool = True) -> None:
+        if not tokens:
+            return
+        node = self.trie
+        for tok in tokens:
+            node = node.setdefault(tok, {})
+            if tok not in self.vocab and not tok.isdigit():
+                self.vocab[tok] = tok
+                if fuzzy and len(tok) >= FUZZY_MIN_LENGTH:
+                    for d in _deletes(tok):
+                        self.corrections.setdefault(d, []).append(tok)
+        node.setdefault(_TERMINAL, []).append(target)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "SearchEngine":
+        """Vocabulary from the frame's label columns (category dictionaries if categorical)."""
+        values = {}
+        for field, col in SEARCH_FIELDS.items():
+            if col not in df.columns:
+                continue
+            s = df[col]
+            if isinstance(s.dtype, pd.CategoricalDtype):
+                values[field] = list(s.cat.categories)
+            else:
+                values[field] = list(s.dropna().unique())
+        years = df[COL_YEAR].dropna().unique() if COL_YEAR in df.columns else ()
+        return cls(values, years)
+
+    # ---------- lookup ----------
+    def correct(self, token: str) -> Optional[str]:
+        """The vocabulary token `token` is (at most one edit from), or None."""
+        if token in self.vocab:
+            return token
+        if len(token) < FUZZY_MIN_LENGTH or token in LINK_WORDS:
+            return None
+        if token in self._corrected:
+            return self._corrected[token]
+        if len(self._corrected) >= CORRECTION_CACHE_SIZE:
+            self._corrected.clear()
+        # token lacks a letter / has an extra one / has one substituted
+        found = list(self.corrections.get(token, []))
+        found += [d for d in _deletes(token) if d in self.vocab]
+        for d in _deletes(token):
+            found += self.corrections.get(d, [])
+        best = min(found, key=lambda t: (abs(len(t) - len(token)), t)) if found else None
+        self._corrected[token] = best
+        return best
+
+    def _year(self, token: str) -> Optional[int]:
+        if len(token) == 4 and token.isdigit() and token[:2] in ("19", "20"):
+            return int(token)
+        return None
+
+    def _match(self, tokens: List[str], i: int) -> Tuple[int, List[Tuple[str, Any]]]:
+        """Longest vocabulary phrase starting at tokens[i]: (length, targets)."""
+        node, best = self.trie, (0, [])
+        for j in range(i, len(tokens)):
+            child = node.get(tokens[j])
+            if child is None:
+                # Exact tokens never pay for a correction, nor do tokens
+                # after a phrase that cannot continue
+                if len(node) == (_TERMINAL in node):
+                    break
+                tok = self.correct(tokens[j])
+                child = node.get(tok) if tok is not None else None
+                if child is None:
+                    break
+            node = child
+            if _TERMINAL in node:
+                best = (j - i + 1, node[_TERMINAL])
+        return best
+
+    # ---------- parse ----------
+    def _year_range(self, tokens: List[str], i: int) -> Tuple[int, Iterable[int]]:
+        """
+        Years of an open or "between" range at tokens[i] ("since 2020",
+        "from 2020 to 2022", "between 2019 and 2021"): (tokens used, years),
+        or (0, ()) if tokens[i] does not start one.
+        """
+        start = self._year(tokens[i + 1]) if i + 1 < len(tokens) else None
+        if start is None:
+            return 0, ()
+        kind = OPEN_RANGE_WORDS[tokens[i]]
+        end = None
+        if kind != "before" and i + 3 < len(tokens) and (
+            tokens[i + 2] in RANGE_WORDS or (kind == "between" and tokens[i + 2] == "and")
+        ):
+            end = self._year(tokens[i + 3])
+        if end is not None:
+            # "from 2020 to 2022": closed after all
+            start += kind == "after"
+            return 4, range(min(start, end), max(start, end) + 1)
+        if kind == "between":
+            return 0, ()
+        # Bounded by the data's years; without any (or past them), the
+        # nearest year on that side, so the filter is never dropped
+        first, last = (self.years[0], self.years[-1]) if self.years else (start, start)
+        if kind == "before":
+            return 2, range(first, start) or [start - 1]
+        start += kind == "after"
+        return 2, range(start, last + 1) or [start]
+
+    def parse(self, query: Optional[str]) -> Dict[str, Any]:
+        """
+        Structured filters found in `query`: lists for borough, year,
+        vehicle_type, factor, person_type, injury, months and hours, plus
+        the unmatched words as keywords.
+        """
+        result: Dict[str, Any] = {
+            "borough": [], "year": [], "vehicle_type": [], "factor": [],
+            "person_type": [], "injury": [], "months": [], "hours": [], "keywords": [],
+        }
+        if not query:
+            return result
+
+        tokens = _tokens(query)
+        n = len(tokens)
+        i = 0
+        while i < n:
+            tok = tokens[i]
+
+            # Only tokens starting with a digit can be years or clock times
+            if tok[0].isdigit():
+                # Years and ranges ("2019-2021", "2019 to 2021")
+                year = self._year(tok)
+                if year is not None:
+                    end = self._year(tokens[i + 2]) if i + 2 < n and tokens[i + 1] in RANGE_WORDS else None
+                    if end is not None:
+                        _add(result["year"], range(min(year, end), max(year, end) + 1))
+                        i += 3
+                    else:
+                        _add(result["year"], [year])
+                        i += 1
+                    continue
+                # Clock times: "8am", "5pm", "11:30pm"
+                clock = _CLOCK_RE.fullmatch(tok)
+                if clock:
+                    _add(result["hours"], [int(clock.group(1)) % 12 + (12 if clock.group(2) == "pm" else 0)])
+                    i += 1
+                    continue
+            elif tok in OPEN_RANGE_WORDS:
+                used, years = self._year_range(tokens, i)
+                if used:
+                    _add(result["year"], years)
+                    i += used
+                    continue
+
+            length, targets = self._match(tokens, i)
+            if length:
+                # One field per phrase: the first in SEARCH_FIELDS order
+                field, value = targets[0]
+                _add(result[field], value if field == "hours" else [value])
+                i += length
+                continue
+
+            if tok not in LINK_WORDS and tok not in RANGE_WORDS:
+                result["keywords"].append(tok)
+            i += 1
+
+        return result
@@ -0,0 +1,310 @@
+import copy
+from typing import Optional, Dict, Tuple, Any, Sequence
+
+import numpy as np
+import pandas as pd
+
+# Grid cell sizes in degrees, coarse to fine (~2 km, ~1 km, ~500 m at NYC)
+DENSITY_CELL_DEGREES = (0.02, 0.01, 0.005)
+
+# Upper bound on the bins shipped to the browser for the map
+MAX_MAP_BINS = 2500
+
+# Cell size of the GridIndex used for bbox / radius / polygon queries
+SPATIAL_CELL_DEGREES = 0.005
+
+METERS_PER_DEGREE_LAT = 111_320.0
+
+
+def _grid_columns(size: float) -> int:
+    """Cells per row of the global grid (longitude -180..180)."""
+    return int(round(360 / size))
+
+
+# ===========================
+# Global lat/lon grid
+# ===========================
+def cell_ids(lat: np.ndarray, lon: np.ndarray, size: float) -> np.ndarray:
+    """
+    Global cell id of each point for a grid of `size` degrees (-1 if missing).
+
+    Ids do not depend on the data's extent, so counts from different chunks,
+    partitions or filters can be added together.
+    """
+    lat = np.asarray(lat, dtype="float64")
+    lon = np.asarray(lon, dtype="float64")
+    ok = ~(np.isnan(lat) | np.isnan(lon))
+    row = np.floor((np.where(ok, lat, 0) + 90) / size).astype(np.int64)
+    col = np.floor((np.where(ok, lon, 0) + 180) / size).astype(np.int64)
+    return np.where(ok, row * _grid_columns(size) + col, -1)
+
+
+def cell_centers(ids: np.ndarray, size: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Latitude and longitude of the centers of the given cells."""
+    row, col = np.divmod(np.asarray(ids, dtype=np.int64), _grid_columns(size))
+    return (row + 0.5) * size - 90, (col + 0.5) * size - 180
+
+
+def density_counts(lat: np.ndarray, lon: np.ndarray) -> Dict[float, pd.Series]:
+    """Point counts per non-empty cell, for every size in DENSITY_CELL_DEGREES."""
+    out = {}
+    for size in DENSITY_CELL_DEGREES:
+        ids = cell_ids(lat, lon, size)
+        uniq, counts = np.unique(ids[ids >= 0], return_counts=True)
+        out[size] = pd.Series(counts, index=uniq, dtype="int64")
+    return out
+
+
+def pick_density_level(
+    density: Dict[float, pd.Series], max_bins: int = MAX_MAP_BINS
+) -> Tuple[Optional[float], Optional[pd.Series]]:
+    """Finest level whose non-empty bins fit in `max_bins` (else the coarsest)."""
+    if not density:
+        return None, None
+    sizes = sorted(density)
+    for size in sizes:
+        if len(density[size]) <= max_bins:
+            return size, density[size]
+    return sizes[-1], density[sizes[-1]]
+
+
+# ===========================
+# Row-level grid for filtered selections
+# ===========================
+class DensityGrid:
+    """
+    Per-row cell assignment at every grid size, built once at load time.
+
+    counts(rows) bins any selection with one bincount per level, so the map
+    payload is bounded by the number of cells rather than crashes.
+    """
+
+    def __init__(self, lat: np.ndarray, lon: np.ndarray):
+        self.cells: Dict[float, np.ndarray] = {}
+        self.row_cell: Dict[float, np.ndarray] = {}
+        for size in DENSITY_CELL_DEGREES:
+            ids = cell_ids(lat, lon, size)
+            cells, inverse = np.unique(ids, return_inverse=True)
+            has_missing = len(cells) > 0 and cells[0] < 0
+            # Compact int32 cell numbers per row, -1 for missing coordinates
+            self.cells[size] = cells[1:] if has_missing else cells
+            self.row_cell[size] = (inverse - (1 if has_missing else 0)).astype(np.int32)
+
+    def extend(self, lat: np.ndarray, lon: np.ndarray) -> "DensityGrid":
+        """A copy with rows appended; existing rows are renumbered only if new cells appear."""
+        new = copy.copy(self)
+        new.cells, new.row_cell = {}, {}
+        for size in DENSITY_CELL_DEGREES:
+            ids = cell_ids(lat, lon, size)
+            cells = np.union1d(self.cells[size], ids[ids >= 0])
+            old = self.row_cell[size]
+            if len(cells) != len(self.cells[size]):
+                remap = np.searchsorted(cells, self.cells[size]).astype(np.int32)
+                old = np.where(old >= 0, remap[np.maximum(old, 0)], -1).astype(np.int32)
+            added = np.where(ids >= 0, np.searchsorted(cells, ids), -1).astype(np.int32)
+            new.cells[size] = cells
+            new.row_cell[size] = np.concatenate([old, added])
+        return new
+
+    def counts(self, rows: Optional[np.ndarray] = None) -> Dict[float, pd.Series]:
+        """Counts per non-empty cell for the selected rows (all rows if None)."""
+        out = {}
+        for size in DENSITY_CELL_DEGREES:
+            cell = self.row_cell[size] if rows is None else self.row_cell[size][rows]
+            sums = np.bincount(cell[cell >= 0], minlength=len(self.cells[size]))
+            nonzero = np.flatnonzero(sums)
+            out[size] = pd.Series(sums[nonzero], index=self.cells[size][nonzero], dtype="int64")
+        return out
+
+
+# ===========================
+# Exact geometry tests
+# ===========================
+def bbox_mask(lat, lon, bbox: Sequence[float]) -> np.ndarray:
+    """
+    Points inside (min_lat, min_lon, max_lat, max_lon), edges included.
+    Compared in float32, the dtype coordinates are stored in, so the scan
+    and the GridIndex agree on points that lie on an edge.
+    """
+    lat = np.asarray(lat, dtype="float32")
+    lon = np.asarray(lon, dtype="float32")
+    min_lat, min_lon, max_lat, max_lon = np.asarray(bbox, dtype="float32")
+    return (lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon)
+
+
+def radius_bbox(radius: Sequence[float]) -> Tuple[float, float, float, float]:
+    """Bounding box of a (lat, lon, meters) circle."""
+    lat0, lon0, meters = radius
+    dlat = meters / METERS_PER_DEGREE_LAT
+    dlon = dlat / max(np.cos(np.radians(lat0)), 1e-6)
+    return lat0 - dlat, lon0 - dlon, lat0 + dlat, lon0 + dlon
+
+
+def radius_mask(lat, lon, radius: Sequence[float]) -> np.ndarray:
+    """
+    Points within `meters` of (lat, lon), using the equirectangular
+    approximation (well under 0.1% error at city scale).
+    """
+    lat0, lon0, meters = radius
+    dy = (np.asarray(lat, dtype="float64") - lat0) * METERS_PER_DEGREE_LAT
+    dx = (np.asarray(lon, dtype="float64") - lon0) * METERS_PER_DEGREE_LAT * np.cos(np.radians(lat0))
+    return dx * dx + dy * dy <= meters * meters
+
+
+def polygon_bbox(polygon: Sequence[Sequence[float]]) -> Tuple[float, float, float, float]:
+    pts = np.asarray(polygon, dtype="float64")
+    return pts[:, 0].min(), pts[:, 1].min(), pts[:, 0].max(), pts[:, 1].max()
+
+
+def polygon_mask(lat, lon, polygon: Sequence[Sequence[float]]) -> np.ndarray:
+    """Points inside a [(lat, lon), ...] polygon (even-odd ray casting)."""
+    lat = np.asarray(lat, dtype="float64")
+    lon = np.asarray(lon, dtype="float64")
+    pts = np.asarray(polygon, dtype="float64")
+    inside = np.zeros(len(lat), dtype=bool)
+    for (y1, x1), (y2, x2) in zip(pts, np.roll(pts, -1, axis=0)):
+        crosses = (y1 > lat) != (y2 > lat)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_at = x1 + (lat - y1) * (x2 - x1) / (y2 - y1)
+        inside ^= crosses & (lon < x_at)
+    return inside
+
+
+def spatial_mask(lat, lon, bbox=None, radius=None, polygon=None) -> Optional[np.ndarray]:
+    """AND of the given shape tests over full columns (None if no shape)."""
+    mask = None
+    for shape, test in ((bbox, bbox_mask), (radius, radius_mask), (polygon, polygon_mask)):
+        if shape is not None:
+            m = test(lat, lon, shape)
+            mask = m if mask is None else mask & m
+    return mask
+
+
+# ===========================
+# Grid index for spatial queries
+# ===========================
+class GridIndex:
+    """
+    Uniform-grid spatial index over float32 coordinates.
+
+    Rows are stored sorted by global grid cell (CSR layout). Along one grid
+    row the cells of a bounding box are a contiguous id range, so a query
+    reads one slice of row ids per grid row, then exact-tests only those
+    candidates.
+    """
+
+    def __init__(self, lat: np.ndarray, lon: np.ndarray, size: float = SPATIAL_CELL_DEGREES):
+        self.size = size
+        self.n_rows = len(lat)
+        self.lat = np.asarray(lat, dtype="float32")
+        self.lon = np.asarray(lon, dtype="float32")
+
+        ids = cell_ids(self.lat, self.lon, size)
+        order = np.argsort(ids, kind="stable")
+        order = order[ids[order] >= 0]  # rows without coordinates sort first
+        self.order = order.astype(np.int32 if self.n_rows < 2**31 else np.int64)
+        self.cells, starts = np.unique(ids[self.order], return_index=True)
+        self.offsets = np.append(starts, len(self.order))
+
+        # Grid rows that hold any point, to clamp oversized queries
+        ncols = _grid_columns(size)
+        self.row_range = (
+            (int(self.cells[0] // ncols), int(self.cells[-1] // ncols))
+            if len(self.cells) else (0, -1)
+        )
+
+    def covers(self, df: pd.DataFrame) -> bool:
+        return len(df) == self.n_rows
+
+    def extend(self, lat: np.ndarray, lon: np.ndarray) -> "GridIndex":
+        """
+        A copy with rows appended: each new row is inserted at the end of
+        its cell's run, so the old rows are not re-sorted.
+        """
+        new = copy.copy(self)
+        new.lat = np.concatenate([self.lat, np.asarray(lat, dtype="float32")])
+        new.lon = np.concatenate([self.lon, np.asarray(lon, dtype="float32")])
+        new.n_rows = len(new.lat)
+
+        ids = cell_ids(new.lat[self.n_rows:], new.lon[self.n_rows:], self.size)
+        by_cell = np.argsort(ids, kind="stable")
+        by_cell = by_cell[ids[by_cell] >= 0]
+        sorted_ids = np.repeat(self.cells, np.diff(self.offsets))
+        where = np.searchsorted(sorted_ids, ids[by_cell], side="right")
+        dtype = np.int32 if new.n_rows < 2**31 else np.int64
+        new.order = np.insert(self.order.astype(dtype), where, (self.n_rows + by_cell).astype(dtype))
+        merged = np.insert(sorted_ids, where, ids[by_cell])
+        starts = np.flatnonzero(np.r_[True, merged[1:] != merged[:-1]]) if len(merged) else merged[:0]
+        new.cells = merged[starts]
+        new.offsets = np.append(starts, len(new.order))
+
+        ncols = _grid_columns(self.size)
+        new.row_range = (
+            (int(new.cells[0] // ncols), int(new.cells[-1] // ncols))
+            if len(new.cells) else (0, -1)
+        )
+        return new
+
+    def _candidates(self, bbox: Sequence[float]) -> np.ndarray:
+        # Bounds rounded outward to float32, the coordinates' dtype: a point
+        # that passes the exact test (float32 bbox, float64 radius/polygon)
+        # then always lies in one of the candidate cells, even when its
+        # rounding crosses a cell boundary that is also a bbox edge
+        lo = np.nextafter(np.asarray(bbox[:2], dtype="float32"), np.float32(-np.inf))
+        hi = np.nextafter(np.asarray(bbox[2:], dtype="float32"), np.float32(np.inf))
+        min_lat, min_lon, max_lat, max_lon = (float(v) for v in (*lo, *hi))
+        ncols = _grid_columns(self.size)
+        r0, r1 = (int(np.floor((v + 90) / self.size)) for v in (min_lat, max_lat))
+        r0, r1 = max(r0, self.row_range[0]), min(r1, self.row_range[1])
+        c0, c1 = (int(np.floor((v + 180) / self.size)) for v in (min_lon, max_lon))
+
+        parts = []
+        for r in range(r0, r1 + 1):
+            lo = np.searchsorted(self.cells, r * ncols + c0, side="left")
+            hi = np.searchsorted(self.cells, r * ncols + c1, side="right")
+            if hi > lo:
+                parts.append(self.order[self.offsets[lo]:self.offsets[hi]])
+        return np.concatenate(parts) if parts else self.order[:0]
+
+    def _query(self, bbox, test, shape) -> np.ndarray:
+        rows = self._candidates(bbox)
+        rows = rows[test(self.lat[rows], self.lon[rows], shape)]
+        return np.sort(rows)
+
+    def bbox(self, bbox: Sequence[float]) -> np.ndarray:
+        """Sorted rows inside (min_lat, min_lon, max_lat, max_lon)."""
+        return self._query(bbox, bbox_mask, bbox)
+
+    def radius(self, radius: Sequence[float]) -> np.ndarray:
+        """Sorted rows within (lat, lon, meters)."""
+        return self._query(radius_bbox(radius), radius_mask, radius)
+
+    def polygon(self, polygon: Sequence[Sequence[float]]) -> np.ndarray:
+        """Sorted rows inside a [(lat, lon), ...] polygon."""
+        return self._query(polygon_bbox(polygon), polygon_mask, polygon)
+
+    def select(self, bbox=None, radius=None, polygon=None) -> Optional[np.ndarray]:
+        """Sorted rows matching every given shape, or None if no shape."""
+        rows = None
+        for shape, query in ((bbox, self.bbox), (radius, self.radius), (polygon, self.polygon)):
+            if shape is not None:
+                hit = query(shape)
+                rows = hit if rows is None else np.intersect1d(rows, hit, assume_unique=True)
+        return rows
+
+
+def selection_to_shape(selected: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Convert a Plotly map selectedData payload into apply_filters arguments:
+    {"bbox": (...)} for box select, {"polygon": [...]} for lasso, or {}.
+    """
+    if not selected:
+        return {}
+    box = (selected.get("range") or {}).get("map")
+    if box:
+        (lon0, lat0), (lon1, lat1) = box
+        return {"bbox": (min(lat0, lat1), min(lon0, lon1), max(lat0, lat1), max(lon0, lon1))}
+    lasso = (selected.get("lassoPoints") or {}).get("map")
+    if lasso and len(lasso) >= 3:
+        return {"polygon": [(lat, lon) for lon, lat in lasso]}
+    return {}
@@ -0,0 +1,94 @@
+import threading
+import time
+from typing import Optional, List, Dict, Any, Callable
+
+import pandas as pd
+
+from project.utils.load_data import (
+    COL_BOROUGH,
+    COL_YEAR,
+    COL_PERSON_INJURY,
+    COL_PERSON_TYPE,
+)
+
+# Dropdown -> (column, how many of its most frequent values to warm)
+WARMUP_DROPDOWNS = {
+    "borough": (COL_BOROUGH, 5),
+    "year": (COL_YEAR, 4),
+    "injury": (COL_PERSON_INJURY, 3),
+    "person_type": (COL_PERSON_TYPE, 3),
+}
+
+# Reports precomputed at boot besides the unfiltered one
+DEFAULT_WARMUP_LIMIT = 24
+
+
+def popular_filters(df: pd.DataFrame, limit: int = DEFAULT_WARMUP_LIMIT) -> List[Dict[str, Any]]:
+    """
+    Filter combinations worth precomputing: single-dropdown selections of
+    the most frequent values, then the busiest borough x recent year pairs.
+    """
+    tops: Dict[str, list] = {}
+    for arg, (col, n) in WARMUP_DROPDOWNS.items():
+        if col not in df.columns:
+            continue
+        counts = df[col].value_counts(dropna=True)
+        if arg == "year":
+            # Recent years are what users pick first
+            tops[arg] = sorted((int(y) for y in counts.index), reverse=True)[:n]
+        else:
+            tops[arg] = [v for v in counts.index[:n]]
+
+    combos = [{arg: v} for arg, values in tops.items() for v in values]
+    for b in tops.get("borough", []):
+        for y in tops.get("year", [])[:2]:
+            combos.append({"borough": b, "year": y})
+    return combos[:limit]
+
+
+def warm_up(
+    report: Callable[..., Any],
+    combos: Optional[List[Dict[str, Any]]] = None,
+) -> Dict[str, Any]:
+    """
+    Compute the unfiltered report, then one report per filter combination,
+    through `report` (the callbacks' memoized report function).
+
+    Returns timing stats; a failing combination is skipped, not raised.
+    """
+    start = time.perf_counter()
+    report()
+    initial_s = time.perf_counter() - start
+
+    done, failed = 0, 0
+    for filters in combos or []:
+        try:
+            report(**filters)
+            done += 1
+        except Exception as exc:
+            failed += 1
+            print(f"Warm-up skipped {filters}: {exc}")
+
+    stats = {
+        "initial_seconds": round(initial_s, 3),
+        "reports": done,
+        "failed": failed,
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+    print(
+        f"Warm-up: initial report in {stats['initial_seconds']}s, "
+        f"{done} filtered reports, {stats['seconds']}s total"
+    )
+    return stats
+
+
+def start_warm_up(
+    report: Callable[..., Any],
+    combos: Optional[List[Dict[str, Any]]] = None,
+) -> threading.Thread:
+    """Run warm_up in a daemon thread so the server can accept requests meanwhile."""
+    thread = threading.Thread(
+        target=warm_up, args=(report, combos), name="report-warm-up", daemon=True
+    )
+    thread.start()
+    return thread